@@ -8,13 +8,16 @@ AI-powered recommendations based on odds analysis and real NBA data.
 
 import re
 import math
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Union
+
+from app.bet_tokens import KeywordIndex, Leg, TermAutomaton, as_leg, is_word_char, split_legs, tokenize
 
 # Import sports data module for real NBA stats
 try:
-    from app.sports_data import get_enhanced_bet_analysis
+    from app.sports_data import TEAM_ALIASES, get_enhanced_bet_analysis
     SPORTS_DATA_AVAILABLE = True
 except ImportError:
+    TEAM_ALIASES = {}
     SPORTS_DATA_AVAILABLE = False
 
 
@@ -73,6 +76,22 @@ BET_TYPE_PATTERNS = {
     ]
 }
 
+# Lookups the token-based detectors use in place of the patterns above
+_SPORT_ORDER = {sport: rank for rank, sport in enumerate(SPORTS_KEYWORDS)}
+# Every name that points to a sport, with the sports it can mean ("kings": NBA, NHL).
+# The live-data team aliases are all NBA teams.
+_SPORT_TERMS = {}
+for _sport, _keywords in [*SPORTS_KEYWORDS.items(), ('NBA', TEAM_ALIASES)]:
+    for _keyword in _keywords:
+        _sports = _SPORT_TERMS.setdefault(_keyword.lower(), [])
+        if _sport not in _sports:
+            _sports.append(_sport)
+_SPORT_MATCHER = TermAutomaton(_SPORT_TERMS)
+_PROP_INDEX = KeywordIndex(['prop', 'anytime', 'first', 'last', 'scorer', 'yards', 'rebounds', 'assists'])
+_MONEYLINE_WORDS = {'ml', 'moneyline', 'towin'}
+_MONEYLINE_PAIRS = {'money': 'line', 'to': 'win'}
+_TOTAL_ENDINGS = ('o', 'u', 'over', 'under')
+
 
 def parse_american_odds(odds_str: str) -> Optional[int]:
     """Parse American odds from string format."""
@@ -94,94 +113,207 @@ def parse_american_odds(odds_str: str) -> Optional[int]:
     return None
 
 
-def detect_sport(text: str) -> str:
+def _leg(text: Union[str, Leg]) -> Leg:
+    return as_leg(text) if isinstance(text, str) else text
+
+
+def detect_sport(text: Union[str, Leg]) -> str:
     """Detect the sport from the bet text."""
-    text_lower = text.lower()
-    
-    for sport, keywords in SPORTS_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return sport
+    return detect_sports([text])[0]
+
+
+def detect_sports(legs: List[Union[str, Leg]]) -> List[str]:
+    """
+    Detect the sport of each leg of a slip.
     
-    return 'Unknown'
+    Team and league names count only as whole words. A name shared by
+    several sports ("Giants", "Rangers") counts for each of them in part,
+    so the other names in the leg decide; if they cannot, the rest of the
+    slip does. A leg naming nothing is 'Unknown'.
+    """
+    scores = [_sport_scores(_leg(leg)) for leg in legs]
+    slip = {}
+    for leg_scores in scores:
+        for sport, score in leg_scores.items():
+            slip[sport] = slip.get(sport, 0) + score
+    
+    return [
+        max(leg_scores, key=lambda sport: (leg_scores[sport], slip[sport], -_SPORT_ORDER[sport]))
+        if leg_scores else 'Unknown'
+        for leg_scores in scores
+    ]
 
 
-def detect_bet_type(text: str) -> str:
+def _sport_scores(leg: Leg) -> Dict[str, float]:
+    scores = {}
+    for _, _, term in _SPORT_MATCHER.scan(leg):
+        sports = _SPORT_TERMS[term]
+        for sport in sports:
+            scores[sport] = scores.get(sport, 0) + 1 / len(sports)
+    return scores
+
+
+def detect_bet_type(text: Union[str, Leg]) -> str:
     """Detect the type of bet from the text."""
-    text_lower = text.lower()
-    
-    # Check for spread
-    if re.search(r'[+-]\d+\.?\d*', text) and not re.search(r'@\s*[+-]', text):
-        return 'Spread'
-    
-    # Check for totals
-    if re.search(r'(?:over|under|o|u)\s*\d+', text_lower):
-        return 'Total'
+    leg = _leg(text)
+    kinds, texts = leg.tokens.kinds, leg.tokens.texts
+    
+    # Check for spread: a signed number, unless some sign follows an "@"
+    if leg.signed:
+        at_odds = False
+        for i in leg.find_text('@'):
+            j = leg.next_solid(i)
+            if j != -1 and texts[j][0] in '+-':
+                at_odds = True
+                break
+        if not at_odds:
+            return 'Spread'
+    
+    # Check for totals: "over"/"under"/"o"/"u" followed by a number
+    for i, word in zip(leg.word_at, leg.words):
+        if word.endswith(_TOTAL_ENDINGS):
+            j = leg.next_solid(i)
+            if j != -1 and kinds[j] == 'number':
+                return 'Total'
     
     # Check for moneyline
-    if re.search(r'\b(?:ml|moneyline|money\s*line|to\s*win)\b', text_lower):
+    if _has_moneyline_keyword(leg):
         return 'Moneyline'
     
     # Check for props
-    if re.search(r'(?:prop|anytime|first|last|scorer|yards|rebounds|assists)', text_lower):
+    if _PROP_INDEX.find(leg):
         return 'Prop'
     
-    # Default to moneyline if we find a team name with odds
-    if re.search(r'@?\s*[+-]\d{3}', text):
-        return 'Moneyline'
-    
     return 'Moneyline'
 
 
-def extract_odds(text: str) -> List[int]:
+def _has_moneyline_keyword(leg: Leg) -> bool:
+    # "ml", "moneyline", "money line" or "to win" as whole words
+    source, tokens = leg.source, leg.tokens
+    for i, word in zip(leg.word_at, leg.words):
+        if word in _MONEYLINE_WORDS:
+            last = i
+        elif word in _MONEYLINE_PAIRS:
+            last = leg.next_solid(i)
+            if last == -1 or tokens.texts[last].lower() != _MONEYLINE_PAIRS[word]:
+                continue
+        else:
+            continue
+        start, end = tokens.starts[i], tokens.ends[last]
+        if (start == 0 or not is_word_char(source[start - 1])) \
+                and (end == len(source) or not is_word_char(source[end])):
+            return True
+    return False
+
+
+def extract_odds(text: Union[str, Leg]) -> List[int]:
     """Extract all American odds from text."""
-    odds_list = []
-    
-    # Match patterns like "+150", "-110", "@ +150", "@-110"
-    # Note: Word boundary \b doesn't work before +/-, so we use lookbehind or explicit patterns
-    patterns = [
-        r'@\s*([+-]\d{2,4})',                    # @ +500, @-110
-        r'\(\s*([+-]\d{2,4})\s*\)',              # (+500), (-110)
-        r'(?:odds?:?\s*)([+-]\d{2,4})',          # odds: +500
-        r'(?:^|[\s,;])([+-]\d{3,4})(?:$|[\s,;])', # +500, -110 at word boundaries
-        r'(?:ML|ml|moneyline)\s*([+-]\d{3,4})',  # ML +500
-    ]
+    leg = _leg(text)
+    source, tokens = leg.source, leg.tokens
+    kinds, texts = tokens.kinds, tokens.texts
+    
+    # The forms accepted, in priority order:
+    #   @ +500, @-110 / (+500), (-110) / odds: +500 / -110 between spaces,
+    #   commas or the ends of the leg / ML +500
+    found = ([], [], [], [], [])
+    spaced_until = leg.start
+    for i in leg.signed:
+        text, start, end = texts[i], tokens.starts[i], tokens.ends[i]
+        digits = len(text) - 1
+        value = int(text[:5])
+        prev = leg.prev_solid(i)
+        before = texts[prev] if prev != -1 else ''
+        
+        if before == '@' and digits >= 2:
+            found[0].append(value)
+        if before == '(' and 2 <= digits <= 4:
+            j = leg.next_solid(i)
+            if j != -1 and texts[j] == ')':
+                found[1].append(value)
+        if digits >= 2 and _follows_odds_label(leg, i):
+            found[2].append(value)
+        if 3 <= digits <= 4 and start >= spaced_until:
+            lead = source[start - 1] if start > leg.start else ''
+            if start == leg.start or lead.isspace() or lead == ',' or lead == ';':
+                trail = source[end] if end < leg.end else ''
+                if end == leg.end or trail.isspace() or trail == ',' or trail == ';':
+                    found[3].append(value)
+                    # The character after the odds is used up and cannot lead the next ones
+                    spaced_until = end + 2
+        if digits >= 3 and before.endswith(('ML', 'ml', 'moneyline')) and kinds[prev] == 'word':
+            found[4].append(value)
     
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
-            odds = parse_american_odds(match)
-            if odds is not None and odds not in odds_list:
+    odds_list = []
+    for values in found:
+        for odds in values:
+            if odds not in odds_list:
                 odds_list.append(odds)
-    
     return odds_list
 
 
-def extract_teams_and_games(text: str) -> List[Dict[str, str]]:
+def _follows_odds_label(leg: Leg, i: int) -> bool:
+    # "odd"/"odds", then an optional colon, then optional whitespace, right before token i
+    kinds, texts = leg.tokens.kinds, leg.tokens.texts
+    j = leg.prev_solid(i)
+    if j >= 0 and texts[j] == ':':
+        j -= 1
+    return j >= 0 and kinds[j] == 'word' and texts[j].endswith(('odd', 'odds'))
+
+
+def _selection(leg: Leg) -> str:
+    """The leg's text with its odds ("-110", "@ +150", "+150" in "(+150)") taken out."""
+    source, kinds, texts, starts = leg.source, leg.tokens.kinds, leg.tokens.texts, leg.tokens.starts
+    pieces = []
+    pos = leg.start
+    for i in leg.signed:
+        text, start = texts[i], starts[i]
+        if len(text) < 3:
+            continue
+        cut = start
+        j = i - 1
+        while j >= 0 and (kinds[j] == 'space' or kinds[j] == 'newline') and starts[j] >= pos:
+            cut = starts[j]
+            j -= 1
+        if j >= 0 and texts[j] == '@' and starts[j] >= pos:
+            cut = starts[j]
+        pieces.append(source[pos:cut])
+        pos = start + min(len(text), 5)
+    pieces.append(source[pos:leg.end])
+    return ''.join(pieces).strip()
+
+
+def extract_teams_and_games(text: Union[str, Leg]) -> List[Dict[str, str]]:
     """Extract team matchups from text."""
+    leg = _leg(text)
     games = []
     
-    # Common matchup patterns
-    patterns = [
-        r'(\w+(?:\s+\w+)?)\s+(?:vs\.?|v\.?|@|at)\s+(\w+(?:\s+\w+)?)',
-        r'(\w+)\s+(?:over|under)',
-    ]
+    # "A vs B", "A @ B", ...
+    for team_a, team_b in leg.matchups():
+        games.append({
+            'team_a': team_a,
+            'team_b': team_b,
+            'game': f"{team_a} vs {team_b}"
+        })
     
-    for pattern in patterns:
-        matches = re.finditer(pattern, text, re.IGNORECASE)
-        for match in matches:
-            if len(match.groups()) >= 2:
-                games.append({
-                    'team_a': match.group(1).strip(),
-                    'team_b': match.group(2).strip(),
-                    'game': f"{match.group(1).strip()} vs {match.group(2).strip()}"
-                })
-            elif len(match.groups()) == 1:
-                games.append({
-                    'team_a': match.group(1).strip(),
-                    'team_b': 'Unknown',
-                    'game': match.group(1).strip()
-                })
+    # "A over", "A under"
+    if not any(word.startswith(('over', 'under')) for word in leg.words):
+        return games
+    source, runs = leg.source, leg.runs
+    resume = leg.start
+    for i in range(len(runs) - 1):
+        start = max(runs[i][0], resume)
+        if start >= runs[i][1] or not leg.gap_is_space(runs[i][1], runs[i + 1][0]):
+            continue
+        following = source[runs[i + 1][0]:runs[i + 1][1]].lower()
+        keyword = next((k for k in ('over', 'under') if following.startswith(k)), None)
+        if keyword:
+            team = source[start:runs[i][1]]
+            games.append({
+                'team_a': team,
+                'team_b': 'Unknown',
+                'game': team
+            })
+            resume = runs[i + 1][0] + len(keyword)
     
     return games
 
@@ -333,31 +465,18 @@ def parse_bet_text(bet_text: str) -> Dict[str, Any]:
         }
     
     legs = []
-    lines = [line.strip() for line in bet_text.split('\n') if line.strip()]
-    
-    # If single line, try to split by common delimiters
-    if len(lines) == 1:
-        # Try splitting by commas or semicolons
-        parts = re.split(r'[,;]', lines[0])
-        if len(parts) > 1:
-            lines = [p.strip() for p in parts if p.strip()]
+    # Lex the slip once; legs are one per line, or per comma/semicolon on a single line
+    tokens = tokenize(bet_text)
+    bet_legs = split_legs(bet_text, tokens)
     
     leg_id = 1
-    for line in lines:
-        if not line:
-            continue
-            
-        sport = detect_sport(line)
-        bet_type = detect_bet_type(line)
-        odds_found = extract_odds(line)
-        games = extract_teams_and_games(line)
-        
-        # Try to extract selection text
-        selection = line
+    for bet_leg, sport in zip(bet_legs, detect_sports(bet_legs)):
+        bet_type = detect_bet_type(bet_leg)
+        odds_found = extract_odds(bet_leg)
+        games = extract_teams_and_games(bet_leg)
         
-        # Clean up selection - remove odds
-        selection = re.sub(r'@?\s*[+-]\d{2,4}', '', selection).strip()
-        selection = re.sub(r'\(\s*[+-]\d{2,4}\s*\)', '', selection).strip()
+        # Selection is the leg without its odds
+        selection = _selection(bet_leg)
         
         # Default odds if none found
         odds = odds_found[0] if odds_found else -110
@@ -379,14 +498,15 @@ def parse_bet_text(bet_text: str) -> Dict[str, Any]:
     
     # If no legs parsed, try to create at least one from the whole text
     if not legs:
-        sport = detect_sport(bet_text)
-        odds_found = extract_odds(bet_text)
+        whole = as_leg(bet_text, tokens)
+        sport = detect_sport(whole)
+        odds_found = extract_odds(whole)
         
         legs.append({
             'id': 'leg-1',
             'sport': sport,
             'game': 'Unknown Game',
-            'betType': detect_bet_type(bet_text),
+            'betType': detect_bet_type(whole),
             'selection': bet_text[:100],
             'odds': odds_found[0] if odds_found else -110
         })
@@ -405,7 +525,7 @@ def parse_bet_text(bet_text: str) -> Dict[str, Any]:
     live_data = None
     if SPORTS_DATA_AVAILABLE:
         try:
-            live_data = get_enhanced_bet_analysis(bet_text)
+            live_data = get_enhanced_bet_analysis(bet_text, bet_legs)
         except Exception as e:
             print(f"Error fetching live data: {e}")
     
@@ -0,0 +1,481 @@
+"""
+Bet Slip Tokenizer
+
+A slip used to be scanned by more than a dozen regular expressions per leg
+(sport, bet type, five odds patterns, matchups and two cleanups), and the
+live-data lookup then split it again and ran its own. Now one compiled
+pattern splits the slip into tokens in a single pass. The slip is split
+into legs on those tokens, and the detectors in ``bet_parser`` and
+``sports_data`` read the tokens rather than the raw text.
+
+Token kinds:
+    word     letters (``[^\\W\\d_]+``)
+    number   digits (``220``)
+    signed   digits with a sign attached (``-110``, ``+3``)
+    space    whitespace other than newlines
+    newline  a newline (separates legs)
+    sep      a comma or semicolon (separates legs on a one-line slip)
+    punct    any other single character (``@``, ``(``, ``.``, ``+`` ...)
+
+Odds, lines, totals, team aliases and bet-type keywords are short runs of
+these tokens; the detectors recognise them without going back to the text.
+
+Tokens are kept as parallel lists rather than one object each, so lexing,
+splitting a slip and indexing a leg run in C (``findall``, ``map``,
+``list.index``) instead of a Python loop per token.
+"""
+
+import re
+from itertools import accumulate, compress, count
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+_LEXER = re.compile(r"\n|[^\S\n]+|[,;]|[+-]\d+|\d+|[^\W\d_]+|.", re.DOTALL)
+
+_LETTERS = re.compile(r"[^\W\d_]+")
+_HEAD = re.compile(r"[^\W\d_]+|\d+")
+
+_SPACE = frozenset(('space', 'newline'))
+_NUMERIC = frozenset(('number', 'signed'))
+_VERSUS = frozenset(('vs', 'v', 'at'))
+# Token kinds that end / start with a word character (a signed number starts with its sign)
+_WORD_ENDS = frozenset(('word', 'number', 'signed'))
+_WORD_STARTS = frozenset(('word', 'number'))
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+def _kind_of(text: str) -> str:
+    ch = text[0]
+    if ch == '\n':
+        return 'newline'
+    if ch.isspace():
+        return 'space'
+    if ch == ',' or ch == ';':
+        return 'sep'
+    if len(text) > 1 and (ch == '+' or ch == '-'):
+        return 'signed'
+    if ch.isdecimal():
+        return 'number'
+    if ch.isalnum():
+        return 'word'
+    return 'punct'
+
+
+class _Memo(dict):
+    """
+    A dict that fills itself from ``function`` and starts over when full.
+
+    Unlike ``lru_cache`` its ``__getitem__`` can be mapped over a list in C;
+    a few hundred token texts make up most slips, so hits are the rule.
+    """
+
+    __slots__ = ('function', 'maxsize')
+
+    def __init__(self, function, maxsize: int = 4096):
+        super().__init__()
+        self.function = function
+        self.maxsize = maxsize
+
+    def __missing__(self, key):
+        if len(self) >= self.maxsize:
+            self.clear()
+        value = self[key] = self.function(key)
+        return value
+
+
+_KINDS = _Memo(_kind_of)
+
+
+class Tokens:
+    """The tokens of a text as parallel lists: the kind, text, start and end of each."""
+
+    __slots__ = ('kinds', 'texts', 'starts', 'ends')
+
+    def __init__(self, kinds: List[str], texts: List[str], starts: List[int], ends: List[int]):
+        self.kinds = kinds
+        self.texts = texts
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Token, 'Tokens']:
+        if isinstance(index, slice):
+            return Tokens(self.kinds[index], self.texts[index], self.starts[index], self.ends[index])
+        return Token(self.kinds[index], self.texts[index], self.starts[index], self.ends[index])
+
+    def __iter__(self) -> Iterator[Token]:
+        return map(Token._make, zip(self.kinds, self.texts, self.starts, self.ends))
+
+
+def tokenize(text: str) -> Tokens:
+    """Split ``text`` into tokens in one pass."""
+    texts = _LEXER.findall(text)
+    ends = list(accumulate(map(len, texts)))
+    starts = [0]
+    starts += ends[:-1]
+    return Tokens(list(map(_KINDS.__getitem__, texts)), texts, starts, ends)
+
+
+def is_word_char(ch: str) -> bool:
+    """Whether ``ch`` is a regex word character (``\\w``)."""
+    return ch.isalnum() or ch == '_'
+
+
+class Leg:
+    """
+    One leg of a slip: the tokens between two separators, without the
+    whitespace around them.
+
+    Token positions index into ``source`` (the whole slip), so legs share
+    the slip's text instead of copying it. The first detector to run indexes
+    the leg's words and numbers, and the others look only at the tokens they
+    need.
+    """
+
+    __slots__ = ('source', 'tokens', 'start', 'end', '_words', '_word_at', '_signed', '_numbers', '_runs', '_matchups')
+
+    def __init__(self, source: str, tokens: Tokens, start: int = None, end: int = None):
+        self.source = source
+        self.tokens = tokens
+        self.start = tokens.starts[0] if start is None else start
+        self.end = tokens.ends[-1] if end is None else end
+        self._words = None
+        self._runs = None
+        self._matchups = None
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def _index(self):
+        kinds, texts = self.tokens.kinds, self.tokens.texts
+        self._word_at = list(compress(count(), map('word'.__eq__, kinds)))
+        self._words = [texts[i].lower() for i in self._word_at]
+        self._signed = list(compress(count(), map('signed'.__eq__, kinds)))
+        self._numbers = list(compress(count(), map(_NUMERIC.__contains__, kinds)))
+
+    @property
+    def words(self) -> List[str]:
+        """The leg's words, lower-cased."""
+        if self._words is None:
+            self._index()
+        return self._words
+
+    @property
+    def word_at(self) -> List[int]:
+        """Token index of each of ``words``."""
+        if self._words is None:
+            self._index()
+        return self._word_at
+
+    @property
+    def signed(self) -> List[int]:
+        """Token indexes of the signed numbers."""
+        if self._words is None:
+            self._index()
+        return self._signed
+
+    @property
+    def numbers(self) -> List[int]:
+        """Token indexes of all numbers, signed or not."""
+        if self._words is None:
+            self._index()
+        return self._numbers
+
+    def find_text(self, text: str) -> List[int]:
+        """Token indexes of the tokens equal to ``text``."""
+        texts = self.tokens.texts
+        if text not in texts:
+            return []
+        return list(compress(count(), map(text.__eq__, texts)))
+
+    def next_solid(self, index: int) -> int:
+        """Index of the first token after ``index`` that is not whitespace, or -1."""
+        kinds = self.tokens.kinds
+        for i in range(index + 1, len(kinds)):
+            if kinds[i] not in _SPACE:
+                return i
+        return -1
+
+    def prev_solid(self, index: int) -> int:
+        """Index of the last token before ``index`` that is not whitespace, or -1."""
+        kinds = self.tokens.kinds
+        for i in range(index - 1, -1, -1):
+            if kinds[i] not in _SPACE:
+                return i
+        return -1
+
+    @property
+    def runs(self) -> List[Tuple[int, int]]:
+        """
+        (start, end) of each run of word characters, as ``\\w+`` would see
+        them: adjacent words, numbers and underscores join up, while a sign
+        or any other character ends the run.
+        """
+        if self._runs is None:
+            runs = []
+            tokens = self.tokens
+            for kind, text, start, end in zip(tokens.kinds, tokens.texts, tokens.starts, tokens.ends):
+                if kind == 'word' or kind == 'number' or kind == 'signed' or text == '_':
+                    if kind == 'signed':
+                        start += 1
+                    if runs and runs[-1][1] == start:
+                        runs[-1] = (runs[-1][0], end)
+                    else:
+                        runs.append((start, end))
+            self._runs = runs
+        return self._runs
+
+    def gap_is_space(self, end: int, start: int) -> bool:
+        gap = self.source[end:start]
+        return gap != '' and gap.isspace()
+
+    def matchups(self) -> List[Tuple[str, str]]:
+        """
+        Team pairs written as "A vs B", "A v. B", "A @ B" or "A at B".
+
+        Each side is one or two words, matched the way
+        ``(\\w+(?:\\s+\\w+)?)\\s+(?:vs\\.?|v\\.?|@|at)\\s+(\\w+(?:\\s+\\w+)?)``
+        (case-insensitive) matches them, leftmost first and without overlaps.
+        The pairs are worked out once per leg and shared by every caller.
+        """
+        if self._matchups is None:
+            if '@' not in self.tokens.texts and _VERSUS.isdisjoint(self.words):
+                self._matchups = []
+            else:
+                self._matchups = self._find_matchups()
+        return self._matchups
+
+    def _find_matchups(self) -> List[Tuple[str, str]]:
+        runs = self.runs
+        found = []
+        i = 0
+        while i < len(runs):
+            # The first side takes two words when it can, as the greedy regex does
+            j = None
+            if i + 1 < len(runs) and self.gap_is_space(runs[i][1], runs[i + 1][0]) \
+                    and self._versus_after(i + 1) is not None:
+                j = i + 1
+            elif self._versus_after(i) is not None:
+                j = i
+            if j is None:
+                i += 1
+                continue
+            k = self._versus_after(j)
+            last = k + 1 if k + 1 < len(runs) and self.gap_is_space(runs[k][1], runs[k + 1][0]) else k
+            found.append((self.source[runs[i][0]:runs[j][1]], self.source[runs[k][0]:runs[last][1]]))
+            i = last + 1
+        return found
+
+    def _versus_after(self, j: int) -> Optional[int]:
+        # Index of the run opening the second side, if "vs"/"v"/"@"/"at" follows run j
+        runs = self.runs
+        if j + 1 >= len(runs):
+            return None
+        gap = self.source[runs[j][1]:runs[j + 1][0]]
+        if len(gap) >= 3 and gap.strip() == '@' and gap[0].isspace() and gap[-1].isspace():
+            return j + 1
+        if j + 2 >= len(runs) or not (gap and gap.isspace()):
+            return None
+        word = self.source[runs[j + 1][0]:runs[j + 1][1]].lower()
+        if word not in _VERSUS:
+            return None
+        after = self.source[runs[j + 1][1]:runs[j + 2][0]]
+        if word != 'at' and after[:1] == '.':
+            after = after[1:]
+        return j + 2 if after and after.isspace() else None
+
+
+def as_leg(text: str, tokens: Tokens = None) -> Leg:
+    """The whole of ``text`` as one leg, whitespace and separators included."""
+    return Leg(text, tokenize(text) if tokens is None else tokens, 0, len(text))
+
+
+def split_legs(text: str, tokens: Tokens = None) -> List[Leg]:
+    """
+    Split a slip into legs: one per non-blank line, or, for a one-line slip,
+    one per comma- or semicolon-separated part.
+    """
+    tokens = tokenize(text) if tokens is None else tokens
+    lines = _split(text, tokens, 'newline')
+    if len(lines) == 1 and 'sep' in lines[0].tokens.kinds:
+        return _split(text, lines[0].tokens, 'sep')
+    return lines
+
+
+def _split(text: str, tokens: Tokens, kind: str) -> List[Leg]:
+    kinds = tokens.kinds
+    legs = []
+    start = 0
+    while start <= len(kinds):
+        try:
+            stop = kinds.index(kind, start)
+        except ValueError:
+            stop = len(kinds)
+        first, last = start, stop
+        while first < last and kinds[first] in _SPACE:
+            first += 1
+        while last > first and kinds[last - 1] in _SPACE:
+            last -= 1
+        if first < last:
+            legs.append(Leg(text, tokens[first:last]))
+        start = stop + 1
+    return legs
+
+
+class KeywordIndex:
+    """
+    Finds which of a fixed set of keywords appear in a leg, with the same
+    substring semantics as ``keyword in text.lower()``.
+
+    A keyword made only of letters can only appear inside a single word
+    token, so each distinct word is checked once and remembered. Other
+    keywords ("red sox", "76ers", "ligue 1") are looked up by their first
+    word or number, which must end a token in the leg: where the keyword
+    starts inside a token ("yardsRed Sox", "-3.576ers"), its head is that
+    token's tail. Each token's tails are checked once and remembered too.
+    """
+
+    def __init__(self, keywords: Iterable[str], cache_size: int = 4096):
+        self.keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords))
+        self._in_word = tuple(k for k in self.keywords if _LETTERS.fullmatch(k))
+        self._phrases = {}
+        for keyword in self.keywords:
+            if keyword in self._in_word:
+                continue
+            head = _HEAD.match(keyword)
+            if head is None:
+                raise ValueError(f"Keyword must start with a letter or digit: {keyword!r}")
+            self._phrases.setdefault(head.group(), []).append(keyword)
+        self._digit_heads = any(head.isdecimal() for head in self._phrases)
+        self._hits = _Memo(self._scan_word, cache_size)
+        self._tails = _Memo(self._scan_tails, cache_size)
+
+    def _scan_word(self, word: str) -> Tuple[str, ...]:
+        return tuple(keyword for keyword in self._in_word if keyword in word)
+
+    def _scan_tails(self, text: str) -> Tuple[str, ...]:
+        # The phrase heads that ``text`` ends with
+        phrases = self._phrases
+        return tuple(text[i:] for i in range(len(text)) if text[i:] in phrases)
+
+    def find(self, leg: Leg) -> Set[str]:
+        found = set().union(*filter(None, map(self._hits.__getitem__, leg.words)))
+        if not self._phrases:
+            return found
+
+        tokens, source = leg.tokens, leg.source
+        tails = self._tails.__getitem__
+        heads = [(tokens.ends[i], head)
+                 for i, word in zip(leg.word_at, leg.words) for head in tails(word)]
+        for i in (leg.numbers if self._digit_heads else ()):
+            heads += [(tokens.ends[i], head) for head in tails(tokens.texts[i].lstrip('+-'))]
+        for stop, head in heads:
+            start = stop - len(head)
+            for phrase in self._phrases[head]:
+                end = start + len(phrase)
+                if end <= leg.end and source[start:end].lower() == phrase:
+                    found.add(phrase)
+        return found
+
+
+class TermAutomaton:
+    """
+    An Aho-Corasick automaton over tokens: finds the whole-word occurrences
+    of a fixed set of terms ("lakers", "red sox", "76ers") in one pass.
+
+    Terms are spelled in tokens rather than characters, so "as" matches the
+    word "as" but nothing inside "Lakers" or "was", and any run of spaces
+    inside a leg matches the space in "red sox". A scan costs one dictionary
+    step per token however many terms there are.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = list(dict.fromkeys(term.lower() for term in terms))
+        self._goto = [{}]
+        self._out = [()]
+        for term in self.terms:
+            self._add(term)
+        self._fail = self._link()
+
+    def _add(self, term: str):
+        tokens = tokenize(term)
+        if not tokens.kinds or tokens.kinds[0] not in ('word', 'number') \
+                or tokens.kinds[-1] not in ('word', 'number'):
+            raise ValueError(f"Term must start and end with a letter or digit: {term!r}")
+        state = 0
+        for symbol in map(_symbol, tokens.kinds, tokens.texts):
+            if symbol not in self._goto[state]:
+                self._goto[state][symbol] = len(self._goto)
+                self._goto.append({})
+                self._out.append(())
+            state = self._goto[state][symbol]
+        self._out[state] = ((len(tokens), term),)
+
+    def _link(self) -> List[int]:
+        # Breadth-first, so every state's failure target is linked before it
+        fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for symbol, child in self._goto[state].items():
+                target = fail[state]
+                while target and symbol not in self._goto[target]:
+                    target = fail[target]
+                fail[child] = self._goto[target].get(symbol, 0)
+                self._out[child] += self._out[fail[child]]
+                queue.append(child)
+        return fail
+
+    def scan(self, leg: Leg) -> List[Tuple[int, int, str]]:
+        """
+        (first token, token after the last, term) for each term in ``leg``,
+        in order. Where matches overlap the one starting first wins, and of
+        those the longest ("trail blazers" over "blazers").
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        kinds, texts = leg.tokens.kinds, leg.tokens.texts
+        root = goto[0]
+        found = []
+        state = 0
+        for i, symbol in enumerate(map(str.lower, texts)):
+            if state == 0:
+                # Terms start with a word or number, so most tokens stop here
+                if symbol not in root:
+                    continue
+            elif kinds[i] == 'space':
+                symbol = ' '
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for length, term in out[state]:
+                first = i + 1 - length
+                if not _joins_word(kinds, texts, first - 1, _WORD_ENDS) \
+                        and not _joins_word(kinds, texts, i + 1, _WORD_STARTS):
+                    found.append((first, i + 1, term))
+        if len(found) < 2:
+            return found
+
+        found.sort(key=lambda match: (match[0], -match[1]))
+        kept = []
+        for match in found:
+            if not kept or match[0] >= kept[-1][1]:
+                kept.append(match)
+        return kept
+
+
+def _symbol(kind: str, text: str) -> str:
+    return ' ' if kind == 'space' else text.lower()
+
+
+def _joins_word(kinds: List[str], texts: List[str], i: int, word_kinds: frozenset) -> bool:
+    # Whether token i would run on into the word next to it, i.e. no \b between them
+    if i < 0 or i >= len(kinds):
+        return False
+    return kinds[i] in word_kinds or texts[i] == '_'
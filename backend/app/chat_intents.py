@@ -0,0 +1,138 @@
+"""
+Intent routing for the chat assistant.
+
+The intents ``handle_input`` used to pick with a chain of ``in`` checks are
+declared here as a table, in the chain's priority order. The router compiles
+the table once, at startup, into a single function of ``in`` checks, so a
+message is routed by the same C substring searches the chain used, without
+walking the table per message, and a new intent is one line rather than
+another branch.
+
+A rule is a list of clauses, and an intent matches when every keyword of
+any clause occurs in the message (as a substring, like the old checks).
+Clauses sharing their first keyword test it once, and a clause that only
+adds keywords to another one of its intent is dropped.
+"""
+
+import re
+from itertools import groupby
+
+
+class Intent:
+    """A named intent: ``clauses`` like ``"bankroll+set"``, an ``exact`` phrase list, or both."""
+
+    __slots__ = ("name", "clauses", "exact", "guard")
+
+    def __init__(self, name, *clauses, exact=(), guard=None):
+        self.name = name
+        self.clauses = [tuple(clause.split("+")) for clause in clauses]
+        self.exact = tuple(exact)
+        # Optional compiled regex the message must also match
+        self.guard = guard
+
+    @property
+    def keywords(self):
+        return frozenset().union(*self.clauses)
+
+
+class IntentRouter:
+    """
+    Intents checked in priority order; the first one matching a message wins.
+
+    ``route`` is generated from the table when the router is built: one
+    ``if`` per intent, in order, as a hand-written chain would have it.
+    ``source`` keeps the generated code for debugging.
+    """
+
+    def __init__(self, intents, default):
+        self.intents = list(intents)
+        self.default = default
+        self.source, self.route = self._compile()
+
+    def _compile(self):
+        exact = {}
+        for intent in self.intents:
+            for phrase in intent.exact:
+                exact.setdefault(phrase, intent.name)
+        namespace = {"EXACT": exact}
+        lines = [
+            "def route(text):",
+            "    if text in EXACT:",
+            "        return EXACT[text]",
+        ]
+        for n, intent in enumerate(self.intents):
+            if not intent.clauses:
+                continue
+            condition = _any(_clause_group(first, [clause[1:] for clause in clauses])
+                             for first, clauses in groupby(_needed(intent.clauses), key=lambda clause: clause[0]))
+            if intent.guard is not None:
+                namespace[f"GUARD_{n}"] = intent.guard.search
+                condition = f"({condition}) and GUARD_{n}(text)"
+            lines.append(f"    if {condition}:")
+            lines.append(f"        return {intent.name!r}")
+        lines.append(f"    return {self.default!r}")
+
+        source = "\n".join(lines) + "\n"
+        exec(compile(source, "<intent router>", "exec"), namespace)
+        route = namespace["route"]
+        route.__doc__ = "Return the intent name for a lower-cased, stripped message."
+        return source, route
+
+
+def _needed(clauses):
+    # A clause needing every keyword of another clause (and more) can never decide the match
+    kept = []
+    for clause in clauses:
+        keywords = set(clause)
+        if not any(set(other) <= keywords for other in kept) \
+                and not any(set(other) < keywords for other in clauses):
+            kept.append(clause)
+    return kept
+
+
+def _all(keywords):
+    return " and ".join(f"{keyword!r} in text" for keyword in keywords)
+
+
+def _any(conditions):
+    conditions = list(conditions)
+    if len(conditions) == 1:
+        return conditions[0]
+    return " or ".join(f"({condition})" for condition in conditions)
+
+
+def _clause_group(first, rests):
+    # Clauses starting with ``first``: test it once, then any of their other keywords
+    condition = f"{first!r} in text"
+    if not all(rests):
+        return condition
+    others = _any(map(_all, rests))
+    return f"{condition} and ({others})" if len(rests) > 1 else f"{condition} and {others}"
+
+
+# Budget categories every user starts with (and the only ones chat can update)
+DEFAULT_CATEGORIES = ("food", "entertainment", "bills")
+
+# Highest priority first; keep in step with the handlers in main.py
+CHAT_INTENTS = [
+    Intent("greeting", exact=("hi", "hello", "hey")),
+    Intent("help", "help"),
+    Intent("set_bankroll", "bankroll+set", "bankroll+update", "bankroll+change", "bankroll+make"),
+    Intent("risk_mode", "risk mode", "aggressive+set", "conservative+set"),
+    Intent("recommend_stake", "recommend+stake"),
+    Intent("percent_of_bankroll", "bankroll+%", guard=re.compile(r"\d+(?:\.\d+)?\s*%")),
+    Intent("implied_probability", "implied+prob"),
+    Intent("payout", "payout", "profit"),
+    Intent("parlay_odds", "parlay+odds", "parlay+for"),
+    Intent("odds_hint", "odds", "probability"),
+    Intent("bankroll_hint", "bankroll", "stake"),
+    Intent("bet_hint", "bet", "parlay"),
+    Intent("reset", "reset"),
+    Intent("income", "income"),
+    Intent("expenses", "expense"),
+    Intent("savings", "saving"),
+    Intent("category", *DEFAULT_CATEGORIES),
+    Intent("budget", "budget", "show"),
+]
+
+CHAT_ROUTER = IntentRouter(CHAT_INTENTS, default="summary")
@@ -6,11 +6,12 @@ Currently uses simulated data - can be upgraded to use real API with key.
 """
 
 import requests
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
-import re
 import random
 
+from app.bet_tokens import Leg, TermAutomaton, as_leg, split_legs
+
 # API Configuration - Set your API key here or use environment variable
 # Get a free key at: https://www.balldontlie.io/
 API_KEY = None  # Set to your API key to enable live data
@@ -58,6 +59,8 @@ TEAM_ALIASES = {
     'cavs': 'Cleveland Cavaliers',
 }
 
+_ALIAS_MATCHER = TermAutomaton(TEAM_ALIASES)
+
 # Mock data for 2024-25 NBA season (realistic stats for demo)
 MOCK_TEAM_STATS = {
     'Los Angeles Lakers': {'abbr': 'LAL', 'wins': 15, 'losses': 12, 'ppg': 115.2, 'opp_ppg': 113.8, 'form': 'W W L W L'},
@@ -439,33 +442,21 @@ def generate_betting_insight(matchup: Dict, bet_type: str = 'spread', spread: fl
     return " | ".join(insights)
 
 
-def extract_teams_from_bet(bet_text: str) -> Tuple[Optional[str], Optional[str]]:
-    """Extract team names from bet text."""
-    bet_lower = bet_text.lower()
+def extract_teams_from_bet(bet_text: Union[str, Leg]) -> Tuple[Optional[str], Optional[str]]:
+    """Extract team names from bet text (or an already tokenized leg)."""
+    leg = as_leg(bet_text) if isinstance(bet_text, str) else bet_text
     
     # Look for "vs" or "@" pattern
-    patterns = [
-        r'(\w+(?:\s+\w+)?)\s+(?:vs\.?|v\.?|@|at)\s+(\w+(?:\s+\w+)?)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, bet_lower)
-        if match:
-            team1_name = match.group(1).strip()
-            team2_name = match.group(2).strip()
-            
-            # Validate these are actual teams
-            team1 = find_team(team1_name)
-            team2 = find_team(team2_name)
-            
-            if team1 and team2:
-                return team1_name, team2_name
+    for team1_name, team2_name in leg.matchups()[:1]:
+        team1_name = team1_name.lower()
+        team2_name = team2_name.lower()
+        
+        # Validate these are actual teams
+        if find_team(team1_name) and find_team(team2_name):
+            return team1_name, team2_name
     
-    # Try to find any team name in the text
-    found_teams = []
-    for alias in TEAM_ALIASES.keys():
-        if alias in bet_lower:
-            found_teams.append(alias)
+    # Try to find any team name in the text, as whole words and in the order written
+    found_teams = list(dict.fromkeys(alias for _, _, alias in _ALIAS_MATCHER.scan(leg)))
     
     if len(found_teams) >= 2:
         return found_teams[0], found_teams[1]
@@ -475,24 +466,23 @@ def extract_teams_from_bet(bet_text: str) -> Tuple[Optional[str], Optional[str]]
     return None, None
 
 
-def get_enhanced_bet_analysis(bet_text: str) -> Optional[Dict]:
+def get_enhanced_bet_analysis(bet_text: str, legs: Optional[List[Leg]] = None) -> Optional[Dict]:
     """Get enhanced analysis for a bet including real NBA data.
     
-    For multi-leg parlays, returns matchup data for each leg.
+    For multi-leg parlays, returns matchup data for each leg. ``legs`` is the
+    slip already split by ``bet_tokens.split_legs``, when the caller has it.
     """
     # Check if this is a multi-leg bet (contains multiple lines or delimiters)
-    lines = [line.strip() for line in bet_text.split('\n') if line.strip()]
-    if len(lines) == 1:
-        parts = re.split(r'[,;]', lines[0])
-        if len(parts) > 1:
-            lines = [p.strip() for p in parts if p.strip()]
+    if legs is None:
+        legs = split_legs(bet_text)
     
     # If multiple legs, analyze each one
-    if len(lines) > 1:
-        return get_multi_leg_analysis(lines)
+    if len(legs) > 1:
+        return get_multi_leg_analysis(legs)
     
     # Single leg analysis
-    team1_name, team2_name = extract_teams_from_bet(bet_text)
+    leg = legs[0] if legs else as_leg(bet_text)
+    team1_name, team2_name = extract_teams_from_bet(leg)
     
     if not team1_name:
         return None
@@ -502,8 +492,7 @@ def get_enhanced_bet_analysis(bet_text: str) -> Optional[Dict]:
         matchup = get_matchup_analysis(team1_name, team2_name)
         if matchup:
             # Extract spread if present
-            spread_match = re.search(r'([+-]?\d+\.?\d*)', bet_text)
-            spread = float(spread_match.group(1)) if spread_match else 0
+            spread = _first_number(leg)
             
             insight = generate_betting_insight(matchup, 'spread', spread)
             
@@ -529,14 +518,30 @@ def get_enhanced_bet_analysis(bet_text: str) -> Optional[Dict]:
     return None
 
 
-def get_multi_leg_analysis(bet_lines: List[str]) -> Optional[Dict]:
+def _first_number(leg: Leg) -> float:
+    """The first number in the leg (sign and decimals included), or 0."""
+    if not leg.numbers:
+        return 0
+    kinds, texts = leg.tokens.kinds, leg.tokens.texts
+    i = leg.numbers[0]
+    text = texts[i]
+    if i + 1 < len(texts) and texts[i + 1] == '.':
+        text += '.'
+        if i + 2 < len(texts) and kinds[i + 2] == 'number':
+            text += texts[i + 2]
+    return float(text)
+
+
+def get_multi_leg_analysis(bet_lines: List[Union[str, Leg]]) -> Optional[Dict]:
     """Analyze multiple bet legs and return data for each matchup."""
     all_matchups = []
     combined_insights = []
     all_teams = []
     
     for line in bet_lines:
-        team1_name, team2_name = extract_teams_from_bet(line)
+        leg = as_leg(line) if isinstance(line, str) else line
+        line = leg.text
+        team1_name, team2_name = extract_teams_from_bet(leg)
         
         if not team1_name:
             continue
@@ -544,8 +549,7 @@ def get_multi_leg_analysis(bet_lines: List[str]) -> Optional[Dict]:
         if team2_name:
             matchup = get_matchup_analysis(team1_name, team2_name)
             if matchup:
-                spread_match = re.search(r'([+-]?\d+\.?\d*)', line)
-                spread = float(spread_match.group(1)) if spread_match else 0
+                spread = _first_number(leg)
                 insight = generate_betting_insight(matchup, 'spread', spread)
                 
                 all_matchups.append({
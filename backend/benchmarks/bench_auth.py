@@ -0,0 +1,92 @@
+"""
+Benchmark: per-request auth overhead with and without the verified-JWT cache.
+
+Measures decode_token() on its own, the before_request auth hook for a
+token-only route, and a full token-only request (GET /validate through
+Flask's test client; it sends no query), each with the token cache enabled
+and disabled. Test client overhead dominates the last row. The app is pointed at an in-memory
+SQLite database only so its one-time schema check passes.
+
+    cd backend
+    python benchmarks/bench_auth.py --iterations 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import main
+from migrations import upgrade
+from tokens import TOKEN_CACHE
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_calls(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+def run(label, fn, iterations, cached):
+    TOKEN_CACHE.clear()
+    TOKEN_CACHE.max_size = 10000 if cached else 0
+    fn()  # warm up (and fill the cache)
+    timings = time_calls(fn, iterations)
+    mode = "cached" if cached else "uncached"
+    print(f"{label:<10} {mode:<9} {statistics.mean(timings):>9.2f} "
+          f"{percentile(timings, 50):>9.2f} {percentile(timings, 99):>9.2f}")
+    return statistics.mean(timings)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    db.configure("sqlite://")
+    with db.pooled_connection() as conn:
+        upgrade(conn)
+
+    token = main.create_access_token({"email": "bench@example.invalid"})
+    client = main.app.test_client()
+    client.set_cookie("token", token)
+
+    def auth_hook():
+        with main.app.test_request_context("/validate", headers={"Cookie": f"token={token}"}):
+            assert main.resolve_principal() is None
+
+    def validate():
+        resp = client.get("/validate")
+        assert resp.status_code == 200, resp.status_code
+
+    original_size = TOKEN_CACHE.max_size
+    print(f"{'path':<10} {'mode':<9} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+    try:
+        for label, fn in (
+            ("decode", lambda: main.decode_token(token)),
+            ("auth hook", auth_hook),
+            ("/validate", validate),
+        ):
+            uncached = run(label, fn, args.iterations, cached=False)
+            cached = run(label, fn, args.iterations, cached=True)
+            print(f"{label:<10} saved     {uncached - cached:>9.2f} us/request\n")
+    finally:
+        TOKEN_CACHE.max_size = original_size
+        TOKEN_CACHE.clear()
+        db.configure(None)
+
+
+if __name__ == "__main__":
+    main_()
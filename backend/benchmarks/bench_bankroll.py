@@ -0,0 +1,231 @@
+"""
+Benchmark: bankroll create-or-update, legacy read-modify-write vs atomic upsert.
+
+Runs against DATABASE_URL (or the DB_* variables), migrated with
+`python migrations.py upgrade`, or against --database-url. An in-memory
+SQLite database (sqlite://) is migrated automatically. Creates throwaway
+users and deletes them afterwards.
+
+    cd backend
+    python benchmarks/bench_bankroll.py --iterations 500 --rtt-ms 0.5
+    python benchmarks/bench_bankroll.py --database-url sqlite:// --rtt-ms 0.5
+
+--rtt-ms adds an artificial delay to every round trip so a local database
+behaves more like one across the network. --threads runs concurrent writers
+against one user to show whether peak/lowest balances survive races.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DATABASE_URL, ConnectionPool, UnitOfWork, create_backend
+from migrations import upgrade
+from repositories import DEFAULT_BANKROLL, BankrollRepository
+
+
+class _SlowCursor:
+    def __init__(self, cursor, delay):
+        self._cursor = cursor
+        self._delay = delay
+
+    def execute(self, *args):
+        time.sleep(self._delay)
+        return self._cursor.execute(*args)
+
+    def executemany(self, *args):
+        time.sleep(self._delay)
+        return self._cursor.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _SlowConnection:
+    """Adds a fixed delay to each statement, commit and rollback."""
+
+    def __init__(self, conn, delay):
+        self._conn = conn
+        self._delay = delay
+
+    def cursor(self):
+        return _SlowCursor(self._conn.cursor(), self._delay)
+
+    def commit(self):
+        time.sleep(self._delay)
+        self._conn.commit()
+
+    def rollback(self):
+        time.sleep(self._delay)
+        self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def legacy_set_balance(uow, user_id, new_balance):
+    """The pre-repository path: SELECT (INSERT + SELECT if missing), then UPDATE."""
+    select = "SELECT id, current_balance, initial_bankroll, peak_balance, lowest_balance FROM bankrolls WHERE user_id = %s"
+    with uow.cursor() as c:
+        c.execute(select, (user_id,))
+        record = c.fetchone()
+        if not record:
+            c.execute(
+                "INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (user_id,) + (DEFAULT_BANKROLL,) * 4,
+            )
+            c.execute(select, (user_id,))
+            record = c.fetchone()
+
+        peak = max(float(record["peak_balance"] or new_balance), new_balance)
+        lowest = min(float(record["lowest_balance"] or new_balance), new_balance)
+        c.execute(
+            "UPDATE bankrolls SET current_balance = %s, peak_balance = %s, lowest_balance = %s WHERE user_id = %s",
+            (new_balance, peak, lowest, user_id),
+        )
+    return record
+
+
+def atomic_set_balance(uow, user_id, new_balance):
+    return BankrollRepository(uow).set_balance(user_id, new_balance)
+
+
+PATHS = {"legacy": legacy_set_balance, "atomic": atomic_set_balance}
+
+
+def run_once(pool, fn, user_id, balance):
+    uow = UnitOfWork(pool)
+    start = time.perf_counter()
+    try:
+        fn(uow, user_id, balance)
+        uow.commit()
+    finally:
+        uow.close()
+    return time.perf_counter() - start, uow.round_trips
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def create_users(pool, count, tag):
+    uow = UnitOfWork(pool)
+    ids = []
+    with uow.cursor() as c:
+        for n in range(count):
+            c.execute(
+                "INSERT INTO users (email, password, password_hash) VALUES (%s, 'x', 'x')",
+                (f"bench-{tag}-{n}-{random.randrange(1 << 30)}@example.invalid",),
+            )
+            ids.append(c.lastrowid)
+    uow.commit()
+    uow.close()
+    return ids
+
+
+def drop_users(pool, ids):
+    uow = UnitOfWork(pool)
+    with uow.cursor() as c:
+        c.executemany("DELETE FROM users WHERE id = %s", [(i,) for i in ids])
+    uow.commit()
+    uow.close()
+
+
+def bench_latency(pool, iterations):
+    print(f"{'path':<8} {'scenario':<9} {'trips/op':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for scenario in ("new", "existing"):
+        for name, fn in PATHS.items():
+            ids = create_users(pool, iterations, name)
+            try:
+                if scenario == "existing":
+                    for user_id in ids:
+                        run_once(pool, fn, user_id, DEFAULT_BANKROLL)
+                timings, trips = [], []
+                for user_id in ids:
+                    elapsed, count = run_once(pool, fn, user_id, random.uniform(100, 10000))
+                    timings.append(elapsed * 1000)
+                    trips.append(count)
+            finally:
+                drop_users(pool, ids)
+            print(f"{name:<8} {scenario:<9} {statistics.mean(trips):>9.2f} "
+                  f"{percentile(timings, 50):>8.3f} {percentile(timings, 99):>8.3f}")
+
+
+def bench_races(pool, threads, writes):
+    print(f"\n{threads} threads x {writes} writes to one bankroll")
+    for name, fn in PATHS.items():
+        (user_id,) = create_users(pool, 1, f"race-{name}")
+        written = []
+        lock = threading.Lock()
+
+        def writer():
+            for _ in range(writes):
+                balance = round(random.uniform(1, 100000), 2)
+                try:
+                    run_once(pool, fn, user_id, balance)
+                except Exception:
+                    continue  # duplicate-key races on the legacy insert path
+                with lock:
+                    written.append(balance)
+
+        try:
+            workers = [threading.Thread(target=writer) for _ in range(threads)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            uow = UnitOfWork(pool)
+            row = BankrollRepository(uow).get(user_id)
+            uow.close()
+        finally:
+            drop_users(pool, [user_id])
+
+        expected_peak = max(written + [DEFAULT_BANKROLL])
+        ok = abs(float(row["peak_balance"]) - expected_peak) < 0.005
+        print(f"{name:<8} peak {float(row['peak_balance']):>10.2f} expected {expected_peak:>10.2f} "
+              f"{'ok' if ok else 'LOST UPDATE'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="artificial delay per round trip")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50, help="writes per thread in the race test")
+    parser.add_argument("--database-url", default=DATABASE_URL, help="defaults to DATABASE_URL / DB_*")
+    args = parser.parse_args()
+
+    delay = args.rtt_ms / 1000.0
+    backend = create_backend(args.database_url)
+    if getattr(backend, "path", None) == ":memory:":
+        conn = backend.connect()
+        upgrade(conn)
+        conn.close()
+
+    def factory():
+        conn = backend.connect()
+        return _SlowConnection(conn, delay) if delay else conn
+
+    max_size = max(2, args.threads)
+    pool = ConnectionPool(factory=factory, max_size=min(max_size, backend.max_connections or max_size))
+    print(f"backend: {backend.dialect}")
+    try:
+        bench_latency(pool, args.iterations)
+        if args.threads > 1:
+            bench_races(pool, args.threads, args.writes)
+    finally:
+        pool.close()
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
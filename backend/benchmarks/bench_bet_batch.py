@@ -0,0 +1,77 @@
+"""
+Benchmark: slips per second through a serial parse loop vs the batch pool.
+
+Parses the same random slips (1 to 10 legs each) with a plain loop over
+parse_slip, as separate /parse-bet calls would, and with BetBatchParser at
+several worker counts. The pool is started and warmed with one batch before
+timing, as it would be in a running server. The team lookup is patched to
+return nothing in both (workers patch it as they start), so no time goes to
+the network.
+
+    cd backend
+    python benchmarks/bench_bet_batch.py --slips 2000 --workers 2 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import sports_data
+from bet_batch import BetBatchParser, parse_slip
+from tests.test_bet_tokens import random_slip
+
+
+def offline():
+    sports_data.get_all_teams = _no_teams
+
+
+def _no_teams():
+    return []
+
+
+def time_serial(slips):
+    started = time.perf_counter()
+    for slip in slips:
+        parse_slip(slip)
+    return time.perf_counter() - started
+
+
+def time_pool(slips, workers, chunk_size):
+    parser = BetBatchParser(workers=workers, chunk_size=chunk_size, min_parallel=0, initializer=offline)
+    try:
+        # Start the workers before timing
+        parser.parse(slips[:workers * chunk_size])
+        started = time.perf_counter()
+        parser.parse(slips)
+        return time.perf_counter() - started
+    finally:
+        parser.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slips", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--chunk", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(25)
+    slips = [random_slip(rng, rng.randint(1, 10)) for _ in range(args.slips)]
+    print(f"{os.cpu_count()} CPUs, {len(slips)} slips, chunks of {args.chunk}")
+    print(f"{'parser':<16} {'seconds':>10} {'slips/s':>10}")
+    with mock.patch.object(sports_data, "get_all_teams", return_value=[]):
+        seconds = time_serial(slips)
+    print(f"{'serial loop':<16} {seconds:>10.2f} {len(slips) / seconds:>10.0f}")
+    for workers in args.workers:
+        with mock.patch.object(sports_data, "get_all_teams", return_value=[]):
+            seconds = time_pool(slips, workers, args.chunk)
+        print(f"{f'pool x{workers}':<16} {seconds:>10.2f} {len(slips) / seconds:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
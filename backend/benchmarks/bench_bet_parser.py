@@ -0,0 +1,81 @@
+"""
+Benchmark: bet slip parsing, the old per-leg regexes vs the tokenizer.
+
+Builds random slips of 1 to 50 legs from the parity test's fragments and
+reports microseconds per slip for the work the tokenizer replaced: splitting
+the slip, the sport/bet type/odds/matchup detectors and the selection
+cleanup for every leg, and then the team and spread lookup the live-data
+analysis does for every leg. The odds maths and the analysis text are the
+same either way and are not timed.
+
+    cd backend
+    python benchmarks/bench_bet_parser.py --iterations 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import sports_data
+from app.bet_parser import _selection, detect_bet_type, detect_sports, extract_odds, extract_teams_and_games
+from app.bet_tokens import as_leg, split_legs, tokenize
+from tests.test_bet_tokens import legacy_parse_legs, legacy_team_lookup, random_slip
+
+LEG_COUNTS = (1, 2, 5, 10, 20, 50)
+
+
+def legacy(slip):
+    legacy_parse_legs(slip)
+    legacy_team_lookup(slip)
+
+
+def tokenized(slip):
+    legs = split_legs(slip, tokenize(slip))
+    detect_sports(legs)
+    for leg in legs:
+        detect_bet_type(leg)
+        extract_odds(leg)
+        extract_teams_and_games(leg)
+        _selection(leg)
+    for leg in legs if len(legs) > 1 else legs or [as_leg(slip)]:
+        sports_data.extract_teams_from_bet(leg)
+        sports_data._first_number(leg)
+
+
+def time_parsers(parsers, slips, iterations):
+    # The parsers take turns so that noise on the machine hits them alike
+    timings = {name: [] for name, _ in parsers}
+    for _ in range(iterations):
+        for name, parse in parsers:
+            started = time.perf_counter()
+            for slip in slips:
+                parse(slip)
+            timings[name].append((time.perf_counter() - started) * 1_000_000 / len(slips))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--slips", type=int, default=20, help="slips per leg count")
+    args = parser.parse_args()
+
+    rng = random.Random(23)
+    print(f"{'legs':<6} {'parser':<10} {'mean us':>10} {'p50 us':>10}")
+    # Keep find_team off the network; both parsers call it the same way
+    with mock.patch.object(sports_data, "get_all_teams", return_value=[]):
+        for legs in LEG_COUNTS:
+            slips = [random_slip(rng, legs) for _ in range(args.slips)]
+            timings = time_parsers((("regex", legacy), ("tokens", tokenized)), slips, args.iterations)
+            for name, runs in timings.items():
+                print(f"{legs:<6} {name:<10} {statistics.mean(runs):>10.1f} {statistics.median(runs):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
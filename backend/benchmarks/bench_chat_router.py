@@ -0,0 +1,97 @@
+"""
+Benchmark: chat intent routing, the old if-chain vs the compiled intent table.
+
+Routes a corpus of chat messages (the parity test's corpus plus longer
+free-text messages that match nothing and fall through the whole chain)
+and reports microseconds per message for each. Only routing is timed, not
+the handlers.
+
+A second table adds made-up intents to today's and routes the unmatched
+messages again, against a chain written out for the same intents. Both
+check intents one by one, so both cost more with every intent. The compiled
+table tests a keyword shared by several clauses of an intent once and drops
+clauses another clause already covers, so it should not cost more than the
+chain.
+
+    cd backend
+    python benchmarks/bench_chat_router.py --iterations 2000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chat_intents import CHAT_INTENTS, CHAT_ROUTER, Intent, IntentRouter
+from tests.test_chat_intents import CORPUS, chained_route
+
+UNMATCHED = [
+    "what do you think about the game tonight, any thoughts on the weather?",
+    "thanks a lot, that was really useful and i appreciate it",
+    "how are the knicks looking this season compared to last year",
+    "tell me a joke about accountants",
+]
+
+
+def time_route(route, messages, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        for text in messages:
+            route(text)
+        timings.append((time.perf_counter() - started) * 1_000_000 / len(messages))
+    return timings
+
+
+def extra_intents(count, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(count * 2)]
+    return [Intent(f"extra_{i}", words[2 * i], f"{words[2 * i + 1]}+{words[2 * i]}") for i in range(count)]
+
+
+def chain_over(intents):
+    """Generate a hand-written style if-chain of ``in`` checks for ``intents`` (guards ignored)."""
+    lines = ["def route(text):"]
+    for intent in intents:
+        condition = " or ".join(
+            "(" + " and ".join(f"{keyword!r} in text" for keyword in sorted(clause)) + ")"
+            for clause in intent.clauses
+        )
+        lines.append(f"    if {condition}: return {intent.name!r}")
+    lines.append("    return 'summary'")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["route"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    corpora = {
+        "corpus": [m.lower().strip() for m in CORPUS],
+        "unmatched": UNMATCHED,
+    }
+    print(f"{'messages':<10} {'router':<9} {'mean us':>9} {'p50 us':>9}")
+    for label, messages in corpora.items():
+        for name, route in (("if-chain", chained_route), ("compiled", CHAT_ROUTER.route)):
+            timings = time_route(route, messages, args.iterations)
+            print(f"{label:<10} {name:<9} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f}")
+
+    rng = random.Random(18)
+    print(f"\n{'intents':<10} {'router':<9} {'mean us':>9} {'p50 us':>9}   (unmatched messages)")
+    for extra in (0, 50, 200, 800):
+        intents = CHAT_INTENTS[1:] + extra_intents(extra, rng)
+        for name, route in (("if-chain", chain_over(intents)),
+                            ("compiled", IntentRouter(intents, default="summary").route)):
+            timings = time_route(route, UNMATCHED, max(1, args.iterations // 10))
+            print(f"{len(intents):<10} {name:<9} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
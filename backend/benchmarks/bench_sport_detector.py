@@ -0,0 +1,86 @@
+"""
+Benchmark: sport detection as the keyword list grows.
+
+Times the old per-keyword substring loop against the whole-word automaton
+on random legs, with the real SPORTS_KEYWORDS plus made-up leagues of 30
+teams each, and reports microseconds per leg. The substring loop grows
+with the number of keywords; the automaton should stay flat.
+
+    cd backend
+    python benchmarks/bench_sport_detector.py --iterations 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bet_parser import SPORTS_KEYWORDS
+from app.bet_tokens import TermAutomaton, split_legs
+from tests.test_bet_tokens import random_leg
+
+EXTRA_LEAGUES = (0, 10, 100, 1000)
+
+
+def keywords_with(extra_leagues):
+    keywords = dict(SPORTS_KEYWORDS)
+    for n in range(extra_leagues):
+        keywords[f"League {n}"] = [f"league{n}"] + [f"club{n} {k}" for k in range(30)]
+    return keywords
+
+
+def substring_detector(keywords):
+    def detect(leg):
+        text_lower = leg.text.lower()
+        for sport, names in keywords.items():
+            for name in names:
+                if name in text_lower:
+                    return sport
+        return 'Unknown'
+    return detect
+
+
+def automaton_detector(keywords):
+    terms = {}
+    for sport, names in keywords.items():
+        for name in names:
+            terms.setdefault(name, []).append(sport)
+    automaton = TermAutomaton(terms)
+
+    def detect(leg):
+        scores = {}
+        for _, _, term in automaton.scan(leg):
+            for sport in terms[term]:
+                scores[sport] = scores.get(sport, 0) + 1 / len(terms[term])
+        return max(scores, key=scores.get) if scores else 'Unknown'
+    return detect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--legs", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(24)
+    legs = [leg for leg in split_legs("\n".join(random_leg(rng) for _ in range(args.legs)))]
+    print(f"{'keywords':<10} {'detector':<12} {'mean us':>10} {'p50 us':>10}")
+    for extra in EXTRA_LEAGUES:
+        keywords = keywords_with(extra)
+        size = sum(map(len, keywords.values()))
+        for name, detect in (("substring", substring_detector(keywords)), ("automaton", automaton_detector(keywords))):
+            timings = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                for leg in legs:
+                    detect(leg)
+                timings.append((time.perf_counter() - started) * 1_000_000 / len(legs))
+            print(f"{size:<10} {name:<12} {statistics.mean(timings):>10.1f} {statistics.median(timings):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Bet slip parsing in bulk.
+
+Ingestion jobs send thousands of slips at a time. Parsing and scoring a slip
+is pure Python, so request threads would take turns on one core under the
+GIL. A batch is instead cut into chunks and the chunks are parsed by a pool
+of worker processes, so a slip costs no inter-process round trip of its own.
+Results come back in the order the slips were given. A slip that is empty
+or fails to parse gets an error in its own place and the rest still parse.
+
+Small batches are parsed in the calling process, where starting work in the
+pool would cost more than it saves. The pool is started on first use and
+kept for later batches.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+
+from app.bet_parser import get_stake_recommendation, parse_bet_text
+
+BET_BATCH_WORKERS = int(os.getenv("BET_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Slips sent to a worker at a time
+BET_BATCH_CHUNK = int(os.getenv("BET_BATCH_CHUNK", "50"))
+# Batches smaller than this are parsed without the pool
+BET_BATCH_MIN_PARALLEL = int(os.getenv("BET_BATCH_MIN_PARALLEL", "200"))
+DEFAULT_BANKROLL = 1000
+
+
+def parse_slip(bet_text, bankroll=DEFAULT_BANKROLL):
+    """Return /parse-bet's result for one slip: the parse plus a stake recommendation."""
+    result = parse_bet_text(bet_text)
+    if result.get("success"):
+        result["stakeRecommendation"] = get_stake_recommendation(
+            bankroll,
+            result.get("qualityScore", 50),
+            result.get("recommendation", "caution"),
+        )
+    return result
+
+
+def _parse_item(bet_text, bankroll):
+    if not isinstance(bet_text, str) or not bet_text:
+        return {"status": 400, "error": "No bet text provided"}
+    try:
+        return {"status": 200, "result": parse_slip(bet_text, bankroll)}
+    except Exception as e:
+        print(f"Error parsing bet: {e}")
+        return {"status": 500, "error": "Failed to parse bet text"}
+
+
+def _parse_chunk(items):
+    return [_parse_item(bet_text, bankroll) for bet_text, bankroll in items]
+
+
+class BetBatchParser:
+    """Parses lists of slips on a process pool, in order, with an error per failed slip."""
+
+    def __init__(self, workers=BET_BATCH_WORKERS, chunk_size=BET_BATCH_CHUNK,
+                 min_parallel=BET_BATCH_MIN_PARALLEL, initializer=None):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        # Run once in each worker process as it starts
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "slips": 0, "pooled_batches": 0, "errors": 0, "pool_restarts": 0}
+
+    def parse(self, slips, bankroll=DEFAULT_BANKROLL):
+        """
+        Parse ``slips`` and return one result per slip, in the same order:
+        ``{"status": 200, "result": ...}`` or ``{"status": 400/500, "error": ...}``.
+
+        Each slip is a bet text, or a ``(bet text, bankroll)`` pair to size its
+        stake recommendation against a bankroll other than ``bankroll``.
+        """
+        items = [slip if isinstance(slip, tuple) else (slip, bankroll) for slip in slips]
+        pooled = self.workers > 1 and len(items) >= max(self.min_parallel, 2)
+        results = self._parse_pooled(items) if pooled else _parse_chunk(items)
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["slips"] += len(items)
+            self._stats["pooled_batches"] += pooled
+            self._stats["errors"] += sum(1 for result in results if result["status"] != 200)
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"workers": self.workers, "chunk_size": self.chunk_size, "started": self._executor is not None})
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _parse_pooled(self, items):
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        try:
+            # map() hands results back in submission order
+            return list(chain.from_iterable(self._pool().map(_parse_chunk, chunks)))
+        except BrokenProcessPool as e:
+            # A worker died (killed, out of memory); start a new pool next time
+            # and finish this batch here
+            print(f"WARNING: bet batch pool failed, parsing in process: {e}")
+            with self._lock:
+                executor, self._executor = self._executor, None
+                self._stats["pool_restarts"] += 1
+            if executor is not None:
+                executor.shutdown(wait=False)
+            return _parse_chunk(items)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Workers are spawned rather than forked: the server's other
+                # threads may hold locks a forked child would inherit held
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer)
+            return self._executor
+
+
+BET_BATCH = BetBatchParser()
+
+
+def parse_bet_batch(slips, bankroll=DEFAULT_BANKROLL):
+    """Parse many slips on the shared worker pool; see BetBatchParser.parse."""
+    return BET_BATCH.parse(slips, bankroll)
@@ -0,0 +1,403 @@
+"""
+Per-user state of the chat assistant: budget figures and the risk mode.
+
+The state used to be one module-level dict, shared by every user and lost
+with the worker. It now lives in ``chat_state`` (one row per user) behind a
+write-behind cache. After the first load a user's state is served from
+memory, and a message that changes it only marks the entry dirty. A
+background thread writes the dirty entries every ``flush_interval`` seconds
+on one connection, so a burst of messages costs one write per user.
+
+Clean entries expire after ``ttl`` seconds, which bounds how long a change
+made on another worker can go unseen here. A worker that dies loses at most
+``flush_interval`` seconds of changes.
+
+Each row carries a version that every write bumps, and a flush only updates
+the row at the version its entry was loaded at. When another worker got
+there first, the row is read again and only the fields this worker changed
+are written over it, so workers behind a load balancer never overwrite each
+other's newer state with a stale copy.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pymysql
+
+from db import pooled_connection
+from queries import Query
+
+CHAT_STATE_FLUSH_INTERVAL = float(os.getenv("CHAT_STATE_FLUSH_INTERVAL", "2"))
+CHAT_STATE_CACHE_TTL = float(os.getenv("CHAT_STATE_CACHE_TTL", "60"))
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "10000"))
+
+DEFAULT_CATEGORY_AMOUNTS = {"food": 300, "entertainment": 200, "bills": 1000}
+
+
+def default_chat_state():
+    """Return a fresh copy of the state every user starts with."""
+    return {
+        "income": 3000,
+        "expenses": 1500,
+        "savings": 200,
+        "categories": dict(DEFAULT_CATEGORY_AMOUNTS),
+        "risk_mode": "conservative",
+    }
+
+
+class _Entry:
+    """A cached state, the row version it matches (None: no row yet) and the state that version holds."""
+
+    __slots__ = ("state", "expires_at", "version", "base")
+
+    def __init__(self, state, version):
+        self.state = state
+        self.expires_at = 0.0
+        self.version = version
+        self.base = copy_state(state)
+
+
+class ChatStateStore:
+    """Write-behind cache of ``chat_state`` rows, keyed by user id."""
+
+    SELECT_SQL = Query(
+        "chat_state.by_user",
+        "SELECT income, expenses, savings, categories, risk_mode, version FROM chat_state WHERE user_id = %s",
+    )
+
+    INSERT_SQL = Query("chat_state.insert", """
+        INSERT INTO chat_state (user_id, income, expenses, savings, categories, risk_mode, version)
+        VALUES (%s, %s, %s, %s, %s, %s, 1)
+    """)
+
+    # Matches no row when another worker has written since ``version``
+    UPDATE_SQL = Query("chat_state.update_version", """
+        UPDATE chat_state
+        SET income = %s, expenses = %s, savings = %s, categories = %s, risk_mode = %s,
+            version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = %s AND version = %s
+    """)
+
+    # Conflicting writes re-read and merged per flush before waiting for the next one
+    MAX_MERGES = 3
+
+    def __init__(self, flush_interval=CHAT_STATE_FLUSH_INTERVAL, ttl=CHAT_STATE_CACHE_TTL,
+                 max_size=CHAT_STATE_CACHE_SIZE, connect=pooled_connection, clock=time.monotonic):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.max_size = max_size
+        self._connect = connect
+        self._clock = clock
+        self._lock = threading.Lock()
+        # user_id -> _Entry
+        self._entries = OrderedDict()
+        self._dirty = set()
+        # Users whose snapshot the running flush is writing
+        self._flushing = set()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stats = {"hits": 0, "misses": 0, "flushes": 0, "rows_written": 0, "conflicts": 0,
+                       "flush_failures": 0, "dropped": 0, "evictions": 0}
+
+    def get(self, uow, user_id):
+        """
+        Return the live state dict for ``user_id``, loading it on a miss.
+
+        Callers change the dict in place and then call ``mark_dirty()``. A user
+        without a row gets the defaults; the row is written on the first change.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and (self._pinned(user_id) or entry.expires_at > self._clock()):
+                self._entries.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry.state
+            self._stats["misses"] += 1
+
+        with uow.cursor() as c:
+            c.execute(self.SELECT_SQL, (user_id,))
+            row = c.fetchone()
+        loaded = _from_row(row) if row else default_chat_state()
+        version = row["version"] if row else None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = _Entry(loaded, version)
+            elif not self._pinned(user_id):
+                # Refresh in place so a dict already handed out stays current
+                entry.state.clear()
+                entry.state.update(loaded)
+                entry.version, entry.base = version, copy_state(loaded)
+            entry.expires_at = self._clock() + self.ttl
+            self._entries.move_to_end(user_id)
+            self._evict()
+            return entry.state
+
+    def checkout(self, uow, user_id):
+        """
+        A private copy of the user's state, for changes that may be abandoned.
+
+        The copy is not seen by other requests. Hand it back with
+        apply_changes() once the changes should stand.
+        """
+        state = self.get(uow, user_id)
+        with self._lock:
+            return copy_state(state)
+
+    def apply_changes(self, uow, user_id, before, after):
+        """
+        Apply what changed from ``before`` to ``after`` (a checked-out copy)
+        to the user's live state and queue it to be written.
+
+        Only the changed fields are applied, so changes made to the live
+        state meanwhile by other requests are kept.
+        """
+        changes = _changes(before, after)
+        if not changes:
+            return
+        state = self.get(uow, user_id)
+        with self._lock:
+            _apply(state, changes)
+        self.mark_dirty(user_id)
+
+    def mark_dirty(self, user_id):
+        """Queue the user's state to be written by the next flush."""
+        with self._lock:
+            if user_id not in self._entries:
+                return
+            self._dirty.add(user_id)
+        if self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._start_flusher()
+
+    def flush(self):
+        """Write every dirty entry and commit once; return the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                user_ids, self._dirty = self._dirty, set()
+                # Copied under the lock: the flush never reads a dict a caller is changing
+                pending = {
+                    user_id: (copy_state(entry.state), entry.base, entry.version)
+                    for user_id, entry in ((user_id, self._entries.get(user_id)) for user_id in user_ids)
+                    if entry is not None
+                }
+                self._flushing = set(pending)
+            if not pending:
+                return 0
+
+            try:
+                written = self._write(pending)
+            except Exception as exc:
+                # Keep the changes queued and try again on the next flush
+                with self._lock:
+                    self._dirty |= user_ids
+                self._stats["flush_failures"] += 1
+                print(f"WARNING: could not write chat state: {exc}")
+                return 0
+            finally:
+                with self._lock:
+                    self._flushing = set()
+
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += written
+            return written
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["dirty"] = len(self._dirty)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _write(self, pending):
+        """
+        Write ``pending`` (user_id -> (state, base, version)) on one connection.
+
+        A row another worker has written since ``version`` is read again and
+        the fields that differ between ``base`` and ``state`` are written over
+        it, up to MAX_MERGES times; users still conflicting after that stay
+        dirty for the next flush.
+        """
+        written = 0
+        with self._connect() as conn:
+            for _ in range(self.MAX_MERGES + 1):
+                conflicts = {}
+                done = []
+                with conn.cursor() as c:
+                    for user_id, (state, base, version) in pending.items():
+                        if self._write_row(c, user_id, state, version):
+                            done.append((user_id, state, 1 if version is None else version + 1))
+                        else:
+                            conflicts[user_id] = (state, base, version)
+                conn.commit()
+                # Only a committed row moves its entry on: after a failed commit
+                # the entry still matches the row the retry will find
+                for user_id, state, new_version in done:
+                    self._written(user_id, state, new_version)
+                written += len(done)
+                if not conflicts:
+                    return written
+
+                self._stats["conflicts"] += len(conflicts)
+                pending = {}
+                with conn.cursor() as c:
+                    for user_id, (state, base, version) in conflicts.items():
+                        c.execute(self.SELECT_SQL, (user_id,))
+                        row = c.fetchone()
+                        if row is None:
+                            # No row yet the insert failed, or the row went with its user
+                            self._drop(user_id)
+                        else:
+                            pending[user_id] = self._merge(user_id, state, base, row)
+                conn.rollback()
+                if not pending:
+                    return written
+
+        with self._lock:
+            self._dirty.update(user_id for user_id in pending if user_id in self._entries)
+        return written
+
+    def _write_row(self, cursor, user_id, state, version):
+        row = _to_row(user_id, state)
+        if version is None:
+            try:
+                cursor.execute(self.INSERT_SQL, row)
+            except pymysql.err.IntegrityError:
+                # Another worker inserted first, or the user no longer exists
+                return False
+            return True
+        cursor.execute(self.UPDATE_SQL, (*row[1:], user_id, version))
+        return cursor.rowcount == 1
+
+    def _merge(self, user_id, state, base, row):
+        """Put this worker's changes (``base`` -> ``state``) over the newer ``row``; return the retry."""
+        remote = _from_row(row)
+        merged = copy_state(remote)
+        _apply(merged, _changes(base, state))
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._pull(entry, state, merged)
+                entry.version, entry.base = row["version"], remote
+        return merged, remote, row["version"]
+
+    def _written(self, user_id, state, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry.version, entry.base = version, state
+
+    def _pull(self, entry, sent, merged):
+        # Take the other worker's changes, except where a caller has changed
+        # the field again since ``sent`` was copied
+        live = _fields(copy_state(entry.state))
+        sent = _fields(sent)
+        _apply(entry.state, {key: value for key, value in _changes_fields(sent, _fields(merged)).items()
+                             if live.get(key, _MISSING) == sent.get(key, _MISSING)})
+
+    def _drop(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._dirty.discard(user_id)
+        self._stats["dropped"] += 1
+
+    def _pinned(self, user_id):
+        # Unwritten changes are neither reloaded nor evicted
+        return user_id in self._dirty or user_id in self._flushing
+
+    def _evict(self):
+        # Only clean entries can go; dirty ones wait for their flush
+        if len(self._entries) <= self.max_size:
+            return
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                break
+            if not self._pinned(user_id):
+                del self._entries[user_id]
+                self._stats["evictions"] += 1
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._flush_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="chat-state-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+_MISSING = object()
+
+
+def copy_state(state):
+    """A copy of ``state`` that can be changed without touching the original."""
+    return {**state, "categories": dict(state["categories"])}
+
+
+def _fields(state):
+    """Flatten a state to field -> value, with ("categories", name) for each category."""
+    fields = {name: value for name, value in state.items() if name != "categories"}
+    fields.update((("categories", name), amount) for name, amount in state["categories"].items())
+    return fields
+
+
+def _changes_fields(before, after):
+    return {key: value for key, value in after.items() if before.get(key, _MISSING) != value}
+
+
+def _changes(before, after):
+    """The fields of ``after`` that differ from ``before``."""
+    return _changes_fields(_fields(before), _fields(after))
+
+
+def _apply(state, changes):
+    for key, value in changes.items():
+        if isinstance(key, tuple):
+            state["categories"][key[1]] = value
+        else:
+            state[key] = value
+
+
+def _from_row(row):
+    categories = row["categories"]
+    if isinstance(categories, (str, bytes)):
+        categories = json.loads(categories)
+    return {
+        "income": float(row["income"]),
+        "expenses": float(row["expenses"]),
+        "savings": float(row["savings"]),
+        "categories": {name: float(amount) for name, amount in categories.items()},
+        "risk_mode": row["risk_mode"],
+    }
+
+
+def _to_row(user_id, state):
+    return (
+        user_id,
+        state["income"],
+        state["expenses"],
+        state["savings"],
+        json.dumps(state["categories"]),
+        state["risk_mode"],
+    )
+
+
+CHAT_STATE = ChatStateStore()
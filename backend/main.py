@@ -1,18 +1,50 @@
-from flask import Flask, render_template, request, jsonify, make_response, send_file
+from flask import Flask, Response, render_template, request, jsonify, make_response, send_file, g, has_app_context, stream_with_context
 from betting.bet_parser import parse_bet_text
 from betting.bet_analyzer import analyze_bet
 import re
 import hashlib
-from db import create_tables, get_connection
+from chat_state import CHAT_STATE, copy_state, default_chat_state
+from db import DB_READ_YOUR_WRITES_WINDOW, UnitOfWork, get_pool, get_read_pool, pooled_connection
+from metrics import CHAT_QUERIES, QUERY_LATENCY
+from mfa_qr import FORMATS as QR_FORMATS, MFA_QR, qr_format
+from migrations import SchemaOutOfDate, check_schema
+from passwords import (
+    PASSWORD_CALIBRATE_ON_START,
+    PasswordHasherBusy,
+    check_password,
+    get_password_hasher,
+    hash_password,
+    needs_rehash,
+)
+import queries
+from bet_batch import BET_BATCH, parse_slip
+from ratelimit import RATE_LIMITER, RateLimited
+from repositories import (
+    AUTH_USERS,
+    DEFAULT_BANKROLL,
+    REFRESH_TOKEN_DAYS,
+    BankrollRepository,
+    BetSlipRepository,
+    RefreshTokenRepository,
+    UserRepository,
+)
+from revocation import REVOKED_TOKENS
+from tokens import TOKEN_CACHE, token_digest
 import datetime
+import hmac
+import json
 import os
 import jwt
-import bcrypt
 import pymysql
 import io
+import secrets
+import threading
+import time
+import types
 import pyotp
-import qrcode
-from app.bet_parser import parse_bet_text, get_stake_recommendation
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.bet_parser import parse_bet_text
+from app.chat_intents import CHAT_ROUTER
 from app.bank_account import (
     BankAccount,
     encrypt_data,
@@ -34,304 +66,583 @@ from app.logic import (
 
 app = Flask(__name__)
 
-def get_db():
-    """Get a fresh database connection"""
-    return get_connection()
-conn = create_tables()
-ALGORITHM = "HS256"
-SECRET_KEY = "TEST_SECRET" # CHANGE LATER!!!
+# Reverse proxies (load balancers) in front of the app. Each one appends the
+# address it got the request from to X-Forwarded-For; trusting that many
+# entries makes request.remote_addr the client's address, which the rate
+# limits key on. Leave at 0 when clients connect directly, or they could
+# forge the header.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
-#defualt user info
-user_data = {
-    "income": 3000,
-    "expenses": 1500,
-    "savings": 200,
-    "categories": {
-        "food": 300,
-        "entertainment": 200,
-        "bills": 1000
-    },
-    "bankroll": 5000.0,
-    "risk_mode": "conservative"
-}
-
-def calculate_remaining_budget():
-    total_spent = sum(user_data["categories"].values()) + user_data["savings"]
-    return user_data["income"] - total_spent
-
-def ensure_connection():
-    """Ensure the global DB connection is alive, recreating it if needed."""
-    global conn
-    try:
-        conn.ping(reconnect=True)
-    except Exception:
-        conn = get_connection(create_db_if_missing=False)
+if PASSWORD_CALIBRATE_ON_START:
+    # Calibrate (or load the stored policy) now rather than on the first login
+    get_password_hasher()
 
+def get_uow():
+    """
+    Return this request's unit of work.
 
-def authenticate_user(include_user=False):
-    token = request.cookies.get("token")
+    Every query in a request shares one pooled connection and one transaction,
+    committed once after the view returns.
+    """
+    if "uow" not in g:
+        g.uow = UnitOfWork()
+    return g.uow
 
-    if not token:
-        return False, make_response("No token provided.", 401), None
 
-    payload = decode_token(token)
+# Set after a request commits writes; while it is valid the client's reads
+# stay on the primary so it sees its own changes despite replica lag.
+PRIMARY_READS_COOKIE = "db_primary_until"
 
-    if not payload or payload.get("type") != "access" or not payload.get("email"):
-        resp = make_response("Unauthorized.", 401)
-        resp.delete_cookie(
-            "token",
-            path="/",
-            httponly=True,
-            secure=False,
-            samesite="Lax",
-        )
-        return False, resp, None
 
-    if not include_user:
-        return True, None, payload
+def replica_reads(view):
+    """Let the GET/HEAD requests of a view read from a replica via get_read_uow()."""
+    view.replica_reads = True
+    return view
 
-    ensure_connection()
-    with conn.cursor() as c:
-        c.execute("SELECT id, email FROM users WHERE email = %s", (payload.get("email"),))
-        user = c.fetchone()
 
-    if not user:
-        return False, make_response("Unauthorized.", 401), None
+def _reads_pinned_to_primary():
+    try:
+        return float(request.cookies.get(PRIMARY_READS_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
 
-    return True, user, payload
 
-def handle_input(user_input, bankroll_record=None, user_id=None):
-    text = user_input.lower().strip()
+def get_read_uow():
+    """
+    Return the unit of work for reads that may be served by a replica.
 
-    def get_bankroll_balance():
-        if bankroll_record and bankroll_record.get("current_balance") is not None:
-            return float(bankroll_record.get("current_balance", 0))
-        return float(user_data.get("bankroll", 0))
+    Falls back to the request's primary unit of work outside @replica_reads
+    views, when no replica is configured, and within the read-your-writes
+    window after this client's last write.
+    """
+    if "read_uow" in g:
+        return g.read_uow
+    if not g.get("replica_reads") or _reads_pinned_to_primary():
+        return get_uow()
 
-    def set_bankroll_balance(amount: float):
-        nonlocal bankroll_record
+    read_pool = get_read_pool()
+    if read_pool is None:
+        return get_uow()
+    g.read_uow = UnitOfWork(read_pool)
+    return g.read_uow
 
-        if not user_id:
-            raise PermissionError("Please log in to update your bankroll.")
 
-        bankroll_record = update_bankroll_balance(user_id, amount, bankroll_record)
-        return bankroll_record
-
-    #Greet user
-    if text in ["hi", "hello", "hey"]:
-        return ("Hey there! I'm your AI Financial Assistant.<br>"
-                "You can ask me to:<br>"
-                "- Update your income or expenses<br>"
-                "- Add to food, bills, or entertainment<br>"
-                "- Type 'help' for a list of all commands!")
-
-    if "help" in text:
-        return ("Here's what you can say:<br>"
-                "<b>Budget / Finance:</b><br>"
-                "- 'Show my budget'<br>"
-                "- 'Add 200 to food'<br>"
-                "- 'Update entertainment to 400'<br>"
-                "- 'Set income to 5000'<br>"
-                "- 'Update savings to 300'<br>"
-                "- 'Reset data'<br><br>"
-                "<b>Bankroll / Betting Math:</b><br>"
-                "- 'Set bankroll to 5000'<br>"
-                "- 'What is 2% of bankroll?'<br>"
-                "- 'Recommend conservative stake'<br>"
-                "- 'Recommend aggressive stake'<br>"
-                "- 'Set risk mode to conservative'<br>"
-                "- 'Set risk mode to aggressive'<br>"
-                "- 'Implied probability for -110'<br>"
-                "- 'Payout for stake 100 at -110'<br>"
-                "- 'Parlay odds for -110, +145, -105'")
-
-    # set bankroll to 5000
-    if "bankroll" in text and any(word in text for word in ["set", "update", "change", "make"]):
-        m = re.search(r"(?:set|update|change|make)\s+bankroll\s+(?:to\s+)?(\d+(?:\.\d+)?)", text)
-        if not m:
-            return "Try: <b>Set bankroll to 5000</b>"
-
-        updated_record = set_bankroll_balance(float(m.group(1)))
-        return f"Bankroll updated to <b>${updated_record.get('current_balance', 0):,.2f}</b>."
-
-    # set risk mode
-    if "risk mode" in text or ("set" in text and "aggressive" in text) or ("set" in text and "conservative" in text):
-        if "aggressive" in text:
-            user_data["risk_mode"] = "aggressive"
-            return "Risk mode set to <b>aggressive</b> (2–5% stake guidance)."
-        if "conservative" in text:
-            user_data["risk_mode"] = "conservative"
-            return "Risk mode set to <b>conservative</b> (1–2% stake guidance)."
-        return "Try: <b>Set risk mode to conservative</b> or <b>Set risk mode to aggressive</b>."
-
-    # recommend stake
-    if "recommend" in text and "stake" in text:
-        rec = recommend_stake(float(get_bankroll_balance()), user_data.get("risk_mode", "conservative"))
-        if not rec:
-            return "Bankroll must be set to a positive number first. Try: <b>Set bankroll to 5000</b>"
-        return (f"Recommended stake range (<b>{rec['mode']}</b>):<br>"
-                f"- {rec['low_pct']}%: <b>${rec['low']:,.2f}</b><br>"
-                f"- {rec['high_pct']}%: <b>${rec['high']:,.2f}</b>")
-
-    # percent of bankroll
-    if "bankroll" in text and parse_percent(text) is not None:
-        pct = parse_percent(text)
-        bankroll = float(get_bankroll_balance())
-        amt = bankroll * (pct / 100.0)
-        return f"{pct}% of bankroll (<b>${bankroll:,.2f}</b>) is <b>${amt:,.2f}</b>."
-
-    # implied probability for -110
-    if "implied" in text and "prob" in text:
-        odds = extract_first_american_odds(text)
-        if odds is None:
-            return "Try: <b>Implied probability for -110</b>"
-        try:
-            p = implied_probability(odds) * 100.0
-            return f"Implied probability for <b>{odds}</b> is <b>{p:.2f}%</b>."
-        except ValueError as e:
-            return str(e)
-
-    # payout for stake 100 at -110
-    if "payout" in text or "profit" in text:
-        stake = parse_stake(text)
-        odds = extract_first_american_odds(text)
-        if stake is None or odds is None:
-            return "Try: <b>Payout for stake 100 at -110</b>"
-        if stake <= 0:
-            return "Stake must be greater than 0."
-        try:
-            res = payout_for_stake(stake, odds)
-            return (f"For stake <b>${stake:,.2f}</b> at <b>{odds}</b>:<br>"
-                    f"- Decimal odds: <b>{res['decimal_odds']}</b><br>"
-                    f"- Profit: <b>${res['profit']:,.2f}</b><br>"
-                    f"- Total payout: <b>${res['total_payout']:,.2f}</b>")
-        except ValueError as e:
-            return str(e)
-
-    # parlay odds for -110, +145, -105
-    if "parlay" in text and ("odds" in text or "for" in text):
-        odds_list = re.findall(r"(?<!\d)([+-]?\d{2,4})(?!\d)", text)
-        if not odds_list or len(odds_list) < 2:
-            return "Try: <b>Parlay odds for -110, +145, -105</b>"
-        try:
-            decimals = [american_to_decimal(int(o)) for o in odds_list]
-            parlay_decimal = 1.0
-            for d in decimals:
-                parlay_decimal *= d
-
-            # Convert decimal -> American approximation
-            if parlay_decimal >= 2.0:
-                parlay_american = int(round((parlay_decimal - 1.0) * 100))
-                american_str = f"+{parlay_american}"
-            else:
-                parlay_american = int(round(-100 / (parlay_decimal - 1.0)))
-                american_str = f"{parlay_american}"
-
-            return (f"Parlay decimal odds: <b>{parlay_decimal:.4f}</b><br>"
-                    f"Approx. parlay American odds: <b>{american_str}</b>")
-        except Exception:
-            return "Could not parse parlay odds. Make sure you include valid odds like -110, +145."
-
-    if "odds" in text or "probability" in text:
-        return "Try: <b>Implied probability for -110</b> or <b>Payout for stake 100 at -110</b>."
-    if "bankroll" in text or "stake" in text:
-        return "Try: <b>Set bankroll to 5000</b> then <b>Recommend conservative stake</b>."
-    if "bet" in text or "parlay" in text:
-        return "Try: <b>Parlay odds for -110, +145, -105</b>."
-
-    # reset data 
-    if "reset" in text:
-        user_data.update({
-            "income": 3000,
-            "expenses": 1500,
-            "savings": 200,
-            "categories": {"food": 300, "entertainment": 200, "bills": 1000},
-            "bankroll": 5000.0,
-            "risk_mode": "conservative"
-        })
-        return "All data reset to default values."
+def rate_limited(account=None, failure=401):
+    """
+    Throttle a credential endpoint per client IP and, when ``account`` is
+    given, per account.
 
-    # update income
-    if "income" in text:
-        try:
-            amount = float("".join([c for c in text if c.isdigit() or c == "."]))
-            if any(word in text for word in ["update", "set", "change", "make"]):
-                user_data["income"] = amount
-                return f"Income updated to ${amount:,.2f}."
-            else:
-                user_data["income"] += amount
-                return f"Added ${amount:,.2f} to income. Total: ${user_data['income']:,.2f}."
-        except:
-            return "Couldn't process income update."
+    ``account()`` returns the email the request is for, or None. It must not
+    touch the database: enforce_rate_limits() runs before anything else. A
+    ``failure`` status from the view counts as a failed attempt for the
+    account on this endpoint; a success clears its failures.
+    """
+    def declare(view):
+        view.rate_limited = True
+        view.rate_limit_account = account
+        view.rate_limit_failure = failure
+        return view
+    return declare
+
+
+def _body_email():
+    data = request.get_json(silent=True)
+    email = data.get("email") if isinstance(data, dict) else None
+    return email if isinstance(email, str) else None
+
+
+def _temp_token_email():
+    token = request.cookies.get("temp_token")
+    payload = decode_token(token) if token else None
+    return payload.get("email") if payload and payload.get("mfa_pending") is True else None
+
+
+def _rate_limit_account(view):
+    account = view.rate_limit_account() if view.rate_limit_account else None
+    # Failures are counted per endpoint, so a password that is known cannot
+    # be used to clear the count of wrong MFA codes
+    return f"{request.endpoint}:{account}" if account else None
+
+
+# Registered first, so a throttled request costs no query and no hash
+@app.before_request
+def enforce_rate_limits():
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, "rate_limited", False):
+        RATE_LIMITER.hit(request.remote_addr, _rate_limit_account(view))
+    return None
+
+
+@app.after_request
+def record_credential_outcome(response):
+    view = app.view_functions.get(request.endpoint)
+    if getattr(view, "rate_limited", False):
+        if response.status_code == view.rate_limit_failure:
+            RATE_LIMITER.failed(_rate_limit_account(view))
+        elif response.status_code < 300:
+            RATE_LIMITER.succeeded(_rate_limit_account(view))
+    return response
+
+
+# Schema changes run via `python migrations.py upgrade`; each worker only
+# verifies the schema version once, on its first request.
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+@app.before_request
+def verify_schema_version():
+    global _schema_checked
+    if _schema_checked:
+        return None
 
-    # update expenses
-    if "expense" in text or "expenses" in text:
+    with _schema_lock:
+        if _schema_checked:
+            return None
         try:
-            amount = float("".join([c for c in text if c.isdigit() or c == "."]))
-            if any(word in text for word in ["update", "set", "change"]):
-                user_data["expenses"] = amount
-                return f"Expenses updated to ${amount:,.2f}."
-            else:
-                user_data["expenses"] += amount
-                return f"Added ${amount:,.2f} to expenses. Total: ${user_data['expenses']:,.2f}."
-        except:
-            return "Couldn't process expenses update."
+            with pooled_connection() as conn:
+                check_schema(conn)
+            # Revoked tokens are known before the first token is checked
+            REVOKED_TOKENS.start()
+        except SchemaOutOfDate as exc:
+            print(f"SCHEMA ERROR: {exc}")
+            return make_response("Service unavailable: database schema is out of date.", 503)
+        except Exception as exc:
+            # Leave the check pending; routes that need the database will fail on their own.
+            print(f"DB ERROR: schema check failed: {exc}")
+            return None
+        _schema_checked = True
+    return None
 
-    # update the savings
-    if "saving" in text or "savings" in text:
-        try:
-            amount = float("".join([c for c in text if c.isdigit() or c == "."]))
-            if any(word in text for word in ["update", "set", "change"]):
-                user_data["savings"] = amount
-                return f"Savings updated to ${amount:,.2f}."
+ALGORITHM = "HS256"
+SECRET_KEY = "TEST_SECRET" # CHANGE LATER!!!
+
+# Shared secret for /admin/* endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Chat state for visitors who are not logged in (shared by all of them)
+user_data = {**default_chat_state(), "bankroll": 5000.0}
+
+def calculate_remaining_budget(state=None):
+    state = user_data if state is None else state
+    total_spent = sum(state["categories"].values()) + state["savings"]
+    return state["income"] - total_spent
+
+class ChatContext:
+    """
+    The user, bankroll and budget state a chat message may read or change.
+
+    Each is loaded on first use, so messages that need none of them (help,
+    odds maths) cost no query. ``load_user`` is called at most once to find
+    the logged-in user. With ``defer_writes`` (used by /chat/batch) bankroll
+    updates are queued until the request commits, and state changes are
+    made to a private copy that flush() applies to the shared cache. A batch
+    that fails before flush() leaves no trace in either.
+    """
+
+    def __init__(self, bankroll_record=None, user_id=None, defer_writes=False, load_user=None):
+        self._bankroll_record = bankroll_record
+        self._bankroll_loaded = bankroll_record is not None
+        self._user_id = user_id
+        self._user = None
+        self._load_user = load_user
+        self.defer_writes = defer_writes
+        self._state = None
+        self._state_before = None
+        self._state_dirty = False
+
+    @property
+    def user(self):
+        """The logged-in user's row, or None."""
+        if self._load_user is not None:
+            self._user, self._load_user = self._load_user(), None
+        return self._user
+
+    @property
+    def user_id(self):
+        if self._user_id is None and self.user is not None:
+            self._user_id = self.user.get("id")
+        return self._user_id
+
+    @property
+    def bankroll_record(self):
+        """The user's bankroll row, read on first use; None if anonymous or not created yet."""
+        if not self._bankroll_loaded:
+            self._bankroll_loaded = True
+            if self.user_id is not None:
+                self._bankroll_record = BankrollRepository(get_uow()).get(self.user_id)
+        return self._bankroll_record
+
+    @property
+    def state(self):
+        """The user's own state (loaded on first use), or the shared one when anonymous."""
+        if self.user_id is None:
+            return user_data
+        if self._state is None:
+            if self.defer_writes:
+                self._state = CHAT_STATE.checkout(get_uow(), self.user_id)
+                self._state_before = copy_state(self._state)
             else:
-                user_data["savings"] += amount
-                return f"Added ${amount:,.2f} to savings. Total: ${user_data['savings']:,.2f}."
-        except:
-            return "Couldn't process savings update."
-
-    # update categories
-    for category in user_data["categories"]:
-        if category in text:
+                self._state = CHAT_STATE.get(get_uow(), self.user_id)
+        return self._state
+
+    def state_changed(self):
+        if self.user_id is None:
+            return
+        if self.defer_writes:
+            self._state_dirty = True
+        else:
+            CHAT_STATE.mark_dirty(self.user_id)
+
+    def flush(self):
+        """Apply the state changes held back by ``defer_writes``."""
+        if self._state_dirty:
+            CHAT_STATE.apply_changes(get_uow(), self.user_id, self._state_before, self._state)
+            self._state_before = copy_state(self._state)
+            self._state_dirty = False
+
+    def bankroll_balance(self):
+        if self.bankroll_record and self.bankroll_record.get("current_balance") is not None:
+            return float(self.bankroll_record.get("current_balance", 0))
+        if self.user_id is not None:
+            # The row is created with this balance on the first update
+            return float(DEFAULT_BANKROLL)
+        return float(user_data.get("bankroll", 0))
+
+    def set_bankroll_balance(self, amount: float):
+        if not self.user_id:
+            raise PermissionError("Please log in to update your bankroll.")
+
+        if self.defer_writes:
+            record = BankrollRepository(get_uow()).queue_balance(self.user_id, amount)
+        else:
+            record = update_bankroll_balance(self.user_id, amount, returning=False)
+        self._bankroll_record, self._bankroll_loaded = record, True
+        return record
+
+
+# Intent name -> handler(text, ctx); routing is in app/chat_intents.py
+CHAT_HANDLERS = {}
+
+def chat_intent(name, writes=False):
+    """Register a handler; ``writes`` marks intents that may change the user's rows."""
+    def register(handler):
+        handler.writes = writes
+        CHAT_HANDLERS[name] = handler
+        return handler
+    return register
+
+
+def chat_steps(result):
+    """
+    Yield ("partial", text) for each intermediate result of a handler, then ("reply", text).
+
+    A handler returns its reply, or is a generator that yields partial
+    results as they become available and returns the reply.
+    """
+    if isinstance(result, types.GeneratorType):
+        while True:
             try:
-                amount = float("".join([c for c in text if c.isdigit() or c == "."]))
-                if any(word in text for word in ["update", "set", "change", "make"]):
-                    user_data["categories"][category] = amount
-                    return f"{category.capitalize()} updated to ${amount:,.2f}."
-                else:
-                    user_data["categories"][category] += amount
-                    return f"Added ${amount:,.2f} to {category}. Total: ${user_data['categories'][category]:,.2f}."
-            except:
-                return f"Please specify a valid amount for {category}."
-
-    # show user budget
-    if "budget" in text or "show" in text:
-        remaining = calculate_remaining_budget()
-        category_breakdown = "<br>".join([f"- {k.capitalize()}: ${v:,.2f}" for k, v in user_data["categories"].items()])
-        return (f"Here's your budget breakdown:<br><br>"
-                f"<b>Income:</b> ${user_data['income']:,.2f}<br>"
-                f"<b>Expenses:</b> ${user_data['expenses']:,.2f}<br>"
-                f"<b>Savings:</b> ${user_data['savings']:,.2f}<br><br>"
-                f"{category_breakdown}<br><br>"
-                f"<b>Remaining:</b> ${remaining:,.2f}")
-
-    # default
-    remaining = calculate_remaining_budget()
+                partial = next(result)
+            except StopIteration as stop:
+                result = stop.value
+                break
+            yield "partial", partial
+    yield "reply", result
+
+
+def _request_round_trips():
+    if not has_app_context():
+        return 0
+    return sum(g.get(key).round_trips for key in ("uow", "read_uow") if g.get(key) is not None)
+
+
+def count_chat_queries(intent, round_trips_before):
+    """Record a chat message and whether answering it needed the database."""
+    queries = _request_round_trips() - round_trips_before
+    CHAT_QUERIES.add(intent, messages=1, queries=queries, db_free=int(queries == 0))
+
+
+def handle_input(user_input, bankroll_record=None, user_id=None, ctx=None):
+    """Return the reply to one chat message; pass ``ctx`` to share one context between messages."""
+    text = user_input.lower().strip()
+    if ctx is None:
+        ctx = ChatContext(bankroll_record, user_id)
+    intent = CHAT_ROUTER.route(text)
+    round_trips = _request_round_trips()
+    try:
+        for _, reply in chat_steps(CHAT_HANDLERS[intent](text, ctx)):
+            pass
+    finally:
+        count_chat_queries(intent, round_trips)
+    return reply
+
+
+_SET_BANKROLL = re.compile(r"(?:set|update|change|make)\s+bankroll\s+(?:to\s+)?(\d+(?:\.\d+)?)")
+_ODDS_TOKENS = re.compile(r"(?<!\d)([+-]?\d{2,4})(?!\d)")
+
+
+def _amount_in(text):
+    return float("".join([c for c in text if c.isdigit() or c == "."]))
+
+
+#Greet user
+@chat_intent("greeting")
+def _greeting(text, ctx):
+    return ("Hey there! I'm your AI Financial Assistant.<br>"
+            "You can ask me to:<br>"
+            "- Update your income or expenses<br>"
+            "- Add to food, bills, or entertainment<br>"
+            "- Type 'help' for a list of all commands!")
+
+@chat_intent("help")
+def _help(text, ctx):
+    return ("Here's what you can say:<br>"
+            "<b>Budget / Finance:</b><br>"
+            "- 'Show my budget'<br>"
+            "- 'Add 200 to food'<br>"
+            "- 'Update entertainment to 400'<br>"
+            "- 'Set income to 5000'<br>"
+            "- 'Update savings to 300'<br>"
+            "- 'Reset data'<br><br>"
+            "<b>Bankroll / Betting Math:</b><br>"
+            "- 'Set bankroll to 5000'<br>"
+            "- 'What is 2% of bankroll?'<br>"
+            "- 'Recommend conservative stake'<br>"
+            "- 'Recommend aggressive stake'<br>"
+            "- 'Set risk mode to conservative'<br>"
+            "- 'Set risk mode to aggressive'<br>"
+            "- 'Implied probability for -110'<br>"
+            "- 'Payout for stake 100 at -110'<br>"
+            "- 'Parlay odds for -110, +145, -105'")
+
+# set bankroll to 5000
+@chat_intent("set_bankroll", writes=True)
+def _set_bankroll(text, ctx):
+    m = _SET_BANKROLL.search(text)
+    if not m:
+        return "Try: <b>Set bankroll to 5000</b>"
+
+    updated_record = ctx.set_bankroll_balance(float(m.group(1)))
+    return f"Bankroll updated to <b>${updated_record.get('current_balance', 0):,.2f}</b>."
+
+# set risk mode
+@chat_intent("risk_mode", writes=True)
+def _risk_mode(text, ctx):
+    if "aggressive" in text:
+        ctx.state["risk_mode"] = "aggressive"
+        ctx.state_changed()
+        return "Risk mode set to <b>aggressive</b> (2–5% stake guidance)."
+    if "conservative" in text:
+        ctx.state["risk_mode"] = "conservative"
+        ctx.state_changed()
+        return "Risk mode set to <b>conservative</b> (1–2% stake guidance)."
+    return "Try: <b>Set risk mode to conservative</b> or <b>Set risk mode to aggressive</b>."
+
+# recommend stake
+@chat_intent("recommend_stake")
+def _recommend_stake(text, ctx):
+    rec = recommend_stake(float(ctx.bankroll_balance()), ctx.state.get("risk_mode", "conservative"))
+    if not rec:
+        return "Bankroll must be set to a positive number first. Try: <b>Set bankroll to 5000</b>"
+    return (f"Recommended stake range (<b>{rec['mode']}</b>):<br>"
+            f"- {rec['low_pct']}%: <b>${rec['low']:,.2f}</b><br>"
+            f"- {rec['high_pct']}%: <b>${rec['high']:,.2f}</b>")
+
+# percent of bankroll
+@chat_intent("percent_of_bankroll")
+def _percent_of_bankroll(text, ctx):
+    pct = parse_percent(text)
+    bankroll = float(ctx.bankroll_balance())
+    amt = bankroll * (pct / 100.0)
+    return f"{pct}% of bankroll (<b>${bankroll:,.2f}</b>) is <b>${amt:,.2f}</b>."
+
+# implied probability for -110
+@chat_intent("implied_probability")
+def _implied_probability(text, ctx):
+    odds = extract_first_american_odds(text)
+    if odds is None:
+        return "Try: <b>Implied probability for -110</b>"
+    try:
+        p = implied_probability(odds) * 100.0
+        return f"Implied probability for <b>{odds}</b> is <b>{p:.2f}%</b>."
+    except ValueError as e:
+        return str(e)
+
+# payout for stake 100 at -110
+@chat_intent("payout")
+def _payout(text, ctx):
+    stake = parse_stake(text)
+    odds = extract_first_american_odds(text)
+    if stake is None or odds is None:
+        return "Try: <b>Payout for stake 100 at -110</b>"
+    if stake <= 0:
+        return "Stake must be greater than 0."
+    try:
+        res = payout_for_stake(stake, odds)
+        return (f"For stake <b>${stake:,.2f}</b> at <b>{odds}</b>:<br>"
+                f"- Decimal odds: <b>{res['decimal_odds']}</b><br>"
+                f"- Profit: <b>${res['profit']:,.2f}</b><br>"
+                f"- Total payout: <b>${res['total_payout']:,.2f}</b>")
+    except ValueError as e:
+        return str(e)
+
+# parlay odds for -110, +145, -105
+@chat_intent("parlay_odds")
+def _parlay_odds(text, ctx):
+    odds_list = _ODDS_TOKENS.findall(text)
+    if not odds_list or len(odds_list) < 2:
+        return "Try: <b>Parlay odds for -110, +145, -105</b>"
+    try:
+        decimals = [american_to_decimal(int(o)) for o in odds_list]
+        yield "Legs: " + ", ".join(f"{o} ({d:.4f})" for o, d in zip(odds_list, decimals))
+
+        parlay_decimal = 1.0
+        for d in decimals:
+            parlay_decimal *= d
+
+        # Convert decimal -> American approximation
+        if parlay_decimal >= 2.0:
+            parlay_american = int(round((parlay_decimal - 1.0) * 100))
+            american_str = f"+{parlay_american}"
+        else:
+            parlay_american = int(round(-100 / (parlay_decimal - 1.0)))
+            american_str = f"{parlay_american}"
+
+        return (f"Parlay decimal odds: <b>{parlay_decimal:.4f}</b><br>"
+                f"Approx. parlay American odds: <b>{american_str}</b>")
+    except Exception:
+        return "Could not parse parlay odds. Make sure you include valid odds like -110, +145."
+
+@chat_intent("odds_hint")
+def _odds_hint(text, ctx):
+    return "Try: <b>Implied probability for -110</b> or <b>Payout for stake 100 at -110</b>."
+
+@chat_intent("bankroll_hint")
+def _bankroll_hint(text, ctx):
+    return "Try: <b>Set bankroll to 5000</b> then <b>Recommend conservative stake</b>."
+
+@chat_intent("bet_hint")
+def _bet_hint(text, ctx):
+    return "Try: <b>Parlay odds for -110, +145, -105</b>."
+
+# reset data 
+@chat_intent("reset", writes=True)
+def _reset(text, ctx):
+    ctx.state.update(default_chat_state())
+    ctx.state_changed()
+    return "All data reset to default values."
+
+# update income
+@chat_intent("income", writes=True)
+def _income(text, ctx):
+    state = ctx.state
+    try:
+        amount = _amount_in(text)
+        if any(word in text for word in ["update", "set", "change", "make"]):
+            state["income"] = amount
+            ctx.state_changed()
+            return f"Income updated to ${amount:,.2f}."
+        else:
+            state["income"] += amount
+            ctx.state_changed()
+            return f"Added ${amount:,.2f} to income. Total: ${state['income']:,.2f}."
+    except:
+        return "Couldn't process income update."
+
+# update expenses
+@chat_intent("expenses", writes=True)
+def _expenses(text, ctx):
+    state = ctx.state
+    try:
+        amount = _amount_in(text)
+        if any(word in text for word in ["update", "set", "change"]):
+            state["expenses"] = amount
+            ctx.state_changed()
+            return f"Expenses updated to ${amount:,.2f}."
+        else:
+            state["expenses"] += amount
+            ctx.state_changed()
+            return f"Added ${amount:,.2f} to expenses. Total: ${state['expenses']:,.2f}."
+    except:
+        return "Couldn't process expenses update."
+
+# update the savings
+@chat_intent("savings", writes=True)
+def _savings(text, ctx):
+    state = ctx.state
+    try:
+        amount = _amount_in(text)
+        if any(word in text for word in ["update", "set", "change"]):
+            state["savings"] = amount
+            ctx.state_changed()
+            return f"Savings updated to ${amount:,.2f}."
+        else:
+            state["savings"] += amount
+            ctx.state_changed()
+            return f"Added ${amount:,.2f} to savings. Total: ${state['savings']:,.2f}."
+    except:
+        return "Couldn't process savings update."
+
+# update categories
+@chat_intent("category", writes=True)
+def _category(text, ctx):
+    state = ctx.state
+    category = next(c for c in state["categories"] if c in text)
+    try:
+        amount = _amount_in(text)
+        if any(word in text for word in ["update", "set", "change", "make"]):
+            state["categories"][category] = amount
+            ctx.state_changed()
+            return f"{category.capitalize()} updated to ${amount:,.2f}."
+        else:
+            state["categories"][category] += amount
+            ctx.state_changed()
+            return f"Added ${amount:,.2f} to {category}. Total: ${state['categories'][category]:,.2f}."
+    except:
+        return f"Please specify a valid amount for {category}."
+
+# show user budget
+@chat_intent("budget")
+def _budget(text, ctx):
+    state = ctx.state
+    remaining = calculate_remaining_budget(state)
+    category_breakdown = "<br>".join([f"- {k.capitalize()}: ${v:,.2f}" for k, v in state["categories"].items()])
+    return (f"Here's your budget breakdown:<br><br>"
+            f"<b>Income:</b> ${state['income']:,.2f}<br>"
+            f"<b>Expenses:</b> ${state['expenses']:,.2f}<br>"
+            f"<b>Savings:</b> ${state['savings']:,.2f}<br><br>"
+            f"{category_breakdown}<br><br>"
+            f"<b>Remaining:</b> ${remaining:,.2f}")
+
+# default
+@chat_intent("summary")
+def _summary(text, ctx):
+    state = ctx.state
+    remaining = calculate_remaining_budget(state)
     return (f"Here's your quick financial summary:<br><br>"
-            f"- Income: ${user_data['income']:,.2f}<br>"
-            f"- Expenses: ${user_data['expenses']:,.2f}<br>"
-            f"- Savings: ${user_data['savings']:,.2f}<br>"
+            f"- Income: ${state['income']:,.2f}<br>"
+            f"- Expenses: ${state['expenses']:,.2f}<br>"
+            f"- Savings: ${state['savings']:,.2f}<br>"
             f"- Remaining budget: ${remaining:,.2f}<br><br>"
             "Need help? Type <b>help</b> to see what else I can do.")
 
 def decode_token(token: str):
+    payload = TOKEN_CACHE.get(token)
+    if payload is not None:
+        return payload
+
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    TOKEN_CACHE.put(token, payload)
+    return payload
+
 def create_temp_token(data: dict, expires_minutes=5):
     payload = data.copy()
 
@@ -369,115 +680,170 @@ def check_temp_token(token: str):
     return True, payload
 
 
+# Long-lived cookie exchanged at /token/refresh for a new access token
+REFRESH_COOKIE = "refresh_token"
+
+
+def set_session_cookies(resp, email, refresh_token):
+    """Set a fresh access token and the given refresh token on ``resp``."""
+    resp.set_cookie(
+        "token",
+        create_access_token({"email": email}),
+        path="/",
+        httponly=True,
+        secure=False,  # change later
+        samesite="Lax"
+    )
+    resp.set_cookie(
+        REFRESH_COOKIE,
+        refresh_token,
+        max_age=int(REFRESH_TOKEN_DAYS * 86400),
+        path="/",
+        httponly=True,
+        secure=False,  # change later
+        samesite="Lax"
+    )
+
+
 def create_access_token(data: dict, expires_minutes: int = 60):
     payload = data.copy()
     payload["exp"] = datetime.datetime.utcnow() + datetime.timedelta(minutes=expires_minutes)
     payload["type"] = "access"
+    payload["jti"] = secrets.token_hex(16)
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user():
-    """
-    Get the current authenticated user from the access token.
-    Returns user dict on success, or None on failure.
-    """
+class Principal:
+    """The caller of a request: its verified access token and, once resolved, its user row."""
+
+    __slots__ = ("payload", "user", "pending")
+
+    def __init__(self, payload, user=None, pending=False):
+        self.payload = payload
+        self.user = user
+        # True until current_user() looks up the user of a user_lazy route
+        self.pending = pending
+
+    @property
+    def email(self):
+        return self.payload["email"]
+
+
+# Per-route auth declarations, read by resolve_principal() before the view runs:
+#   public         no token needed (the view may do its own checks, e.g. MFA)
+#   token_required a valid access token; the database is never touched
+#   user_required  a valid access token for an existing, active user
+#   user_optional  like user_required when a token is sent, anonymous otherwise
+#   user_lazy      like user_optional, but the user is looked up on the first current_user()
+def _auth_policy(policy):
+    def declare(view):
+        view.auth_policy = policy
+        return view
+    return declare
+
+
+public = _auth_policy("public")
+token_required = _auth_policy("token")
+user_required = _auth_policy("user")
+user_optional = _auth_policy("optional")
+user_lazy = _auth_policy("lazy")
+
+
+def _access_token_payload():
     token = request.cookies.get("token")
-    
     if not token:
         return None
-    
     payload = decode_token(token)
-    
-    if not payload or payload.get("type") != "access":
+    if not payload or payload.get("type") != "access" or not payload.get("email"):
         return None
-    
-    email = payload.get("email")
-    if not email:
+    # Only a Bloom filter hit costs a query (and a unit of work)
+    if REVOKED_TOKENS.maybe_revoked(payload.get("jti")) and REVOKED_TOKENS.confirm_revoked(get_uow(), payload["jti"]):
         return None
-    
-    db_conn = get_db()
-    cursor = db_conn.cursor(pymysql.cursors.DictCursor)
-    try:
-        cursor.execute("SELECT id, email, is_active FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-    finally:
-        cursor.close()
-        db_conn.close()
-    
-    if not user or not user.get("is_active", True):
+    return payload
+
+
+def plain_auth_errors(missing_status=401):
+    """
+    Answer auth failures on this route as it did before resolve_principal():
+    a plain-text "No token provided." (``missing_status``) without a cookie,
+    otherwise "Unauthorized." (401), instead of the JSON 401.
+    """
+    def declare(view):
+        view.plain_auth_errors = missing_status
+        return view
+    return declare
+
+
+def _unauthorized(view=None, missing=False, clear_token=False):
+    missing_status = getattr(view, "plain_auth_errors", None)
+    if missing_status is None:
+        resp = jsonify({"error": "Unauthorized"})
+        resp.status_code = 401
+    elif missing:
+        resp = make_response("No token provided.", missing_status)
+    else:
+        resp = make_response("Unauthorized.", 401)
+    if clear_token:
+        resp.delete_cookie("token", path="/", httponly=True, secure=False, samesite="Lax")
+    return resp
+
+
+@app.before_request
+def resolve_principal():
+    """
+    Authenticate the request once, as the route declares, into ``g.principal``.
+
+    The cookie is decoded at most once and the user row is looked up at most
+    once (usually from AUTH_USERS), however many helpers need it later.
+    """
+    view = app.view_functions.get(request.endpoint)
+    g.replica_reads = getattr(view, "replica_reads", False) and request.method in ("GET", "HEAD")
+    g.principal = None
+
+    policy = getattr(view, "auth_policy", "public")
+    if policy == "public":
         return None
-    
-    return user
-
-def get_or_create_bankroll(user_id: int, default_amount: float = 5000.0):
-    ensure_connection()
-    with conn.cursor() as c:
-        c.execute(
-            "SELECT id, current_balance, initial_bankroll, peak_balance, lowest_balance FROM bankrolls WHERE user_id = %s",
-            (user_id,),
-        )
-        bankroll = c.fetchone()
 
-        if bankroll:
-            return bankroll
+    payload = _access_token_payload()
+    if payload is None:
+        # A token that is present but invalid or expired is cleared
+        if policy in ("optional", "lazy"):
+            return None
+        has_token = "token" in request.cookies
+        return _unauthorized(view, missing=not has_token, clear_token=has_token)
+    if policy in ("token", "lazy"):
+        g.principal = Principal(payload, pending=policy == "lazy")
+        return None
 
-        c.execute(
-            """
-            INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (user_id, default_amount, default_amount, default_amount, default_amount),
-        )
-        conn.commit()
+    user = _active_user(payload["email"])
+    if user is None:
+        return None if policy == "optional" else _unauthorized(view)
+    g.principal = Principal(payload, user)
+    return None
 
-    with conn.cursor() as c:
-        c.execute(
-            "SELECT id, current_balance, initial_bankroll, peak_balance, lowest_balance FROM bankrolls WHERE user_id = %s",
-            (user_id,),
-        )
-        return c.fetchone()
 
+def _active_user(email):
+    user = AUTH_USERS.get(get_read_uow(), email)
+    return user if user and user.get("is_active", True) else None
 
-def update_bankroll_balance(user_id: int, new_balance: float, bankroll_record: dict = None):
-    ensure_connection()
-    bankroll_record = bankroll_record or get_or_create_bankroll(user_id)
 
-    try:
-        new_balance = float(new_balance)
-    except (TypeError, ValueError):
-        raise ValueError("Invalid bankroll amount.")
-
-    if new_balance < 0:
-        raise ValueError("Bankroll cannot be negative.")
-
-    peak_balance = bankroll_record.get("peak_balance") or new_balance
-    lowest_balance = bankroll_record.get("lowest_balance") or new_balance
-
-    peak_balance = max(float(peak_balance), new_balance)
-    lowest_balance = min(float(lowest_balance), new_balance)
-
-    with conn.cursor() as c:
-        c.execute(
-            """
-            UPDATE bankrolls
-            SET current_balance = %s,
-                peak_balance = %s,
-                lowest_balance = %s
-            WHERE user_id = %s
-            """,
-            (new_balance, peak_balance, lowest_balance, user_id),
-        )
-    conn.commit()
-
-    bankroll_record.update(
-        {
-            "current_balance": float(new_balance),
-            "peak_balance": float(peak_balance),
-            "lowest_balance": float(lowest_balance),
-        }
-    )
+def current_user():
+    """Return the user row resolved for this request, or None."""
+    principal = g.get("principal")
+    if principal is None:
+        return None
+    if principal.pending:
+        principal.pending = False
+        principal.user = _active_user(principal.email)
+    return principal.user
 
-    return bankroll_record
+def get_or_create_bankroll(user_id: int, default_amount: float = DEFAULT_BANKROLL):
+    return BankrollRepository(get_uow()).get_or_create(user_id, default_amount)
+
+
+def update_bankroll_balance(user_id: int, new_balance: float, returning: bool = True):
+    """Atomically set the balance (creating the bankroll if needed); raises ValueError on bad input."""
+    return BankrollRepository(get_uow()).set_balance(user_id, new_balance, returning=returning)
 
 
 def serialize_bankroll(record: dict):
@@ -492,47 +858,190 @@ def serialize_bankroll(record: dict):
         "lowest_balance": float(record.get("lowest_balance", 0)),
     }
 
+def pin_reads_to_primary(response):
+    """Keep this client's reads on the primary for the read-your-writes window."""
+    if get_read_pool() is None:
+        return
+    response.set_cookie(
+        PRIMARY_READS_COOKIE,
+        str(time.time() + DB_READ_YOUR_WRITES_WINDOW),
+        max_age=max(1, int(DB_READ_YOUR_WRITES_WINDOW + 0.5)),
+        path="/",
+        httponly=True,
+        secure=False,
+        samesite="Lax",
+    )
+
+@app.after_request
+def commit_unit_of_work(response):
+    read_uow = g.get("read_uow")
+    read_trips = read_uow.round_trips if read_uow is not None else 0
+
+    uow = g.get("uow")
+    if uow is None:
+        if read_uow is not None:
+            response.headers["X-DB-Round-Trips"] = str(read_trips)
+        return response
+
+    try:
+        if response.status_code >= 500:
+            uow.rollback()
+        else:
+            uow.commit()
+    except Exception as exc:
+        print(f"DB ERROR: commit failed: {exc}")
+        uow.rollback()
+        response = make_response(jsonify({"error": "Internal server error"}), 500)
+
+    if uow.committed_writes:
+        pin_reads_to_primary(response)
+
+    response.headers["X-DB-Round-Trips"] = str(uow.round_trips + read_trips)
+    return response
+
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(exc):
+    resp = jsonify({"error": "Too many sign-in attempts in progress. Try again shortly."})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(exc.retry_after)
+    return resp
+
+
+@app.errorhandler(RateLimited)
+def rate_limited_response(exc):
+    resp = jsonify({"error": "Too many attempts. Try again later."})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(exc.retry_after)
+    return resp
+
+
+@app.teardown_request
+def close_unit_of_work(exc):
+    for key in ("uow", "read_uow"):
+        uow = g.pop(key, None)
+        if uow is not None:
+            if exc is not None:
+                uow.rollback()
+            uow.close()
+
+
 @app.route("/")
+@public
 def index():
     return render_template("chat.html")
 
 @app.route("/chat", methods=["POST"])
+@user_lazy
 def chat():
-    authenticated, user, _ = authenticate_user(include_user=True)
-    bankroll_record = None
-
-    if authenticated:
-        bankroll_record = get_or_create_bankroll(user.get("id"))
-
     user_message = request.json.get("message", "")
     try:
-        reply = handle_input(
-            user_message,
-            bankroll_record=bankroll_record,
-            user_id=user.get("id") if authenticated else None,
-        )
+        reply = handle_input(user_message, ctx=ChatContext(load_user=current_user))
     except PermissionError as exc:
         return make_response(jsonify({"response": str(exc)}), 401)
 
     return jsonify({"response": reply})
 
+# Messages accepted by one /chat/batch request
+MAX_CHAT_BATCH = 100
+
+@app.route("/chat/batch", methods=["POST"])
+@user_lazy
+def chat_batch():
+    """Answer an ordered list of messages against one bankroll and state, writing once at the end"""
+    messages = (request.get_json(silent=True) or {}).get("messages")
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return make_response(jsonify({"error": "messages must be a list of strings"}), 400)
+    if len(messages) > MAX_CHAT_BATCH:
+        return make_response(jsonify({"error": f"At most {MAX_CHAT_BATCH} messages per batch"}), 400)
+
+    ctx = ChatContext(defer_writes=True, load_user=current_user)
+
+    results = []
+    for message in messages:
+        try:
+            results.append({"response": handle_input(message, ctx=ctx), "status": 200})
+        except PermissionError as exc:
+            results.append({"response": str(exc), "status": 401})
+        except ValueError as exc:
+            results.append({"response": str(exc), "status": 400})
+    ctx.flush()
+
+    return jsonify({"results": results})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _chat_events(text, intent):
+    """
+    The events of one /chat/stream response.
+
+    The ack goes out before any database work. Each event is only produced
+    when the server asks for the next chunk, so a slow client holds back the
+    work instead of letting output pile up. The response has been committed
+    by commit_unit_of_work() before this runs, so writes are committed here,
+    before the reply is sent.
+    """
+    yield _sse("ack", {"intent": intent})
+
+    round_trips = _request_round_trips()
+    try:
+        result = CHAT_HANDLERS[intent](text, ChatContext(load_user=current_user))
+        for kind, response in chat_steps(result):
+            if kind == "reply":
+                count_chat_queries(intent, round_trips)
+                if "uow" in g:
+                    g.uow.commit()
+            yield _sse(kind, {"response": response})
+    except PermissionError as exc:
+        if "uow" in g:
+            g.uow.rollback()
+        yield _sse("error", {"response": str(exc), "status": 401})
+    except Exception as exc:
+        print(f"ERROR: chat stream failed: {exc}")
+        if "uow" in g:
+            g.uow.rollback()
+        yield _sse("error", {"error": "Internal server error", "status": 500})
+
+@app.route("/chat/stream", methods=["POST"])
+@user_lazy
+def chat_stream():
+    """/chat as Server-Sent Events: ``ack`` at once, a ``partial`` per intermediate result, then ``reply``"""
+    text = (request.get_json(silent=True) or {}).get("message", "").lower().strip()
+    intent = CHAT_ROUTER.route(text)
+    response = Response(
+        stream_with_context(_chat_events(text, intent)),
+        mimetype="text/event-stream",
+        # Proxies must pass events on as they arrive
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Headers go out with the ack, before the writes are committed, so
+    # commit_unit_of_work() cannot set the read-your-writes cookie for them
+    if CHAT_HANDLERS[intent].writes:
+        pin_reads_to_primary(response)
+    return response
+
 @app.route("/bankroll", methods=["GET", "PUT"])
 @app.route("/api/bankroll", methods=["GET", "PUT"])
+@replica_reads
+@user_required
+@plain_auth_errors()
 def bankroll():
-    authenticated, user, _ = authenticate_user(include_user=True)
-    if not authenticated:
-        return user
-
-    bankroll_record = get_or_create_bankroll(user.get("id"))
+    user = current_user()
 
     if request.method == "GET":
-        return jsonify(serialize_bankroll(bankroll_record))
+        # Only a missing bankroll needs the primary (to create it).
+        record = BankrollRepository(get_read_uow()).get(user.get("id"))
+        if not record:
+            record = get_or_create_bankroll(user.get("id"))
+        return jsonify(serialize_bankroll(record))
 
     data = request.get_json() or {}
     new_balance = data.get("current_balance")
 
     try:
-        updated_record = update_bankroll_balance(user.get("id"), new_balance, bankroll_record)
+        updated_record = update_bankroll_balance(user.get("id"), new_balance)
     except ValueError as exc:
         return make_response(str(exc), 400)
 
@@ -541,6 +1050,7 @@ def bankroll():
 
 
 @app.route("/mfa/setup", methods=["GET"])
+@public
 def mfa_setup():
     temp_token = request.cookies.get("temp_token")
     success, data = check_temp_token(temp_token)
@@ -552,29 +1062,32 @@ def mfa_setup():
     if not email:
         return make_response("Invalid token payload.", 401)
 
+    fmt = qr_format(request.accept_mimetypes)
+    session = token_digest(temp_token)
+
     try:
-        ensure_connection()
-        with conn.cursor() as c:
-            c.execute(
-                "SELECT mfa_secret FROM users WHERE email = %s",
-                (email,)
-            )
+        uow = get_uow()
+        with uow.cursor() as c:
+            c.execute(queries.USER_MFA_SECRET, (email,))
             user = c.fetchone()
 
             if not user:
                 return make_response("Invalid user.", 401)
 
             if user.get("mfa_secret"):
-                return make_response("MFA already enabled.", 400)
+                # A refresh of the page that just created the secret gets the same QR code
+                totp_uri = MFA_QR.recall(session)
+                if totp_uri is None:
+                    return make_response("MFA already enabled.", 400)
+                return _qr_response(totp_uri, fmt)
 
             secret = pyotp.random_base32()
-            c.execute(
-                "UPDATE users SET mfa_secret = %s WHERE email = %s",
-                (secret, email)
-            )
-        conn.commit()
+            UserRepository(uow).set_mfa_secret(email, secret)
+        # Commit now: the QR code below is useless if the secret is not stored.
+        uow.commit()
 
     except Exception as e:
+        get_uow().rollback()
         print("DB ERROR:", e)
         return make_response("Internal server error.", 500)
 
@@ -582,16 +1095,22 @@ def mfa_setup():
         name=email,
         issuer_name="ClutchCall"
     )
+    MFA_QR.remember(session, totp_uri)
 
-    qr = qrcode.make(totp_uri)
-    buf = io.BytesIO()
-    qr.save(buf, format="PNG")
-    buf.seek(0)
+    return _qr_response(totp_uri, fmt)
 
-    return send_file(buf, mimetype="image/png")
+
+def _qr_response(totp_uri, fmt):
+    resp = send_file(io.BytesIO(MFA_QR.render(totp_uri, fmt)), mimetype=QR_FORMATS[fmt])
+    # The image carries the TOTP secret
+    resp.headers["Cache-Control"] = "no-store"
+    resp.vary.add("Accept")
+    return resp
 
 
 @app.route("/mfa/validate", methods=["POST"])
+@public
+@rate_limited(_temp_token_email)
 def mfa_validate():
     data = request.get_json()
     code = data.get("code")
@@ -609,12 +1128,8 @@ def mfa_validate():
     if not email:
         return make_response("Invalid token payload.", 401)
 
-    ensure_connection()
-    with conn.cursor() as c:
-        c.execute(
-            "SELECT email, mfa_secret FROM users WHERE email = %s",
-            (email,)
-        )
+    with get_uow().cursor() as c:
+        c.execute(queries.USER_FOR_MFA, (email,))
         user = c.fetchone()
 
     if not user or not user.get("mfa_secret"):
@@ -624,52 +1139,39 @@ def mfa_validate():
     if not totp.verify(code, valid_window=1):
         return make_response("Invalid MFA code.", 401)
 
-    access_token = create_access_token({
-        "email": user["email"],
-    })
-
     resp = make_response('{"status":"ok","mfa":false}', 200)
     resp.headers["Content-Type"] = "application/json"
-    resp.set_cookie(
-        "token",
-        access_token,
-        path="/",
-        httponly=True,
-        secure=False,  # change later
-        samesite="Lax"
-    )
+    set_session_cookies(resp, user["email"], RefreshTokenRepository(get_uow()).issue(user["id"]))
     resp.delete_cookie("temp_token")
+    MFA_QR.forget(token_digest(temp_token))
 
     return resp
 
-@app.route("/validate", methods=["GET"])
-def validate_token():
-    token = request.cookies.get("token")
-
-    if not token:
-        return make_response("No token provided.", 400)
-
-    payload = decode_token(token)
 
-    if not payload or payload.get("type") != "access":
-        resp = make_response("Unauthorized.", 401)
-        resp.delete_cookie(
-            "token",
-            path="/",
-            httponly=True,
-            secure=False,
-            samesite="Lax"
-        )
+@app.route("/token/refresh", methods=["POST"])
+@public
+def refresh_access_token():
+    """Trade the refresh token cookie for a new access token and a rotated refresh token"""
+    rotated = RefreshTokenRepository(get_uow()).rotate(request.cookies.get(REFRESH_COOKIE))
+    if rotated is None:
+        resp = _unauthorized(clear_token=True)
+        resp.delete_cookie(REFRESH_COOKIE, path="/", httponly=True, secure=False, samesite="Lax")
         return resp
 
-    if not payload.get("email"):
-        resp = make_response("Unauthorized.", 401)
-        resp.delete_cookie("token", path="/")
-        return resp
+    resp = make_response('{"status":"ok"}', 200)
+    resp.headers["Content-Type"] = "application/json"
+    set_session_cookies(resp, rotated["email"], rotated["token"])
+    return resp
 
+@app.route("/validate", methods=["GET"])
+@token_required
+@plain_auth_errors(missing_status=400)
+def validate_token():
     return make_response("OK", 200)
 
 @app.route("/login", methods=["POST"])
+@public
+@rate_limited(_body_email)
 def login():
     data = request.get_json()
     email = data.get("email")
@@ -678,9 +1180,8 @@ def login():
     if not email or not password:
         return make_response("Missing email or password.", 400)
 
-    ensure_connection()
-    with conn.cursor() as c:
-        c.execute("SELECT * FROM users WHERE email = %s", (email,))
+    with get_uow().cursor() as c:
+        c.execute(queries.USER_FOR_LOGIN, (email,))
         user = c.fetchone()
 
     if not user:
@@ -691,22 +1192,23 @@ def login():
     if not stored_hash:
         return make_response("Invalid email or password.", 401)
     
-    if not bcrypt.checkpw(password.encode(), stored_hash.encode()):
+    if not check_password(password, stored_hash):
         return make_response("Invalid email or password.", 401)
+
+    # Move hashes made at another cost to the current policy while we have the password
+    if needs_rehash(stored_hash):
+        try:
+            new_hash = hash_password(password)
+        except PasswordHasherBusy:
+            new_hash = None  # try again on a later login rather than refuse this one
+        if new_hash:
+            UserRepository(get_uow()).set_password(user, new_hash, defer=True)
     
     # Update username and display_name if missing (for existing users)
     if not user.get("username") or not user.get("display_name"):
         username = email.split('@')[0]
         display_name = username.capitalize()
-        try:
-            with conn.cursor() as c:
-                c.execute(
-                    "UPDATE users SET username = %s, display_name = %s WHERE id = %s",
-                    (username, display_name, user["id"])
-                )
-            conn.commit()
-        except Exception as e:
-            print(f"Error updating username: {e}")
+        UserRepository(get_uow()).backfill_username(user, username, display_name)
         return make_response("Invalid email or password.", 401)
 
     if not user.get("mfa_secret"):
@@ -752,6 +1254,10 @@ def login():
     return resp
 
 @app.route("/register", methods=["POST"])
+@public
+# Registering an email that is taken counts against it, which bounds probing
+# for existing accounts one email at a time
+@rate_limited(_body_email, failure=409)
 def register():
     data = request.get_json()
     email = data.get("email")
@@ -768,24 +1274,18 @@ def register():
     username = email.split('@')[0]
     display_name = username.capitalize()
     
-    password_hash = bcrypt.hashpw(
-        password.encode(),
-        bcrypt.gensalt()
-    ).decode()
+    password_hash = hash_password(password)
 
+    uow = get_uow()
     try:
-        ensure_connection()
-        with conn.cursor() as c:
-            c.execute(
-                "INSERT INTO users (email, password_hash, username, display_name, password) VALUES (%s, %s, %s, %s, %s)",
-                (email, password_hash, username, display_name, password_hash)
-            )
-        conn.commit()
+        UserRepository(uow).create(email, password_hash, username, display_name)
 
     except pymysql.err.IntegrityError:
+        uow.rollback()
         return make_response("Email already exists.", 409)
 
     except Exception as e:
+        uow.rollback()
         print("DB ERROR:", e)
         return make_response("Internal server error.", 500)
 
@@ -794,7 +1294,23 @@ def register():
     return resp
 
 @app.route("/logout", methods=["POST"])
+@public
 def logout():
+    token = request.cookies.get("token")
+    payload = decode_token(token) if token else None
+    TOKEN_CACHE.discard(token)
+    TOKEN_CACHE.discard(request.cookies.get("temp_token"))
+
+    # The cookies are cleared even if the database cannot record the revocation
+    uow = get_uow()
+    try:
+        if payload and payload.get("type") == "access":
+            REVOKED_TOKENS.revoke(uow, payload.get("jti"), payload["exp"])
+        RefreshTokenRepository(uow).revoke(request.cookies.get(REFRESH_COOKIE))
+    except Exception as e:
+        uow.rollback()
+        print(f"DB ERROR: could not revoke tokens on logout: {e}")
+
     resp = make_response('{"status":"logged_out"}', 200)
     resp.headers["Content-Type"] = "application/json"
     resp.delete_cookie(
@@ -805,10 +1321,12 @@ def logout():
         samesite="Lax"
     )
     resp.delete_cookie("temp_token", path="/")
+    resp.delete_cookie(REFRESH_COOKIE, path="/", httponly=True, secure=False, samesite="Lax")
     return resp
 
 
 @app.route("/parse-bet", methods=["POST"])
+@public
 def parse_bet():
     """
     Parse and analyze a bet slip text.
@@ -833,18 +1351,8 @@ def parse_bet():
         return jsonify({"error": "No bet text provided"}), 400
     
     try:
-        result = parse_bet_text(bet_text)
-        
-        if result.get("success"):
-            # Add stake recommendations if bankroll provided
-            stake_rec = get_stake_recommendation(
-                bankroll,
-                result.get("qualityScore", 50),
-                result.get("recommendation", "caution")
-            )
-            result["stakeRecommendation"] = stake_rec
-        
-        return jsonify(result)
+        # Parsed with a stake recommendation for the bankroll (1000 if none given)
+        return jsonify(parse_slip(bet_text, bankroll))
     
     except Exception as e:
         print(f"Error parsing bet: {e}")
@@ -858,7 +1366,85 @@ def parse_bet():
         }), 500
 
 
+# Slips accepted by one /parse-bet/batch request
+MAX_BET_BATCH = int(os.getenv("MAX_BET_BATCH", "5000"))
+
+@app.route("/parse-bet/batch", methods=["POST"])
+@token_required
+def parse_bet_batch():
+    """
+    Parse many bet slips in one request, on the parsing worker pool.
+
+    Request body:
+    {
+        "slips": ["Lakers -3.5 @ -110", {"betText": "Warriors ML @ +150", "bankroll": 200}],
+        "bankroll": 5000  (optional, for slips without their own)
+    }
+
+    Returns {"results": [...]} in the order sent: {"status": 200, "result": <what
+    /parse-bet returns>} per parsed slip, {"status": 400/500, "error": ...} per
+    slip that could not be parsed.
+    """
+    data = request.get_json(silent=True) or {}
+    slips = data.get("slips")
+    if not isinstance(slips, list):
+        return jsonify({"error": "slips must be a list"}), 400
+    if len(slips) > MAX_BET_BATCH:
+        return jsonify({"error": f"At most {MAX_BET_BATCH} slips per batch"}), 400
+
+    bankroll = data.get("bankroll", 1000)
+    items = [
+        (slip.get("betText"), slip.get("bankroll", bankroll)) if isinstance(slip, dict) else slip
+        for slip in slips
+    ]
+    results = BET_BATCH.parse(items, bankroll)
+    return jsonify({
+        "results": results,
+        "parsed": sum(1 for result in results if result["status"] == 200),
+        "failed": sum(1 for result in results if result["status"] != 200),
+    })
+
+
+@app.route("/bets", methods=["POST"])
+@user_required
+def save_bet():
+    """
+    Parse a bet slip and save it, with all of its legs, for the current user.
+
+    Request body:
+    {
+        "betText": "Lakers -3.5 @ -110, Warriors ML @ +150",
+        "stake": 25
+    }
+    """
+    user = current_user()
+
+    data = request.get_json() or {}
+    bet_text = data.get("betText", "")
+    if not bet_text:
+        return jsonify({"error": "No bet text provided"}), 400
+
+    slip = parse_bet_text(bet_text)
+    if not slip.get("success"):
+        return jsonify({"error": slip.get("error", "Could not parse bet text")}), 400
+
+    try:
+        bankroll_record = get_or_create_bankroll(user["id"])
+        saved = BetSlipRepository(get_uow()).save_slip(user["id"], bankroll_record["id"], slip, data.get("stake"))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    return jsonify({
+        "betId": saved["bet_id"],
+        "legs": len(saved["leg_ids"]),
+        "totalStake": saved["total_stake"],
+        "totalOdds": saved["total_odds"],
+        "potentialWin": saved["potential_win"],
+    }), 201
+
+
 @app.route("/analyze-odds", methods=["POST"])
+@public
 def analyze_odds():
     """
     Analyze odds and calculate probabilities/payouts.
@@ -921,21 +1507,17 @@ def analyze_odds():
 # ===== Profile Endpoints =====
 
 @app.route("/profile", methods=["GET"])
+@replica_reads
+@user_required
 def get_profile():
     """Get the current user's profile information"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_read_uow()
+    cursor = uow.cursor()
     
     try:
-        cursor.execute("""
-            SELECT id, username, email, display_name, avatar, phone, 
-                   betting_experience, favorite_sports, monthly_budget, created_at
-            FROM users WHERE id = %s
-        """, (user["id"],))
+        cursor.execute(queries.USER_PROFILE, (user["id"],))
         
         profile = cursor.fetchone()
         
@@ -969,20 +1551,17 @@ def get_profile():
         return jsonify({"error": "Failed to fetch profile"}), 500
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.route("/profile", methods=["PUT"])
+@user_required
 def update_profile():
     """Update the current user's profile information"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
     data = request.get_json()
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_uow()
     
     try:
         import json
@@ -1018,31 +1597,21 @@ def update_profile():
         if not updates:
             return jsonify({"message": "No fields to update"}), 200
         
-        values.append(user["id"])
-        
-        cursor.execute(f"""
-            UPDATE users SET {', '.join(updates)} WHERE id = %s
-        """, tuple(values))
-        
-        conn.commit()
+        UserRepository(uow).update_profile(user, updates, values)
         
         return jsonify({"message": "Profile updated successfully"})
     
     except Exception as e:
-        conn.rollback()
+        uow.rollback()
         print(f"Error updating profile: {e}")
         return jsonify({"error": "Failed to update profile"}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 
 @app.route("/change-password", methods=["POST"])
+@user_required
 def change_password():
     """Change the current user's password"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
     data = request.get_json()
     
@@ -1055,62 +1624,52 @@ def change_password():
     if len(new_password) < 8:
         return jsonify({"error": "New password must be at least 8 characters"}), 400
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_uow()
+    cursor = uow.cursor()
     
     try:
         # Get current password hash
-        cursor.execute("SELECT password FROM users WHERE id = %s", (user["id"],))
+        cursor.execute(queries.USER_PASSWORD, (user["id"],))
         result = cursor.fetchone()
         
         if not result:
             return jsonify({"error": "User not found"}), 404
         
         # Verify current password
-        stored_hash = result["password"]
-        if isinstance(stored_hash, str):
-            stored_hash = stored_hash.encode('utf-8')
-        
-        if not bcrypt.checkpw(current_password.encode('utf-8'), stored_hash):
+        if not check_password(current_password, result["password_hash"] or result["password"]):
             return jsonify({"error": "Current password is incorrect"}), 400
         
         # Hash new password
-        new_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        new_hash = hash_password(new_password)
         
         # Update password
-        cursor.execute("UPDATE users SET password = %s WHERE id = %s", (new_hash, user["id"]))
-        conn.commit()
-        
+        UserRepository(uow).set_password(user, new_hash)
         return jsonify({"message": "Password changed successfully"})
     
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
-        conn.rollback()
+        uow.rollback()
         print(f"Error changing password: {e}")
         return jsonify({"error": "Failed to change password"}), 500
     finally:
         cursor.close()
-        conn.close()
 
 
 # ===== Bank Account Endpoints =====
 
 @app.route("/bank-accounts", methods=["GET"])
+@replica_reads
+@user_required
 def get_bank_accounts():
     """Get all bank accounts for the current user (masked)"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_read_uow()
+    cursor = uow.cursor()
     
     try:
-        cursor.execute("""
-            SELECT id, bank_name, account_type, last_four, is_primary, created_at 
-            FROM bank_accounts 
-            WHERE user_id = %s AND is_active = TRUE
-            ORDER BY is_primary DESC, created_at DESC
-        """, (user["id"],))
+        cursor.execute(queries.ACTIVE_BANK_ACCOUNTS, (user["id"],))
         
         accounts = cursor.fetchall()
         
@@ -1130,15 +1689,13 @@ def get_bank_accounts():
         return jsonify({"error": "Failed to fetch bank accounts"}), 500
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.route("/bank-accounts", methods=["POST"])
+@user_required
 def add_bank_account():
     """Add a new bank account with encrypted data"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
     data = request.get_json()
     
@@ -1166,15 +1723,12 @@ def add_bank_account():
     if account_type not in ["checking", "savings"]:
         return jsonify({"error": "Account type must be 'checking' or 'savings'"}), 400
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_uow()
+    cursor = uow.cursor()
     
     try:
         # Check account limit (max 5 accounts per user)
-        cursor.execute(
-            "SELECT COUNT(*) as count FROM bank_accounts WHERE user_id = %s AND is_active = TRUE",
-            (user["id"],)
-        )
+        cursor.execute(queries.COUNT_ACTIVE_BANK_ACCOUNTS, (user["id"],))
         result = cursor.fetchone()
         if result and result["count"] >= 5:
             return jsonify({"error": "Maximum of 5 bank accounts allowed"}), 400
@@ -1183,10 +1737,7 @@ def add_bank_account():
         account_hash = hashlib.sha256(account_number.encode()).hexdigest()
         routing_hash = hashlib.sha256(routing_number.encode()).hexdigest()
         
-        cursor.execute("""
-            SELECT id FROM bank_accounts 
-            WHERE user_id = %s AND routing_number_hash = %s AND account_number_hash = %s AND is_active = TRUE
-        """, (user["id"], routing_hash, account_hash))
+        cursor.execute(queries.FIND_DUPLICATE_BANK_ACCOUNT, (user["id"], routing_hash, account_hash))
         
         if cursor.fetchone():
             return jsonify({"error": "This bank account is already linked"}), 400
@@ -1198,21 +1749,11 @@ def add_bank_account():
         
         # If this is primary, unset other primary accounts
         if is_primary:
-            cursor.execute(
-                "UPDATE bank_accounts SET is_primary = FALSE WHERE user_id = %s",
-                (user["id"],)
-            )
+            cursor.execute(queries.CLEAR_PRIMARY_BANK_ACCOUNT, (user["id"],))
         
         # Insert new bank account
-        cursor.execute("""
-            INSERT INTO bank_accounts 
-            (user_id, bank_name, account_type, encrypted_routing_number, encrypted_account_number, 
-             routing_number_hash, account_number_hash, last_four, is_primary, is_active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
-        """, (user["id"], bank_name, account_type, encrypted_routing, encrypted_account,
+        cursor.execute(queries.INSERT_BANK_ACCOUNT, (user["id"], bank_name, account_type, encrypted_routing, encrypted_account,
               routing_hash, account_hash, last_four, is_primary))
-        
-        conn.commit()
         account_id = cursor.lastrowid
         
         return jsonify({
@@ -1227,107 +1768,116 @@ def add_bank_account():
         }), 201
     
     except Exception as e:
-        conn.rollback()
+        uow.rollback()
         print(f"Error adding bank account: {e}")
         return jsonify({"error": "Failed to add bank account"}), 500
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.route("/bank-accounts/<int:account_id>", methods=["DELETE"])
+@user_required
 def delete_bank_account(account_id):
     """Soft delete a bank account"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_uow()
+    cursor = uow.cursor()
     
     try:
         # Verify account belongs to user
-        cursor.execute(
-            "SELECT id, is_primary FROM bank_accounts WHERE id = %s AND user_id = %s AND is_active = TRUE",
-            (account_id, user["id"])
-        )
+        cursor.execute(queries.ACTIVE_BANK_ACCOUNT, (account_id, user["id"]))
         account = cursor.fetchone()
         
         if not account:
             return jsonify({"error": "Bank account not found"}), 404
         
         # Soft delete
-        cursor.execute(
-            "UPDATE bank_accounts SET is_active = FALSE WHERE id = %s",
-            (account_id,)
-        )
+        cursor.execute(queries.DEACTIVATE_BANK_ACCOUNT, (account_id,))
         
         # If this was primary, set another account as primary
         if account["is_primary"]:
-            cursor.execute("""
-                UPDATE bank_accounts 
-                SET is_primary = TRUE 
-                WHERE user_id = %s AND is_active = TRUE 
-                ORDER BY created_at DESC 
-                LIMIT 1
-            """, (user["id"],))
-        
-        conn.commit()
+            cursor.execute(queries.PROMOTE_NEWEST_BANK_ACCOUNT, (user["id"],))
         
         return jsonify({"message": "Bank account removed successfully"})
     
     except Exception as e:
-        conn.rollback()
+        uow.rollback()
         print(f"Error deleting bank account: {e}")
         return jsonify({"error": "Failed to remove bank account"}), 500
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.route("/bank-accounts/<int:account_id>/primary", methods=["PUT"])
+@user_required
 def set_primary_bank_account(account_id):
     """Set a bank account as primary"""
-    user = get_current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+    user = current_user()
     
-    conn = get_db()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    uow = get_uow()
+    cursor = uow.cursor()
     
     try:
         # Verify account belongs to user
-        cursor.execute(
-            "SELECT id FROM bank_accounts WHERE id = %s AND user_id = %s AND is_active = TRUE",
-            (account_id, user["id"])
-        )
+        cursor.execute(queries.ACTIVE_BANK_ACCOUNT, (account_id, user["id"]))
         
         if not cursor.fetchone():
             return jsonify({"error": "Bank account not found"}), 404
         
         # Unset all primary
-        cursor.execute(
-            "UPDATE bank_accounts SET is_primary = FALSE WHERE user_id = %s",
-            (user["id"],)
-        )
+        cursor.execute(queries.CLEAR_PRIMARY_BANK_ACCOUNT, (user["id"],))
         
         # Set new primary
-        cursor.execute(
-            "UPDATE bank_accounts SET is_primary = TRUE WHERE id = %s",
-            (account_id,)
-        )
-        
-        conn.commit()
+        cursor.execute(queries.SET_PRIMARY_BANK_ACCOUNT, (account_id,))
         
         return jsonify({"message": "Primary account updated successfully"})
     
     except Exception as e:
-        conn.rollback()
+        uow.rollback()
         print(f"Error setting primary account: {e}")
         return jsonify({"error": "Failed to update primary account"}), 500
     finally:
         cursor.close()
-        conn.close()
+
+
+def _is_admin_request():
+    supplied = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+
+@app.route("/admin/db-stats", methods=["GET"])
+@public
+def db_stats():
+    """Per-query latency, connection pool and chat stats for this worker"""
+    if not _is_admin_request():
+        return jsonify({"error": "Not found"}), 404
+
+    read_pool = get_read_pool()
+    return jsonify({
+        "queries": QUERY_LATENCY.snapshot(),
+        "pool": get_pool().stats(),
+        "replicas": read_pool.stats() if read_pool is not None else None,
+        "chat_state": CHAT_STATE.stats(),
+        "chat_queries": CHAT_QUERIES.snapshot(),
+    })
+
+
+@app.route("/admin/auth-stats", methods=["GET"])
+@public
+def auth_stats():
+    """Password hashing, auth cache and MFA QR stats for this worker"""
+    if not _is_admin_request():
+        return jsonify({"error": "Not found"}), 404
+
+    return jsonify({
+        "password_hashing": get_password_hasher().stats(),
+        "user_cache": AUTH_USERS.stats(),
+        "token_cache": TOKEN_CACHE.stats(),
+        "revocations": REVOKED_TOKENS.stats(),
+        "mfa_qr": MFA_QR.stats(),
+        "rate_limits": RATE_LIMITER.stats(),
+    })
 
 
 if __name__ == "__main__":
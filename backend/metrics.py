@@ -0,0 +1,113 @@
+"""
+In-process latency metrics.
+
+Each worker keeps its own counters; nothing is shipped anywhere. Histograms
+use fixed log-scale buckets, so recording is cheap and memory is constant
+however many samples arrive. Percentiles are reported as the upper bound of
+the bucket holding that rank (within ~20% of the true value).
+"""
+
+import bisect
+import threading
+
+# Bucket upper bounds in seconds: from 50us, 20% wider each, up to ~60s.
+_BOUNDS = []
+_bound = 0.00005
+while _bound < 60:
+    _BOUNDS.append(_bound)
+    _bound *= 1.2
+_BOUNDS.append(float("inf"))
+
+
+class LatencyHistogram:
+    """Count, total, max and bucketed distribution of durations (seconds)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = [0] * len(_BOUNDS)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self._buckets[bisect.bisect_left(_BOUNDS, seconds)] += 1
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for index, hits in enumerate(self._buckets):
+            seen += hits
+            if seen >= rank and hits:
+                return min(_BOUNDS[index], self.max)
+        return self.max
+
+    def snapshot(self):
+        """Return the stats in milliseconds."""
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class LatencyRegistry:
+    """Thread-safe set of named histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def snapshot(self):
+        """Return {name: stats}, ordered by total time spent, highest first."""
+        with self._lock:
+            stats = {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+        return dict(sorted(stats.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+
+class CounterRegistry:
+    """Thread-safe groups of named counters, e.g. {"help": {"messages": 3, "db_free": 3}}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def add(self, name, **counts):
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            for key, amount in counts.items():
+                counters[key] = counters.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in sorted(self._counters.items())}
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+
+
+# Per-query-name timings recorded by db.CountingCursor
+QUERY_LATENCY = LatencyRegistry()
+
+# Chat messages per intent, with the queries they issued (see main.handle_input)
+CHAT_QUERIES = CounterRegistry()
@@ -0,0 +1,177 @@
+"""
+QR codes for MFA enrolment.
+
+Choosing a QR mask for a provisioning URI and encoding the image takes tens
+of milliseconds of pure Python, and onboarding spikes send many at once.
+Images are rendered on a small worker pool, and concurrent requests for the
+same image share one render. Rendered images are kept for a few minutes,
+keyed by provisioning URI and format. The setup session that created a
+secret can fetch its QR code again in that time, so a retry or page refresh
+is served from memory.
+
+PNG is sent by default. Clients that prefer ``image/svg+xml`` get a single
+SVG path instead, which skips the raster encoding and scales without blur.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import qrcode
+
+from metrics import LatencyRegistry
+
+MFA_QR_CACHE_TTL = float(os.getenv("MFA_QR_CACHE_TTL", "300"))
+MFA_QR_CACHE_SIZE = int(os.getenv("MFA_QR_CACHE_SIZE", "1024"))
+MFA_QR_WORKERS = int(os.getenv("MFA_QR_WORKERS", "2"))
+
+# Format name -> mimetype, in order of preference when the client accepts both
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Render time per format, recorded by the workers
+QR_LATENCY = LatencyRegistry()
+
+
+class QRRenderer:
+    """Worker pool plus a TTL/LRU cache of rendered QR images."""
+
+    def __init__(self, workers=MFA_QR_WORKERS, ttl=MFA_QR_CACHE_TTL, max_size=MFA_QR_CACHE_SIZE,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mfa-qr")
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self._sessions = OrderedDict()
+        self._rendering = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0}
+
+    def render(self, uri, fmt="png"):
+        """Return the QR code for ``uri`` as ``fmt`` bytes, from the cache when possible."""
+        key = (uri, fmt)
+        with self._lock:
+            image = self._get(self._images, key)
+            if image is not None:
+                self._stats["hits"] += 1
+                return image
+            future = self._rendering.get(key)
+            owner = future is None
+            if owner:
+                self._stats["misses"] += 1
+                future = self._executor.submit(_render, uri, fmt)
+                self._rendering[key] = future
+            else:
+                self._stats["coalesced"] += 1
+
+        try:
+            image = future.result()
+        finally:
+            if owner:
+                with self._lock:
+                    self._rendering.pop(key, None)
+        if owner:
+            with self._lock:
+                self._put(self._images, key, image)
+        return image
+
+    def remember(self, session, uri):
+        """Let ``session`` (a temp token digest) fetch ``uri``'s QR code again until the TTL."""
+        with self._lock:
+            self._put(self._sessions, session, uri)
+
+    def recall(self, session):
+        """Return the provisioning URI remembered for ``session``, or None."""
+        with self._lock:
+            return self._get(self._sessions, session)
+
+    def forget(self, session):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._sessions.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._images)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["render"] = QR_LATENCY.snapshot()
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _get(self, entries, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries, key, value):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        entries[key] = (value, self._clock() + self.ttl)
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+
+def qr_format(accept_mimetypes):
+    """Return the format to send for a request's parsed ``Accept`` header."""
+    mimetype = accept_mimetypes.best_match(list(FORMATS.values()), default=FORMATS["png"])
+    return next(fmt for fmt, value in FORMATS.items() if value == mimetype)
+
+
+def _render(uri, fmt):
+    started = time.perf_counter()
+    try:
+        qr = qrcode.QRCode(border=4)
+        qr.add_data(uri)
+        qr.make(fit=True)
+        if fmt == "svg":
+            return _svg(qr.get_matrix(), qr.box_size)
+        buf = io.BytesIO()
+        qr.make_image().save(buf, format="PNG")
+        return buf.getvalue()
+    finally:
+        QR_LATENCY.record(fmt, time.perf_counter() - started)
+
+
+def _svg(modules, box_size):
+    """Draw dark modules as one path, merging horizontal runs."""
+    size = len(modules)
+    path = []
+    for y, row in enumerate(modules):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            path.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+    pixels = size * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    ).encode("utf-8")
+
+
+MFA_QR = QRRenderer()
@@ -0,0 +1,894 @@
+"""
+Versioned schema migrations.
+
+Schema changes run as an explicit deploy step instead of at import time:
+
+    python migrations.py upgrade     # apply pending migrations
+    python migrations.py status      # show applied / expected version
+
+Each migration is recorded in the ``schema_migrations`` table. The app only
+compares that version against ``SCHEMA_VERSION`` at startup (see
+``check_schema``) and never issues DDL itself.
+
+The target database comes from DATABASE_URL (see db.py), so the same command
+prepares a MySQL server or an SQLite file. Migrations whose SQL differs
+between the two give their statements per dialect.
+"""
+
+import argparse
+import sys
+
+import pymysql
+
+from db import dialect_of, get_backend
+
+MIGRATIONS_LOCK = "clutchcall_schema_migrations"
+
+
+class SchemaOutOfDate(Exception):
+    """Raised when the database is behind the version this code expects."""
+
+
+class Migration:
+    """
+    A numbered schema change made of SQL statements and/or a callable.
+
+    ``statements`` is either a list run on every backend or a dict mapping a
+    dialect ("mysql", "sqlite") to its own list. ``apply`` is called with the
+    cursor and the dialect.
+    """
+
+    def __init__(self, version, name, statements=(), apply=None):
+        self.version = version
+        self.name = name
+        self.statements = statements if isinstance(statements, dict) else list(statements)
+        self.apply = apply
+
+    def statements_for(self, dialect):
+        if isinstance(self.statements, dict):
+            return self.statements.get(dialect, [])
+        return self.statements
+
+    def run(self, cursor, dialect="mysql"):
+        for statement in self.statements_for(dialect):
+            cursor.execute(statement)
+        if self.apply:
+            self.apply(cursor, dialect)
+
+
+BASELINE_SCHEMA = [
+    """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100),
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(255),
+            mfa_secret CHAR(32) UNIQUE DEFAULT NULL,
+            display_name VARCHAR(255),
+            avatar VARCHAR(50) DEFAULT '🎰',
+            phone VARCHAR(20),
+            betting_experience ENUM('beginner', 'intermediate', 'experienced', 'professional') DEFAULT 'beginner',
+            favorite_sports JSON,
+            monthly_budget DECIMAL(12,2) DEFAULT 500.00,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bank_accounts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            account_holder_name VARCHAR(255),
+            bank_name VARCHAR(255),
+            account_type ENUM('checking', 'savings') DEFAULT 'checking',
+            encrypted_routing_number TEXT NOT NULL,
+            encrypted_account_number TEXT NOT NULL,
+            routing_number_hash CHAR(64) NOT NULL,
+            account_number_hash CHAR(64) NOT NULL,
+            last_four VARCHAR(4),
+            is_primary BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            is_verified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            INDEX idx_user_accounts (user_id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bankrolls (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            current_balance DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            initial_bankroll DECIMAL(12,2) NOT NULL,
+            peak_balance DECIMAL(12,2),
+            lowest_balance DECIMAL(12,2),
+            total_wagered DECIMAL(12,2) DEFAULT 0.00,
+            total_won DECIMAL(12,2) DEFAULT 0.00,
+            total_lost DECIMAL(12,2) DEFAULT 0.00,
+            roi DECIMAL(5,2) DEFAULT 0.00,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_user_bankroll (user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS sports (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sport_name VARCHAR(100) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS games (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sport_id INT NOT NULL,
+            game_name VARCHAR(255) NOT NULL,
+            team_a VARCHAR(100) NOT NULL,
+            team_b VARCHAR(100) NOT NULL,
+            game_date DATETIME NOT NULL,
+            status ENUM('scheduled','live','completed','cancelled') DEFAULT 'scheduled',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (sport_id) REFERENCES sports(id) ON DELETE CASCADE,
+            INDEX idx_sport_date (sport_id, game_date),
+            INDEX idx_status (status)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_types (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            type_name VARCHAR(50) UNIQUE NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_legs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            game_id INT NOT NULL,
+            bet_type_id INT NOT NULL,
+            selection VARCHAR(255) NOT NULL,
+            odds DECIMAL(8,2) NOT NULL,
+            odds_format ENUM('american','decimal','fractional') DEFAULT 'american',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE,
+            FOREIGN KEY (bet_type_id) REFERENCES bet_types(id) ON DELETE CASCADE,
+            INDEX idx_game (game_id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bets (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            bankroll_id INT NOT NULL,
+            parlay_id INT,
+            total_stake DECIMAL(12,2) NOT NULL,
+            total_odds DECIMAL(10,2),
+            potential_win DECIMAL(12,2),
+            actual_payout DECIMAL(12,2),
+            status ENUM('pending','won','lost','cancelled','push') DEFAULT 'pending',
+            bet_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            settled_date DATETIME,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (bankroll_id) REFERENCES bankrolls(id) ON DELETE CASCADE,
+            FOREIGN KEY (parlay_id) REFERENCES bets(id) ON DELETE SET NULL,
+            INDEX idx_user_status (user_id, status),
+            INDEX idx_bet_date (bet_date),
+            INDEX idx_settled_date (settled_date)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_slip_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            bet_id INT NOT NULL,
+            bet_leg_id INT NOT NULL,
+            leg_order INT NOT NULL,
+            stake DECIMAL(12,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_bet_leg (bet_id, bet_leg_id),
+            FOREIGN KEY (bet_id) REFERENCES bets(id) ON DELETE CASCADE,
+            FOREIGN KEY (bet_leg_id) REFERENCES bet_legs(id) ON DELETE CASCADE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS ai_recommendations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            game_id INT,
+            bet_leg_id INT,
+            sport_id INT NOT NULL,
+            game_name VARCHAR(255) NOT NULL,
+            selection VARCHAR(255) NOT NULL,
+            odds DECIMAL(8,2) NOT NULL,
+            confidence_score DECIMAL(5,2) NOT NULL,
+            recommended_stake DECIMAL(5,2),
+            analysis TEXT,
+            ai_model VARCHAR(100),
+            is_used BOOLEAN DEFAULT FALSE,
+            bet_id INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+            FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE SET NULL,
+            FOREIGN KEY (sport_id) REFERENCES sports(id) ON DELETE CASCADE,
+            FOREIGN KEY (bet_id) REFERENCES bets(id) ON DELETE SET NULL,
+            INDEX idx_user_created (user_id, created_at),
+            INDEX idx_confidence (confidence_score)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_statistics (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            total_bets INT DEFAULT 0,
+            winning_bets INT DEFAULT 0,
+            losing_bets INT DEFAULT 0,
+            cancelled_bets INT DEFAULT 0,
+            win_rate DECIMAL(5,2) DEFAULT 0.00,
+            average_odds DECIMAL(8,2),
+            total_wagered DECIMAL(12,2) DEFAULT 0.00,
+            total_returned DECIMAL(12,2) DEFAULT 0.00,
+            gross_profit DECIMAL(12,2) DEFAULT 0.00,
+            roi DECIMAL(5,2) DEFAULT 0.00,
+            longest_win_streak INT DEFAULT 0,
+            longest_loss_streak INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_user_stats (user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_analysis (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            bet_id INT NOT NULL,
+            quality_score DECIMAL(5,2),
+            ai_analysis TEXT,
+            user_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_bet_analysis (bet_id),
+            FOREIGN KEY (bet_id) REFERENCES bets(id) ON DELETE CASCADE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS budget_recommendations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            income DECIMAL(12,2) NOT NULL,
+            fixed_expenses DECIMAL(12,2) NOT NULL,
+            savings_goal DECIMAL(12,2) NOT NULL,
+            months_to_goal INT NOT NULL,
+            food_budget DECIMAL(12,2),
+            entertainment_budget DECIMAL(12,2),
+            shopping_budget DECIMAL(12,2),
+            monthly_savings DECIMAL(12,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            INDEX idx_user_created (user_id, created_at)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            action VARCHAR(255) NOT NULL,
+            entity_type VARCHAR(100),
+            entity_id INT,
+            old_value JSON,
+            new_value JSON,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+            INDEX idx_user_action (user_id, action),
+            INDEX idx_created_at (created_at)
+        )
+    """,
+    """
+        INSERT IGNORE INTO bet_types (type_name, description) VALUES
+        ('Moneyline','Pick the winner'),
+        ('Spread','Pick a team to win by a margin'),
+        ('Total','Over/Under total score'),
+        ('Parlay','Multiple bets combined'),
+        ('Prop Bet','Specific events'),
+        ('Futures','Future outcome bets')
+    """,
+    """
+        INSERT IGNORE INTO sports (sport_name) VALUES
+        ('NBA'),('NFL'),('NHL'),('MLB'),('Soccer')
+    """
+]
+
+# The same tables in SQLite's dialect, for tests, benchmarks and local runs.
+# ENUMs become CHECK constraints, inline indexes become CREATE INDEX, and
+# ``updated_at`` is only set on insert (SQLite has no ON UPDATE; no code reads it).
+SQLITE_BASELINE_SCHEMA = [
+    """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(100),
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(255),
+            mfa_secret CHAR(32) UNIQUE DEFAULT NULL,
+            display_name VARCHAR(255),
+            avatar VARCHAR(50) DEFAULT '🎰',
+            phone VARCHAR(20),
+            betting_experience TEXT DEFAULT 'beginner'
+                CHECK (betting_experience IN ('beginner', 'intermediate', 'experienced', 'professional')),
+            favorite_sports TEXT,
+            monthly_budget DECIMAL(12,2) DEFAULT 500.00,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bank_accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            account_holder_name VARCHAR(255),
+            bank_name VARCHAR(255),
+            account_type TEXT DEFAULT 'checking' CHECK (account_type IN ('checking', 'savings')),
+            encrypted_routing_number TEXT NOT NULL,
+            encrypted_account_number TEXT NOT NULL,
+            routing_number_hash CHAR(64) NOT NULL,
+            account_number_hash CHAR(64) NOT NULL,
+            last_four VARCHAR(4),
+            is_primary BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            is_verified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_accounts ON bank_accounts (user_id)",
+    """
+        CREATE TABLE IF NOT EXISTS bankrolls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+            current_balance DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+            initial_bankroll DECIMAL(12,2) NOT NULL,
+            peak_balance DECIMAL(12,2),
+            lowest_balance DECIMAL(12,2),
+            total_wagered DECIMAL(12,2) DEFAULT 0.00,
+            total_won DECIMAL(12,2) DEFAULT 0.00,
+            total_lost DECIMAL(12,2) DEFAULT 0.00,
+            roi DECIMAL(5,2) DEFAULT 0.00,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS sports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sport_name VARCHAR(100) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sport_id INT NOT NULL REFERENCES sports(id) ON DELETE CASCADE,
+            game_name VARCHAR(255) NOT NULL,
+            team_a VARCHAR(100) NOT NULL,
+            team_b VARCHAR(100) NOT NULL,
+            game_date DATETIME NOT NULL,
+            status TEXT DEFAULT 'scheduled' CHECK (status IN ('scheduled', 'live', 'completed', 'cancelled')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sport_date ON games (sport_id, game_date)",
+    "CREATE INDEX IF NOT EXISTS idx_status ON games (status)",
+    """
+        CREATE TABLE IF NOT EXISTS bet_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_name VARCHAR(50) UNIQUE NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_legs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_id INT NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+            bet_type_id INT NOT NULL REFERENCES bet_types(id) ON DELETE CASCADE,
+            selection VARCHAR(255) NOT NULL,
+            odds DECIMAL(8,2) NOT NULL,
+            odds_format TEXT DEFAULT 'american' CHECK (odds_format IN ('american', 'decimal', 'fractional')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_game ON bet_legs (game_id)",
+    """
+        CREATE TABLE IF NOT EXISTS bets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            bankroll_id INT NOT NULL REFERENCES bankrolls(id) ON DELETE CASCADE,
+            parlay_id INT REFERENCES bets(id) ON DELETE SET NULL,
+            total_stake DECIMAL(12,2) NOT NULL,
+            total_odds DECIMAL(10,2),
+            potential_win DECIMAL(12,2),
+            actual_payout DECIMAL(12,2),
+            status TEXT DEFAULT 'pending' CHECK (status IN ('pending', 'won', 'lost', 'cancelled', 'push')),
+            bet_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            settled_date DATETIME,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_status ON bets (user_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_bet_date ON bets (bet_date)",
+    "CREATE INDEX IF NOT EXISTS idx_settled_date ON bets (settled_date)",
+    """
+        CREATE TABLE IF NOT EXISTS bet_slip_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bet_id INT NOT NULL REFERENCES bets(id) ON DELETE CASCADE,
+            bet_leg_id INT NOT NULL REFERENCES bet_legs(id) ON DELETE CASCADE,
+            leg_order INT NOT NULL,
+            stake DECIMAL(12,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (bet_id, bet_leg_id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS ai_recommendations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT REFERENCES users(id) ON DELETE SET NULL,
+            game_id INT REFERENCES games(id) ON DELETE SET NULL,
+            bet_leg_id INT,
+            sport_id INT NOT NULL REFERENCES sports(id) ON DELETE CASCADE,
+            game_name VARCHAR(255) NOT NULL,
+            selection VARCHAR(255) NOT NULL,
+            odds DECIMAL(8,2) NOT NULL,
+            confidence_score DECIMAL(5,2) NOT NULL,
+            recommended_stake DECIMAL(5,2),
+            analysis TEXT,
+            ai_model VARCHAR(100),
+            is_used BOOLEAN DEFAULT FALSE,
+            bet_id INT REFERENCES bets(id) ON DELETE SET NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_recommendations_user_created ON ai_recommendations (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_confidence ON ai_recommendations (confidence_score)",
+    """
+        CREATE TABLE IF NOT EXISTS bet_statistics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+            total_bets INT DEFAULT 0,
+            winning_bets INT DEFAULT 0,
+            losing_bets INT DEFAULT 0,
+            cancelled_bets INT DEFAULT 0,
+            win_rate DECIMAL(5,2) DEFAULT 0.00,
+            average_odds DECIMAL(8,2),
+            total_wagered DECIMAL(12,2) DEFAULT 0.00,
+            total_returned DECIMAL(12,2) DEFAULT 0.00,
+            gross_profit DECIMAL(12,2) DEFAULT 0.00,
+            roi DECIMAL(5,2) DEFAULT 0.00,
+            longest_win_streak INT DEFAULT 0,
+            longest_loss_streak INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS bet_analysis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bet_id INT NOT NULL UNIQUE REFERENCES bets(id) ON DELETE CASCADE,
+            quality_score DECIMAL(5,2),
+            ai_analysis TEXT,
+            user_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS budget_recommendations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            income DECIMAL(12,2) NOT NULL,
+            fixed_expenses DECIMAL(12,2) NOT NULL,
+            savings_goal DECIMAL(12,2) NOT NULL,
+            months_to_goal INT NOT NULL,
+            food_budget DECIMAL(12,2),
+            entertainment_budget DECIMAL(12,2),
+            shopping_budget DECIMAL(12,2),
+            monthly_savings DECIMAL(12,2),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_budget_user_created ON budget_recommendations (user_id, created_at)",
+    """
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INT REFERENCES users(id) ON DELETE SET NULL,
+            action VARCHAR(255) NOT NULL,
+            entity_type VARCHAR(100),
+            entity_id INT,
+            old_value TEXT,
+            new_value TEXT,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_user_action ON audit_logs (user_id, action)",
+    "CREATE INDEX IF NOT EXISTS idx_created_at ON audit_logs (created_at)",
+    """
+        INSERT OR IGNORE INTO bet_types (type_name, description) VALUES
+        ('Moneyline','Pick the winner'),
+        ('Spread','Pick a team to win by a margin'),
+        ('Total','Over/Under total score'),
+        ('Parlay','Multiple bets combined'),
+        ('Prop Bet','Specific events'),
+        ('Futures','Future outcome bets')
+    """,
+    """
+        INSERT OR IGNORE INTO sports (sport_name) VALUES
+        ('NBA'),('NFL'),('NHL'),('MLB'),('Soccer')
+    """
+]
+
+# Columns added after the baseline tables first shipped. Databases created by
+# older builds get them through migration 2; fresh databases already have them.
+LEGACY_COLUMNS = [
+    ("users", "username", "VARCHAR(100)"),
+    ("users", "password", "VARCHAR(255)"),
+    ("users", "display_name", "VARCHAR(255)"),
+    ("users", "avatar", "VARCHAR(50) DEFAULT '🎰'"),
+    ("users", "phone", "VARCHAR(20)"),
+    ("users", "betting_experience", "ENUM('beginner', 'intermediate', 'experienced', 'professional') DEFAULT 'beginner'"),
+    ("users", "favorite_sports", "JSON"),
+    ("users", "monthly_budget", "DECIMAL(12,2) DEFAULT 500.00"),
+    ("bank_accounts", "last_four", "VARCHAR(4)"),
+    ("bank_accounts", "is_active", "BOOLEAN DEFAULT TRUE"),
+]
+
+
+def add_legacy_columns(cursor, dialect="mysql"):
+    """Add any LEGACY_COLUMNS missing from the current database in one pass."""
+    if dialect != "mysql":
+        # Only MySQL databases predate the baseline schema.
+        return
+
+    cursor.execute(
+        """
+        SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        """
+    )
+    existing = {(row["table_name"], row["column_name"]) for row in cursor.fetchall()}
+
+    for table, column, definition in LEGACY_COLUMNS:
+        if (table, column) not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# Legs saved from a parsed bet slip have no scheduled game, so game_id becomes
+# optional and the leg keeps the sport and game name the parser found.
+BET_LEGS_WITHOUT_GAMES = {
+    "mysql": [
+        """
+            ALTER TABLE bet_legs
+                MODIFY game_id INT NULL,
+                ADD COLUMN sport_id INT NULL AFTER game_id,
+                ADD COLUMN game_name VARCHAR(255) AFTER sport_id,
+                ADD CONSTRAINT fk_bet_legs_sport FOREIGN KEY (sport_id) REFERENCES sports(id) ON DELETE SET NULL
+        """,
+    ],
+    # SQLite cannot drop NOT NULL in place; rebuild the table instead.
+    "sqlite": [
+        """
+            CREATE TABLE bet_legs_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id INT REFERENCES games(id) ON DELETE CASCADE,
+                sport_id INT REFERENCES sports(id) ON DELETE SET NULL,
+                game_name VARCHAR(255),
+                bet_type_id INT NOT NULL REFERENCES bet_types(id) ON DELETE CASCADE,
+                selection VARCHAR(255) NOT NULL,
+                odds DECIMAL(8,2) NOT NULL,
+                odds_format TEXT DEFAULT 'american' CHECK (odds_format IN ('american', 'decimal', 'fractional')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        """
+            INSERT INTO bet_legs_new (id, game_id, bet_type_id, selection, odds, odds_format, created_at)
+            SELECT id, game_id, bet_type_id, selection, odds, odds_format, created_at FROM bet_legs
+        """,
+        "DROP TABLE bet_legs",
+        "ALTER TABLE bet_legs_new RENAME TO bet_legs",
+        "CREATE INDEX IF NOT EXISTS idx_game ON bet_legs (game_id)",
+    ],
+}
+
+# Rotating refresh tokens, stored as SHA-256 digests. A family is every token
+# descended from one sign-in; reusing a rotated token revokes its family.
+REFRESH_TOKENS = {
+    "mysql": [
+        """
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                family_id CHAR(32) NOT NULL,
+                token_hash CHAR(64) NOT NULL,
+                expires_at DATETIME NOT NULL,
+                used_at DATETIME NULL,
+                revoked_at DATETIME NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uniq_refresh_token_hash (token_hash),
+                INDEX idx_refresh_family (family_id),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """,
+    ],
+    "sqlite": [
+        """
+            CREATE TABLE IF NOT EXISTS refresh_tokens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                family_id CHAR(32) NOT NULL,
+                token_hash CHAR(64) NOT NULL UNIQUE,
+                expires_at DATETIME NOT NULL,
+                used_at DATETIME,
+                revoked_at DATETIME,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_refresh_family ON refresh_tokens (family_id)",
+    ],
+}
+
+# Access tokens revoked before their exp (see revocation.py); rows can be
+# deleted once expires_at has passed.
+REVOKED_TOKENS = {
+    "mysql": [
+        """
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti CHAR(32) PRIMARY KEY,
+                expires_at DATETIME NOT NULL,
+                revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_revoked_expires (expires_at)
+            )
+        """,
+    ],
+    "sqlite": [
+        """
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti CHAR(32) PRIMARY KEY,
+                expires_at DATETIME NOT NULL,
+                revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_revoked_expires ON revoked_tokens (expires_at)",
+    ],
+}
+
+# Register writes the bcrypt hash to both password columns, but older builds
+# left password_hash empty and /change-password only updated password. When
+# the columns disagree, password is the newer one.
+RECONCILE_PASSWORD_COLUMNS = [
+    "UPDATE users SET password_hash = password WHERE password_hash IS NULL OR password_hash <> password",
+]
+
+# Budget figures and risk mode of the chat assistant, one row per user (see
+# chat_state.py). Written behind a cache, so rows can lag a few seconds.
+CHAT_STATE = {
+    "mysql": [
+        """
+            CREATE TABLE IF NOT EXISTS chat_state (
+                user_id INT PRIMARY KEY,
+                income DECIMAL(12, 2) NOT NULL,
+                expenses DECIMAL(12, 2) NOT NULL,
+                savings DECIMAL(12, 2) NOT NULL,
+                categories JSON NOT NULL,
+                risk_mode VARCHAR(20) NOT NULL DEFAULT 'conservative',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """,
+    ],
+    "sqlite": [
+        """
+            CREATE TABLE IF NOT EXISTS chat_state (
+                user_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                income DECIMAL(12, 2) NOT NULL,
+                expenses DECIMAL(12, 2) NOT NULL,
+                savings DECIMAL(12, 2) NOT NULL,
+                categories TEXT NOT NULL,
+                risk_mode VARCHAR(20) NOT NULL DEFAULT 'conservative',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+    ],
+}
+
+
+# Legs record the bet they were saved with, so a slip's leg ids can be read
+# back after its multi-row insert instead of being worked out from lastrowid.
+BET_LEGS_BET_ID = {
+    "mysql": [
+        """
+            ALTER TABLE bet_legs
+                ADD COLUMN bet_id INT NULL AFTER id,
+                ADD INDEX idx_bet_legs_bet (bet_id),
+                ADD CONSTRAINT fk_bet_legs_bet FOREIGN KEY (bet_id) REFERENCES bets(id) ON DELETE CASCADE
+        """,
+    ],
+    "sqlite": [
+        "ALTER TABLE bet_legs ADD COLUMN bet_id INT REFERENCES bets(id) ON DELETE CASCADE",
+        "CREATE INDEX IF NOT EXISTS idx_bet_legs_bet ON bet_legs (bet_id)",
+    ],
+}
+
+
+# A version per chat_state row, bumped by every write, so a worker holding
+# an older copy cannot overwrite a newer one (see chat_state.py).
+CHAT_STATE_VERSION = [
+    "ALTER TABLE chat_state ADD COLUMN version INT NOT NULL DEFAULT 0",
+]
+
+
+MIGRATIONS = [
+    Migration(1, "baseline schema and seed data", {"mysql": BASELINE_SCHEMA, "sqlite": SQLITE_BASELINE_SCHEMA}),
+    Migration(2, "add columns missing from pre-baseline databases", apply=add_legacy_columns),
+    Migration(3, "bet legs without a scheduled game", BET_LEGS_WITHOUT_GAMES),
+    Migration(4, "refresh tokens", REFRESH_TOKENS),
+    Migration(5, "revoked access tokens", REVOKED_TOKENS),
+    Migration(6, "reconcile password columns",
+              {"mysql": RECONCILE_PASSWORD_COLUMNS, "sqlite": RECONCILE_PASSWORD_COLUMNS}),
+    Migration(7, "chat assistant state", CHAT_STATE),
+    Migration(8, "bet legs record their bet", BET_LEGS_BET_ID),
+    Migration(9, "chat state row versions",
+              {"mysql": CHAT_STATE_VERSION, "sqlite": CHAT_STATE_VERSION}),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def current_version(conn):
+    """Return the highest applied migration version, or 0 for an empty database."""
+    try:
+        with conn.cursor() as c:
+            c.execute("SELECT MAX(version) AS version FROM schema_migrations")
+            row = c.fetchone()
+    except pymysql.err.ProgrammingError:
+        # schema_migrations does not exist yet
+        conn.rollback()
+        return 0
+    return (row or {}).get("version") or 0
+
+
+def check_schema(conn):
+    """
+    Verify the database is at SCHEMA_VERSION with a single query.
+
+    Raises SchemaOutOfDate if migrations are pending.
+    """
+    version = current_version(conn)
+    if version < SCHEMA_VERSION:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            "Run `python migrations.py upgrade`."
+        )
+    return version
+
+
+def pending_migrations(conn, target=None):
+    target = SCHEMA_VERSION if target is None else target
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if version < m.version <= target]
+
+
+def _begin_upgrade(conn, dialect):
+    with conn.cursor() as c:
+        if dialect == "mysql":
+            c.execute("SELECT GET_LOCK(%s, 60) AS locked", (MIGRATIONS_LOCK,))
+            if not (c.fetchone() or {}).get("locked"):
+                raise RuntimeError("Timed out waiting for the schema migration lock.")
+        elif dialect == "sqlite":
+            # Table rebuilds must not cascade through foreign keys (SQLite's
+            # documented ALTER procedure); _check_foreign_keys runs before commit.
+            c.execute("PRAGMA foreign_keys = OFF")
+
+
+def _check_foreign_keys(conn, dialect):
+    if dialect == "sqlite":
+        with conn.cursor() as c:
+            c.execute("PRAGMA foreign_key_check")
+            if c.fetchone():
+                raise RuntimeError("Migration left rows violating foreign keys.")
+
+
+def _end_upgrade(conn, dialect):
+    with conn.cursor() as c:
+        if dialect == "mysql":
+            c.execute("SELECT RELEASE_LOCK(%s)", (MIGRATIONS_LOCK,))
+        elif dialect == "sqlite":
+            c.execute("PRAGMA foreign_keys = ON")
+
+
+def upgrade(conn, target=None):
+    """
+    Apply pending migrations up to ``target`` (default: latest).
+
+    On MySQL a named lock keeps concurrent deploy steps from racing each
+    other; SQLite already serialises schema writers. Returns the list of
+    applied migrations.
+    """
+    dialect = dialect_of(conn)
+    _begin_upgrade(conn, dialect)
+
+    applied = []
+    try:
+        with conn.cursor() as c:
+            ensure_migrations_table(c)
+        conn.commit()
+
+        for migration in pending_migrations(conn, target):
+            with conn.cursor() as c:
+                migration.run(c, dialect)
+                c.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name),
+                )
+            _check_foreign_keys(conn, dialect)
+            conn.commit()
+            applied.append(migration)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        _end_upgrade(conn, dialect)
+
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the ClutchCall database schema.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--target", type=int, default=None, help="stop after this version")
+    sub.add_parser("status", help="show the applied and expected schema version")
+    args = parser.parse_args(argv)
+
+    conn = get_backend().connect(create_db_if_missing=True)
+    try:
+        if args.command == "upgrade":
+            applied = upgrade(conn, args.target)
+            for migration in applied:
+                print(f"Applied {migration.version}: {migration.name}")
+            print(f"Schema at version {current_version(conn)}.")
+        else:
+            version = current_version(conn)
+            print(f"Applied version:  {version}")
+            print(f"Expected version: {SCHEMA_VERSION}")
+            for migration in MIGRATIONS:
+                state = "applied" if migration.version <= version else "pending"
+                print(f"  {migration.version:>3}  {state:<8} {migration.name}")
+            return 0 if version >= SCHEMA_VERSION else 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
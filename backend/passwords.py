@@ -0,0 +1,281 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is deliberately slow (hundreds of milliseconds per hash), so a burst
+of logins run inline would occupy every request thread and starve cheap
+endpoints. Hashes run instead on a small dedicated thread pool (bcrypt
+releases the GIL, so the pool uses real cores) behind a bounded queue. When
+the queue is full, callers get PasswordHasherBusy at once rather than
+waiting; the app turns that into 503 with Retry-After.
+
+The bcrypt cost comes from a policy file written by calibration on the
+deployment machine, so a hash takes about the same time on any instance
+type. Hashes made at another cost are replaced on the next good login:
+
+    python passwords.py calibrate --target-ms 250
+    python passwords.py show
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from metrics import LatencyRegistry
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashes allowed to wait for a worker; further requests are refused
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+# Seconds sent in Retry-After when the queue is full
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+# Range calibration may pick from; 12 is used until a policy exists
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+BCRYPT_DEFAULT_ROUNDS = 12
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+PASSWORD_POLICY_FILE = os.getenv(
+    "PASSWORD_POLICY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "password_policy.json"),
+)
+# "1" calibrates at startup when no policy file exists yet
+PASSWORD_CALIBRATE_ON_START = os.getenv("PASSWORD_CALIBRATE_ON_START", "0") == "1"
+
+# "hash" and "check" run times plus "queue_wait" per job, recorded by the workers
+PASSWORD_LATENCY = LatencyRegistry()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing is at capacity.")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """bcrypt hash/check on a bounded worker pool with fail-fast admission."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_QUEUE,
+                 retry_after=PASSWORD_HASH_RETRY_AFTER, rounds=None):
+        self.rounds = rounds if rounds is not None else load_rounds()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        # One slot per job that is running or waiting for a worker
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._stats = {"completed": 0, "rejected": 0, "peak_queued": 0}
+
+    def hash(self, password):
+        """Return a new bcrypt hash of ``password`` as a str."""
+        return self._run("hash", _hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        """Return True if ``password`` matches the bcrypt hash ``hashed`` (str or bytes)."""
+        return self._run("check", _check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """Return True if ``hashed`` was not made at this hasher's cost."""
+        return hash_cost(hashed) != self.rounds
+
+    def stats(self):
+        """Return queue depth and job counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "rounds": self.rounds,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._in_flight - self._running,
+            })
+        stats["latency"] = PASSWORD_LATENCY.snapshot()
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def _run(self, name, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PasswordHasherBusy(self.retry_after)
+
+        with self._lock:
+            self._in_flight += 1
+            queued = self._in_flight - self._running
+            if queued > self._stats["peak_queued"]:
+                self._stats["peak_queued"] = queued
+        try:
+            future = self._executor.submit(self._work, name, time.perf_counter(), fn, args)
+        except BaseException:
+            self._finish(started=False)
+            raise
+        return future.result()
+
+    def _work(self, name, submitted, fn, args):
+        started = time.perf_counter()
+        PASSWORD_LATENCY.record("queue_wait", started - submitted)
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            PASSWORD_LATENCY.record(name, time.perf_counter() - started)
+            self._finish(started=True)
+
+    def _finish(self, started):
+        with self._lock:
+            self._in_flight -= 1
+            if started:
+                self._running -= 1
+                self._stats["completed"] += 1
+        self._slots.release()
+
+
+def _hash(password, rounds=BCRYPT_DEFAULT_ROUNDS):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode()
+
+
+def _check(password, hashed):
+    if isinstance(hashed, str):
+        hashed = hashed.encode("utf-8")
+    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+
+
+_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+def hash_cost(hashed):
+    """Return the cost of a bcrypt hash (str or bytes), or None if it is not one."""
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode("utf-8", "replace")
+    match = _COST.match(hashed or "")
+    return int(match.group(1)) if match else None
+
+
+def calibrate(target_ms=PASSWORD_HASH_TARGET_MS, min_rounds=BCRYPT_MIN_ROUNDS,
+              max_rounds=BCRYPT_MAX_ROUNDS, samples=3):
+    """
+    Return the policy whose hash time on this machine is closest to ``target_ms``
+    without exceeding it (``min_rounds`` if even that is slower).
+
+    Each extra round doubles the work, so the cost is extrapolated from the
+    fastest of ``samples`` hashes at ``min_rounds`` and then measured once.
+    """
+    base_ms = min(_time_hash(min_rounds) for _ in range(samples))
+    extra = int(math.floor(math.log2(target_ms / base_ms))) if base_ms < target_ms else 0
+    rounds = max(min_rounds, min(max_rounds, min_rounds + extra))
+    hash_ms = base_ms if rounds == min_rounds else _time_hash(rounds)
+    if hash_ms > target_ms and rounds > min_rounds:
+        rounds -= 1
+        hash_ms = _time_hash(rounds)
+    return {
+        "rounds": rounds,
+        "target_ms": target_ms,
+        "hash_ms": round(hash_ms, 1),
+        "calibrated_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+
+
+def _time_hash(rounds):
+    started = time.perf_counter()
+    _hash("calibration-password", rounds)
+    return (time.perf_counter() - started) * 1000
+
+
+def load_policy(path=PASSWORD_POLICY_FILE):
+    """Return the stored calibration policy, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        print(f"WARNING: ignoring unreadable password policy {path}: {exc}")
+        return None
+
+
+def save_policy(policy, path=PASSWORD_POLICY_FILE):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(policy, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_rounds(path=PASSWORD_POLICY_FILE):
+    """Return the bcrypt cost to hash with: BCRYPT_ROUNDS, else the policy file, else the default."""
+    if os.getenv("BCRYPT_ROUNDS"):
+        return int(os.environ["BCRYPT_ROUNDS"])
+    policy = load_policy(path)
+    if policy is None and PASSWORD_CALIBRATE_ON_START:
+        policy = calibrate()
+        save_policy(policy, path)
+        print(f"Calibrated bcrypt cost {policy['rounds']} ({policy['hash_ms']}ms per hash)")
+    return int(policy["rounds"]) if policy else BCRYPT_DEFAULT_ROUNDS
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Return the process-wide PasswordHasher, creating it on first use."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def check_password(password, hashed):
+    return get_password_hasher().check(password, hashed)
+
+
+def needs_rehash(hashed):
+    return get_password_hasher().needs_rehash(hashed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the bcrypt cost policy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="measure this machine and store the policy")
+    cal.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS,
+                     help="longest acceptable time for one hash")
+    cal.add_argument("--dry-run", action="store_true", help="print the policy without storing it")
+    sub.add_parser("show", help="print the stored policy")
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        policy = calibrate(args.target_ms)
+        if not args.dry_run:
+            save_policy(policy)
+        print(json.dumps(policy, indent=2))
+    else:
+        policy = load_policy()
+        if policy is None:
+            print(f"No policy at {PASSWORD_POLICY_FILE}; hashing at cost {load_rounds()}.")
+            return 1
+        print(json.dumps(policy, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
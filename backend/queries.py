@@ -0,0 +1,117 @@
+"""
+Catalog of the SQL run by the Flask app.
+
+Every statement is a ``Query``: a plain SQL string that also carries a stable
+name. The unit of work records latency per name (see metrics.py), so the
+admin stats read "bank_accounts.find_duplicate" rather than a SQL fragment.
+Statements run without a name are grouped by their leading SQL words.
+"""
+
+import re
+
+
+class Query(str):
+    """SQL text with a catalog name; usable anywhere a SQL string is."""
+
+    def __new__(cls, name, sql):
+        query = super().__new__(cls, sql)
+        query.name = name
+        return query
+
+
+_FINGERPRINT = re.compile(r"^\s*(\w+)(?:.*?\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+))?", re.IGNORECASE | re.DOTALL)
+
+
+def query_name(sql):
+    """Return the catalog name of ``sql``, or a fingerprint such as "SELECT users"."""
+    name = getattr(sql, "name", None)
+    if name:
+        return name
+    match = _FINGERPRINT.match(sql)
+    if not match:
+        return "unnamed"
+    verb, table = match.group(1).upper(), match.group(2)
+    if verb == "UPDATE":
+        table = re.match(r"\s*UPDATE\s+(\w+)", sql, re.IGNORECASE).group(1)
+    return f"{verb} {table}" if table else verb
+
+
+# users
+USER_ACTIVE_BY_EMAIL = Query("users.active_by_email", "SELECT id, email, is_active FROM users WHERE email = %s")
+USER_FOR_LOGIN = Query("users.for_login", "SELECT * FROM users WHERE email = %s")
+USER_MFA_SECRET = Query("users.mfa_secret", "SELECT mfa_secret FROM users WHERE email = %s")
+USER_FOR_MFA = Query("users.for_mfa", "SELECT id, email, mfa_secret FROM users WHERE email = %s")
+SET_MFA_SECRET = Query("users.set_mfa_secret", "UPDATE users SET mfa_secret = %s WHERE email = %s")
+BACKFILL_USERNAME = Query(
+    "users.backfill_username",
+    "UPDATE users SET username = %s, display_name = %s WHERE id = %s",
+)
+INSERT_USER = Query(
+    "users.insert",
+    "INSERT INTO users (email, password_hash, username, display_name, password) VALUES (%s, %s, %s, %s, %s)",
+)
+USER_PROFILE = Query("users.profile", """
+    SELECT id, username, email, display_name, avatar, phone,
+           betting_experience, favorite_sports, monthly_budget, created_at
+    FROM users WHERE id = %s
+""")
+USER_PASSWORD = Query("users.password", "SELECT password_hash, password FROM users WHERE id = %s")
+# Both columns hold the same bcrypt hash (see migration 6)
+SET_USER_PASSWORD = Query("users.set_password", "UPDATE users SET password_hash = %s, password = %s WHERE id = %s")
+
+
+def update_profile(assignments):
+    """UPDATE for ``"column = %s"`` assignments built from the view's fixed field list."""
+    return Query("users.update_profile", f"UPDATE users SET {', '.join(assignments)} WHERE id = %s")
+
+
+# bank_accounts
+ACTIVE_BANK_ACCOUNTS = Query("bank_accounts.active_for_user", """
+    SELECT id, bank_name, account_type, last_four, is_primary, created_at
+    FROM bank_accounts
+    WHERE user_id = %s AND is_active = TRUE
+    ORDER BY is_primary DESC, created_at DESC
+""")
+COUNT_ACTIVE_BANK_ACCOUNTS = Query(
+    "bank_accounts.count_active",
+    "SELECT COUNT(*) as count FROM bank_accounts WHERE user_id = %s AND is_active = TRUE",
+)
+FIND_DUPLICATE_BANK_ACCOUNT = Query("bank_accounts.find_duplicate", """
+    SELECT id FROM bank_accounts
+    WHERE user_id = %s AND routing_number_hash = %s AND account_number_hash = %s AND is_active = TRUE
+""")
+INSERT_BANK_ACCOUNT = Query("bank_accounts.insert", """
+    INSERT INTO bank_accounts
+    (user_id, bank_name, account_type, encrypted_routing_number, encrypted_account_number,
+     routing_number_hash, account_number_hash, last_four, is_primary, is_active)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
+""")
+ACTIVE_BANK_ACCOUNT = Query(
+    "bank_accounts.active_by_id",
+    "SELECT id, is_primary FROM bank_accounts WHERE id = %s AND user_id = %s AND is_active = TRUE",
+)
+DEACTIVATE_BANK_ACCOUNT = Query(
+    "bank_accounts.deactivate",
+    "UPDATE bank_accounts SET is_active = FALSE WHERE id = %s",
+)
+CLEAR_PRIMARY_BANK_ACCOUNT = Query(
+    "bank_accounts.clear_primary",
+    "UPDATE bank_accounts SET is_primary = FALSE WHERE user_id = %s",
+)
+SET_PRIMARY_BANK_ACCOUNT = Query(
+    "bank_accounts.set_primary",
+    "UPDATE bank_accounts SET is_primary = TRUE WHERE id = %s",
+)
+# The derived table keeps this valid on MySQL and SQLite alike.
+PROMOTE_NEWEST_BANK_ACCOUNT = Query("bank_accounts.promote_newest", """
+    UPDATE bank_accounts
+    SET is_primary = TRUE
+    WHERE id = (
+        SELECT id FROM (
+            SELECT id FROM bank_accounts
+            WHERE user_id = %s AND is_active = TRUE
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        ) AS newest
+    )
+""")
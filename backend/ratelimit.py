@@ -0,0 +1,261 @@
+"""
+Token-bucket rate limiting for the credential endpoints.
+
+/login, /register and /mfa/validate spend real CPU per attempt (bcrypt, TOTP
+window checks), so a credential-stuffing burst would otherwise turn straight
+into CPU exhaustion. Each attempt takes a token from a bucket for the
+client's IP. The bucket of the account it names only loses a token when the
+credentials it sent are wrong, and is refilled when they are right, so
+knowing someone's email is not enough to lock them out. A bucket holds
+``capacity`` tokens and refills at ``capacity / period`` per second.
+Attempts finding a bucket empty are refused with a Retry-After before any
+query or hash runs.
+
+Buckets live in a store, chosen by ``RATE_LIMIT_STORE``. MemoryStore keeps
+them in this process, so each worker limits on its own. SharedStore keeps
+them in a key-value service (anything with Redis-style ``get``/``delete``/
+``set(..., ex=)``), so all workers share them. LocalKeyValue is an
+in-process stand-in for that service.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimit:
+    """``capacity`` attempts per ``period`` seconds, refilled continuously."""
+
+    __slots__ = ("capacity", "period")
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+
+    @property
+    def refill_rate(self):
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse ``"attempts/seconds"``, e.g. ``"30/60"``."""
+        attempts, _, seconds = spec.partition("/")
+        return cls(int(attempts), float(seconds or 60))
+
+    def __repr__(self):
+        return f"RateLimit({self.capacity}/{self.period:g}s)"
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Attempts per client IP, across all credential endpoints
+RATE_LIMIT_PER_IP = RateLimit.parse(os.getenv("RATE_LIMIT_PER_IP", "30/60"))
+# Failed attempts per account (email) on each credential endpoint
+RATE_LIMIT_PER_ACCOUNT = RateLimit.parse(os.getenv("RATE_LIMIT_PER_ACCOUNT", "10/300"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# "memory" (per process) or a redis:// URL shared by every worker
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+
+
+class RateLimited(Exception):
+    """Raised when a client has used up its attempts."""
+
+    def __init__(self, retry_after):
+        super().__init__("Too many attempts.")
+        self.retry_after = retry_after
+
+
+def _take(state, limit, now, cost=1):
+    """
+    Apply an attempt costing ``cost`` tokens (0 only checks) to a bucket
+    ``(tokens, updated_at)``; return ``(state, wait)``.
+    """
+    if state is None:
+        tokens = float(limit.capacity)
+    else:
+        tokens, updated_at = state
+        tokens = min(float(limit.capacity), tokens + (now - updated_at) * limit.refill_rate)
+    if tokens >= 1:
+        return (tokens - cost, now), 0.0
+    return (tokens, now), (1 - tokens) / limit.refill_rate
+
+
+class MemoryStore:
+    """Buckets in this process; the least recently used are dropped past ``max_keys``."""
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, limit, now, cost=1):
+        """Take ``cost`` tokens from ``key``'s bucket; return 0, or the seconds until one is available."""
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None and not cost:
+                return 0.0
+            state, wait = _take(state, limit, now, cost)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self, key):
+        """Refill ``key``'s bucket."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SharedStore:
+    """
+    Buckets in a key-value service shared by all workers.
+
+    ``client`` needs ``get(key)``, ``delete(key)`` and ``set(key, value,
+    ex=seconds)``, which redis-py provides. The read-modify-write is not atomic, so workers racing
+    on one key may let an extra attempt or two through.
+    """
+
+    def __init__(self, client, prefix="ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key, limit, now, cost=1):
+        key = self.prefix + key
+        raw = self.client.get(key)
+        if raw is None and not cost:
+            return 0.0
+        state, wait = _take(tuple(json.loads(raw)) if raw else None, limit, now, cost)
+        # A bucket left alone for a full period is full again, so it can expire
+        self.client.set(key, json.dumps(state), ex=max(1, int(limit.period + 0.5)))
+        return wait
+
+    def reset(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        clear = getattr(self.client, "clear", None)
+        if clear is not None:
+            clear()
+
+
+class LocalKeyValue:
+    """In-process stand-in for a shared key-value service (get/set with expiry)."""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._values[key] = (value, self._clock() + ex if ex else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def create_store(spec=RATE_LIMIT_STORE):
+    """Return the bucket store for ``spec``: ``"memory"`` or a ``redis://`` URL."""
+    if spec == "memory":
+        return MemoryStore()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # only needed for a shared store
+
+        return SharedStore(redis.Redis.from_url(spec))
+    raise ValueError(f"RATE_LIMIT_STORE must be 'memory' or a redis:// URL, not {spec!r}")
+
+
+class RateLimiter:
+    """Checks attempts against per-IP buckets and per-account buckets of failures in ``store``."""
+
+    def __init__(self, store=None, per_ip=RATE_LIMIT_PER_IP, per_account=RATE_LIMIT_PER_ACCOUNT,
+                 enabled=RATE_LIMIT_ENABLED, clock=time.time):
+        self.store = store if store is not None else MemoryStore()
+        self.per_ip = per_ip
+        self.per_account = per_account
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "limited_ip": 0, "limited_account": 0, "failures": 0}
+
+    def hit(self, ip, account=None):
+        """
+        Count one attempt from ``ip``; raise RateLimited if the IP is over its
+        limit or ``account`` has used up its failed attempts. Only the IP
+        bucket is charged: report the outcome with failed() or succeeded().
+        """
+        if not self.enabled:
+            return
+        now = self._clock()
+        checks = [("ip", _ip_key(ip), self.per_ip, 1)]
+        if account:
+            checks.append(("account", _account_key(account), self.per_account, 0))
+
+        for scope, key, limit, cost in checks:
+            wait = self.store.take(key, limit, now, cost)
+            if wait > 0:
+                with self._lock:
+                    self._stats[f"limited_{scope}"] += 1
+                raise RateLimited(max(1, math.ceil(wait)))
+        with self._lock:
+            self._stats["allowed"] += 1
+
+    def failed(self, account):
+        """Charge ``account`` for an attempt whose credentials were wrong."""
+        if not self.enabled or not account:
+            return
+        self.store.take(_account_key(account), self.per_account, self._clock())
+        with self._lock:
+            self._stats["failures"] += 1
+
+    def succeeded(self, account):
+        """Forget ``account``'s failed attempts once it has signed in."""
+        if self.enabled and account:
+            self.store.reset(_account_key(account))
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "store": type(self.store).__name__,
+            "per_ip": repr(self.per_ip),
+            "per_account": repr(self.per_account),
+        })
+        return stats
+
+
+def _ip_key(ip):
+    return f"ip:{ip}"
+
+
+def _account_key(account):
+    return f"account:{account.strip().lower()}"
+
+
+RATE_LIMITER = RateLimiter(store=create_store())
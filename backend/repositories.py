@@ -0,0 +1,506 @@
+"""
+Data-access helpers for tables written on hot request paths.
+
+Repositories run their SQL through a UnitOfWork (see db.py) so that every
+call made while handling one request shares its connection and transaction.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from app.bet_parser import calculate_payout
+from queries import (
+    BACKFILL_USERNAME,
+    INSERT_USER,
+    SET_MFA_SECRET,
+    SET_USER_PASSWORD,
+    USER_ACTIVE_BY_EMAIL,
+    Query,
+    update_profile,
+)
+
+BANKROLL_COLUMNS = "id, user_id, current_balance, initial_bankroll, peak_balance, lowest_balance"
+
+DEFAULT_BANKROLL = 5000.0
+
+
+class BankrollRepository:
+    """Reads and atomic writes for the ``bankrolls`` table (one row per user)."""
+
+    # A single statement creates the row or moves the balance. Peak and lowest
+    # balances are folded in SQL, so concurrent writers cannot lose updates.
+    UPSERT_BALANCE_SQL = {
+        "mysql": Query("bankrolls.upsert_balance", """
+            INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                peak_balance = GREATEST(COALESCE(peak_balance, VALUES(current_balance)), VALUES(current_balance)),
+                lowest_balance = LEAST(COALESCE(lowest_balance, VALUES(current_balance)), VALUES(current_balance)),
+                current_balance = VALUES(current_balance)
+        """),
+        "sqlite": Query("bankrolls.upsert_balance", """
+            INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET
+                peak_balance = MAX(COALESCE(peak_balance, excluded.current_balance), excluded.current_balance),
+                lowest_balance = MIN(COALESCE(lowest_balance, excluded.current_balance), excluded.current_balance),
+                current_balance = excluded.current_balance
+        """),
+    }
+
+    INSERT_IF_MISSING_SQL = {
+        "mysql": Query("bankrolls.insert_if_missing", """
+            INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE user_id = user_id
+        """),
+        "sqlite": Query("bankrolls.insert_if_missing", """
+            INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (user_id) DO NOTHING
+        """),
+    }
+
+    # Dialects that can hand the written row back from the upsert itself.
+    RETURNING_DIALECTS = ("sqlite",)
+
+    SELECT_SQL = Query("bankrolls.by_user", f"SELECT {BANKROLL_COLUMNS} FROM bankrolls WHERE user_id = %s")
+
+    def __init__(self, uow):
+        self.uow = uow
+
+    def get(self, user_id):
+        """Return the user's bankroll row, or None."""
+        with self.uow.cursor() as c:
+            c.execute(self.SELECT_SQL, (user_id,))
+            return c.fetchone()
+
+    def get_or_create(self, user_id, default_amount=DEFAULT_BANKROLL):
+        """
+        Return the user's bankroll, creating it with ``default_amount`` if missing.
+
+        Existing rows cost one SELECT. A missing row is created race-free (a
+        concurrent insert wins and is returned instead).
+        """
+        row = self.get(user_id)
+        if row:
+            return row
+
+        with self.uow.cursor() as c:
+            c.execute(
+                self.INSERT_IF_MISSING_SQL[self.uow.dialect],
+                (user_id, default_amount, default_amount, default_amount, default_amount),
+            )
+        return self.get(user_id)
+
+    def set_balance(self, user_id, new_balance, default_amount=DEFAULT_BANKROLL, returning=True):
+        """
+        Set the current balance in one atomic statement, creating the row if needed.
+
+        A new row starts from ``default_amount`` as its initial bankroll, with
+        peak/lowest covering both values. With ``returning=False`` no row is
+        read back and only the new balance is returned. On SQLite the row comes
+        back from the upsert itself; MySQL needs a second SELECT.
+        """
+        new_balance = validate_balance(new_balance)
+        dialect = self.uow.dialect
+        sql = self.UPSERT_BALANCE_SQL[dialect]
+        read_back = returning and dialect in self.RETURNING_DIALECTS
+        if read_back:
+            sql = Query(sql.name, f"{sql.rstrip()} RETURNING {BANKROLL_COLUMNS}")
+
+        with self.uow.cursor() as c:
+            c.execute(
+                sql,
+                (
+                    user_id,
+                    new_balance,
+                    default_amount,
+                    max(default_amount, new_balance),
+                    min(default_amount, new_balance),
+                ),
+            )
+            if read_back:
+                return c.fetchone()
+
+        if not returning:
+            return {"user_id": user_id, "current_balance": new_balance}
+        return self.get(user_id)
+
+    def queue_balance(self, user_id, new_balance, default_amount=DEFAULT_BANKROLL):
+        """
+        Like ``set_balance(returning=False)``, but the upsert waits for the commit.
+
+        Consecutive queued balances are sent as one batch; each row still goes
+        through the upsert, so peak and lowest see every balance.
+        """
+        new_balance = validate_balance(new_balance)
+        self.uow.defer(
+            self.UPSERT_BALANCE_SQL[self.uow.dialect],
+            (user_id, new_balance, default_amount, max(default_amount, new_balance), min(default_amount, new_balance)),
+        )
+        return {"user_id": user_id, "current_balance": new_balance}
+
+
+def validate_balance(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid bankroll amount.")
+
+    if value != value or value in (float("inf"), float("-inf")):
+        raise ValueError("Invalid bankroll amount.")
+
+    if value < 0:
+        raise ValueError("Bankroll cannot be negative.")
+
+    return value
+
+
+class LookupCache:
+    """
+    In-process name -> id map for a small, rarely changing lookup table.
+
+    The whole table is read with one query on first use. A name that is not
+    found triggers a reload, at most once per ``reload_interval`` seconds, so
+    rows added later are picked up without a query per miss.
+    """
+
+    def __init__(self, table, name_column, reload_interval=60.0, clock=time.monotonic):
+        self.sql = Query(f"{table}.all", f"SELECT id, {name_column} AS name FROM {table}")
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self._ids = None
+        self._loaded_at = 0.0
+
+    def get(self, uow, name):
+        """Return the id for ``name``, or None if the table has no such row."""
+        ids = self._ids
+        if ids is None or (name not in ids and self._clock() - self._loaded_at >= self.reload_interval):
+            ids = self._load(uow)
+        return ids.get(name)
+
+    def clear(self):
+        self._ids = None
+
+    def _load(self, uow):
+        with uow.cursor() as c:
+            c.execute(self.sql)
+            ids = {row["name"]: row["id"] for row in c.fetchall()}
+        self._ids, self._loaded_at = ids, self._clock()
+        return ids
+
+
+class UserCache:
+    """
+    In-process LRU of the user rows that authentication resolves, keyed by email.
+
+    Entries expire after ``ttl`` seconds, which bounds how long another
+    worker's change (say a deactivation) can go unseen here; changes made
+    through this process go through UserRepository, which invalidates the
+    entry when they commit. Only found users are cached.
+    """
+
+    def __init__(self, max_size=10000, ttl=30.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, uow, email):
+        """Return a copy of the user row for ``email`` (querying on a miss), or None."""
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(email)
+                if entry is not None and entry[1] > self._clock():
+                    self._entries.move_to_end(email)
+                    self._stats["hits"] += 1
+                    return dict(entry[0])
+                self._stats["misses"] += 1
+
+        with uow.cursor() as c:
+            c.execute(USER_ACTIVE_BY_EMAIL, (email,))
+            user = c.fetchone()
+
+        if user and self.ttl > 0:
+            with self._lock:
+                self._entries[email] = (dict(user), self._clock() + self.ttl)
+                self._entries.move_to_end(email)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return user
+
+    def invalidate(self, email):
+        with self._lock:
+            if self._entries.pop(email, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+AUTH_USERS = UserCache(
+    max_size=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+
+
+class UserRepository:
+    """
+    Every write to ``users``. Each one drops the user from AUTH_USERS when the
+    unit of work commits, so no write path can leave a stale row cached.
+    """
+
+    def __init__(self, uow, cache=AUTH_USERS):
+        self.uow = uow
+        self.cache = cache
+
+    def create(self, email, password_hash, username, display_name):
+        """Insert a user (both password columns get the hash) and return its id."""
+        with self.uow.cursor() as c:
+            c.execute(INSERT_USER, (email, password_hash, username, display_name, password_hash))
+            user_id = c.lastrowid
+        self._invalidate_on_commit(email)
+        return user_id
+
+    def set_mfa_secret(self, email, secret):
+        self._write(email, SET_MFA_SECRET, (secret, email))
+
+    def set_password(self, user, password_hash, defer=False):
+        """Store ``password_hash`` in both password columns (see migration 6)."""
+        self._write(user["email"], SET_USER_PASSWORD, (password_hash, password_hash, user["id"]), defer)
+
+    def backfill_username(self, user, username, display_name):
+        self._write(user["email"], BACKFILL_USERNAME, (username, display_name, user["id"]), defer=True)
+
+    def update_profile(self, user, assignments, values):
+        """Apply ``"column = %s"`` assignments with their ``values`` to the user's row."""
+        self._write(user["email"], update_profile(assignments), (*values, user["id"]))
+
+    def _write(self, email, sql, params, defer=False):
+        if defer:
+            self.uow.defer(sql, params)
+        else:
+            with self.uow.cursor() as c:
+                c.execute(sql, params)
+        self._invalidate_on_commit(email)
+
+    def _invalidate_on_commit(self, email):
+        cache = self.cache
+        self.uow.on_commit(lambda: cache.invalidate(email))
+
+BET_TYPE_IDS = LookupCache("bet_types", "type_name")
+SPORT_IDS = LookupCache("sports", "sport_name")
+
+# Parser bet types whose bet_types.type_name differs
+BET_TYPE_NAMES = {"Prop": "Prop Bet"}
+
+MAX_SLIP_LEGS = 25
+
+
+class BetSlipRepository:
+    """Writes a parsed bet slip to ``bets``, ``bet_legs`` and ``bet_slip_items``."""
+
+    INSERT_BET_SQL = Query("bets.insert", """
+        INSERT INTO bets (user_id, bankroll_id, total_stake, total_odds, potential_win)
+        VALUES (%s, %s, %s, %s, %s)
+    """)
+
+    LEG_COLUMNS = "(bet_id, sport_id, game_name, bet_type_id, selection, odds, odds_format)"
+    LEG_VALUES = "(%s, %s, %s, %s, %s, %s, 'american')"
+
+    LEG_IDS_SQL = Query("bet_legs.ids_by_bet", "SELECT id FROM bet_legs WHERE bet_id = %s ORDER BY id")
+
+    INSERT_SLIP_ITEM_SQL = Query("bet_slip_items.insert", """
+        INSERT INTO bet_slip_items (bet_id, bet_leg_id, leg_order, stake)
+        VALUES (%s, %s, %s, %s)
+    """)
+
+    def __init__(self, uow):
+        self.uow = uow
+
+    def save_slip(self, user_id, bankroll_id, slip, stake):
+        """
+        Persist a ``parse_bet_text`` result as one bet with its legs.
+
+        Costs four statements whatever the number of legs (plus one query
+        whenever a lookup cache loads); the caller's unit of work commits them
+        together. Returns the saved bet's id, odds and potential win. Raises
+        ValueError for an empty slip, a bad stake or an unknown bet type.
+        """
+        legs = slip.get("legs") or []
+        if not legs:
+            raise ValueError("Bet slip has no legs.")
+        if len(legs) > MAX_SLIP_LEGS:
+            raise ValueError(f"Bet slip cannot have more than {MAX_SLIP_LEGS} legs.")
+
+        stake = validate_balance(stake)
+        if stake <= 0:
+            raise ValueError("Stake must be greater than zero.")
+
+        leg_rows = [self._leg_row(leg) for leg in legs]
+        total_odds = slip.get("totalOdds", legs[0]["odds"])
+        potential_win = round(calculate_payout(stake, total_odds), 2)
+
+        with self.uow.cursor() as c:
+            c.execute(self.INSERT_BET_SQL, (user_id, bankroll_id, stake, total_odds, potential_win))
+            bet_id = c.lastrowid
+
+            # One multi-row INSERT for every leg, then read their ids back:
+            # they rise in VALUES order but need not be consecutive (MySQL
+            # steps them by auto_increment_increment, e.g. under Galera).
+            c.execute(
+                Query(
+                    "bet_legs.insert_many",
+                    f"INSERT INTO bet_legs {self.LEG_COLUMNS} VALUES " + ", ".join([self.LEG_VALUES] * len(leg_rows)),
+                ),
+                [value for row in leg_rows for value in (bet_id, *row)],
+            )
+            c.execute(self.LEG_IDS_SQL, (bet_id,))
+            leg_ids = [row["id"] for row in c.fetchall()]
+
+            c.executemany(
+                self.INSERT_SLIP_ITEM_SQL,
+                [(bet_id, leg_id, order, None) for order, leg_id in enumerate(leg_ids, 1)],
+            )
+
+        return {
+            "bet_id": bet_id,
+            "leg_ids": leg_ids,
+            "total_stake": stake,
+            "total_odds": total_odds,
+            "potential_win": potential_win,
+        }
+
+    def _leg_row(self, leg):
+        bet_type = BET_TYPE_NAMES.get(leg.get("betType"), leg.get("betType"))
+        bet_type_id = BET_TYPE_IDS.get(self.uow, bet_type)
+        if bet_type_id is None:
+            raise ValueError(f"Unknown bet type: {leg.get('betType')}")
+
+        sport = leg.get("sport")
+        sport_id = SPORT_IDS.get(self.uow, sport) if sport and sport != "Unknown" else None
+        return (sport_id, leg.get("game"), bet_type_id, leg.get("selection", "")[:255], leg.get("odds"))
+
+
+REFRESH_TOKEN_DAYS = float(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+
+
+class RefreshTokenRepository:
+    """
+    Long-lived refresh tokens that are rotated on every use.
+
+    Only a SHA-256 digest of each token is stored. Every refresh marks the
+    presented token used and issues its successor in the same family; if a
+    used or revoked token is ever presented again it has leaked, so the whole
+    family is revoked and its holder has to sign in again.
+    """
+
+    SELECT_SQL = Query("refresh_tokens.by_hash", """
+        SELECT rt.id, rt.user_id, rt.family_id, rt.expires_at, rt.used_at, rt.revoked_at,
+               u.email, u.is_active
+        FROM refresh_tokens rt
+        JOIN users u ON u.id = rt.user_id
+        WHERE rt.token_hash = %s
+    """)
+
+    INSERT_SQL = Query("refresh_tokens.insert", """
+        INSERT INTO refresh_tokens (user_id, family_id, token_hash, expires_at)
+        VALUES (%s, %s, %s, %s)
+    """)
+
+    # The IS NULL guards make a concurrent second use of one token lose the race.
+    MARK_USED_SQL = Query(
+        "refresh_tokens.mark_used",
+        "UPDATE refresh_tokens SET used_at = %s WHERE id = %s AND used_at IS NULL AND revoked_at IS NULL",
+    )
+
+    REVOKE_FAMILY_SQL = Query(
+        "refresh_tokens.revoke_family",
+        "UPDATE refresh_tokens SET revoked_at = %s WHERE family_id = %s AND revoked_at IS NULL",
+    )
+
+    def __init__(self, uow, lifetime_days=REFRESH_TOKEN_DAYS, clock=datetime.utcnow):
+        self.uow = uow
+        self.lifetime = timedelta(days=lifetime_days)
+        self._clock = clock
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def issue(self, user_id, family_id=None):
+        """Create a refresh token for ``user_id`` (a new family unless given) and return it."""
+        token = secrets.token_urlsafe(32)
+        with self.uow.cursor() as c:
+            c.execute(
+                self.INSERT_SQL,
+                (user_id, family_id or secrets.token_hex(16), self.digest(token), self._clock() + self.lifetime),
+            )
+        return token
+
+    def rotate(self, token):
+        """
+        Exchange ``token`` for its successor.
+
+        Returns {"user_id", "email", "token"}, or None when the token is
+        unknown, expired, revoked, reused or belongs to an inactive user.
+        A valid rotation costs one indexed lookup and two writes.
+        """
+        if not token:
+            return None
+
+        with self.uow.cursor() as c:
+            c.execute(self.SELECT_SQL, (self.digest(token),))
+            row = c.fetchone()
+            if not row or row["revoked_at"] is not None:
+                return None
+
+            now = self._clock()
+            if row["used_at"] is not None:
+                self._revoke_family(c, row, now)
+                return None
+            if row["expires_at"] <= now or not row.get("is_active", True):
+                return None
+
+            c.execute(self.MARK_USED_SQL, (now, row["id"]))
+            if c.rowcount != 1:
+                self._revoke_family(c, row, now)
+                return None
+
+        return {
+            "user_id": row["user_id"],
+            "email": row["email"],
+            "token": self.issue(row["user_id"], row["family_id"]),
+        }
+
+    def revoke(self, token):
+        """Revoke the family of ``token`` (on logout); unknown tokens are ignored."""
+        if not token:
+            return
+        with self.uow.cursor() as c:
+            c.execute(self.SELECT_SQL, (self.digest(token),))
+            row = c.fetchone()
+            if row:
+                c.execute(self.REVOKE_FAMILY_SQL, (self._clock(), row["family_id"]))
+
+    def _revoke_family(self, cursor, row, now):
+        print(f"SECURITY: refresh token reuse for user {row['user_id']}; revoking its sessions")
+        cursor.execute(self.REVOKE_FAMILY_SQL, (now, row["family_id"]))
@@ -0,0 +1,184 @@
+"""
+Revocation of access tokens before their ``exp``.
+
+Revoked token ids (the ``jti`` claim) are stored in ``revoked_tokens``. Each
+worker keeps a Bloom filter of the unexpired ones, so checking a token costs
+a few hashes. Only ids the filter reports as possibly revoked are confirmed
+with a query. ``start()`` loads the filter before the worker serves requests
+and then rebuilds it on a background thread every ``reload_interval``
+seconds; a revocation made by another worker is enforced here from the next
+rebuild. Until a load has succeeded every token is confirmed with a query.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from datetime import datetime
+
+from db import pooled_connection
+from queries import Query
+
+TOKEN_REVOCATION_RELOAD = float(os.getenv("TOKEN_REVOCATION_RELOAD", "10"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for ``capacity`` items at ``error_rate``."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Per-worker view of ``revoked_tokens``: a Bloom filter plus a confirming lookup."""
+
+    LOAD_SQL = Query("revoked_tokens.unexpired", "SELECT jti FROM revoked_tokens WHERE expires_at > %s")
+
+    CHECK_SQL = Query("revoked_tokens.by_jti", "SELECT jti FROM revoked_tokens WHERE jti = %s")
+
+    INSERT_SQL = {
+        "mysql": Query(
+            "revoked_tokens.insert",
+            "INSERT IGNORE INTO revoked_tokens (jti, expires_at) VALUES (%s, %s)",
+        ),
+        "sqlite": Query(
+            "revoked_tokens.insert",
+            "INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (%s, %s)",
+        ),
+    }
+
+    def __init__(self, reload_interval=TOKEN_REVOCATION_RELOAD, connect=pooled_connection, now=datetime.utcnow):
+        self.reload_interval = reload_interval
+        self._connect = connect
+        self._now = now
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._filter = BloomFilter(1024)
+        self._loaded = False
+        # jtis revoked here while a reload's query runs, added to its new filter
+        self._revoked_during_reload = None
+        self._reloader = None
+        self._stop = threading.Event()
+        self._stats = {"checks": 0, "filter_hits": 0, "unloaded_checks": 0, "confirmed": 0,
+                       "reloads": 0, "reload_failures": 0}
+
+    def start(self):
+        """Load the filter now, then keep rebuilding it on a background thread."""
+        with self._lock:
+            if self._reloader is not None:
+                return
+            self._stop = threading.Event()
+            self._reloader = threading.Thread(target=self._run, args=(self._stop,),
+                                              name="token-revocation-reload", daemon=True)
+        self._try_reload()
+        if self.reload_interval > 0:
+            self._reloader.start()
+
+    def maybe_revoked(self, jti):
+        """
+        Return False if ``jti`` is certainly not revoked (no query); tokens
+        without a jti never are. Before the filter has loaded every token
+        might be, so the caller confirms each one.
+        """
+        if not jti:
+            return False
+        self._stats["checks"] += 1
+        if not self._loaded:
+            self._stats["unloaded_checks"] += 1
+            return True
+        if jti not in self._filter:
+            return False
+        self._stats["filter_hits"] += 1
+        return True
+
+    def confirm_revoked(self, uow, jti):
+        """Return True if ``revoked_tokens`` has ``jti``; call only after maybe_revoked()."""
+        with uow.cursor() as c:
+            c.execute(self.CHECK_SQL, (jti,))
+            revoked = c.fetchone() is not None
+        if revoked:
+            self._stats["confirmed"] += 1
+        return revoked
+
+    def revoke(self, uow, jti, expires_at):
+        """Record ``jti`` as revoked until ``expires_at`` (a UTC datetime or epoch seconds)."""
+        if not jti:
+            return
+        if not isinstance(expires_at, datetime):
+            expires_at = datetime.utcfromtimestamp(expires_at)
+        with uow.cursor() as c:
+            c.execute(self.INSERT_SQL[uow.dialect], (jti, expires_at))
+        uow.on_commit(lambda: self._add(jti))
+
+    def reload(self):
+        """Rebuild the filter from the unexpired rows of ``revoked_tokens``."""
+        with self._reload_lock:
+            with self._lock:
+                self._revoked_during_reload = []
+            try:
+                with self._connect() as conn, conn.cursor() as c:
+                    c.execute(self.LOAD_SQL, (self._now(),))
+                    jtis = [row["jti"] for row in c.fetchall()]
+
+                bloom = BloomFilter(max(1024, len(jtis) * 2))
+                for jti in jtis:
+                    bloom.add(jti)
+                with self._lock:
+                    # Revocations committed after the query read its rows
+                    for jti in self._revoked_during_reload:
+                        bloom.add(jti)
+                    self._filter = bloom
+                    self._loaded = True
+            finally:
+                with self._lock:
+                    self._revoked_during_reload = None
+        self._stats["reloads"] += 1
+
+    def clear(self):
+        """Stop the background reloads and forget the filter."""
+        self._stop.set()
+        with self._lock:
+            self._reloader = None
+            self._filter = BloomFilter(1024)
+            self._loaded = False
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["filter_bits"] = self._filter.size
+        return stats
+
+    def _add(self, jti):
+        with self._lock:
+            self._filter.add(jti)
+            if self._revoked_during_reload is not None:
+                self._revoked_during_reload.append(jti)
+
+    def _try_reload(self):
+        try:
+            self.reload()
+        except Exception as exc:
+            # Keep the last filter (or keep confirming every token) and try again
+            self._stats["reload_failures"] += 1
+            print(f"WARNING: could not reload token revocations: {exc}")
+
+    def _run(self, stop):
+        while not stop.wait(self.reload_interval):
+            self._try_reload()
+
+REVOKED_TOKENS = RevocationList()
@@ -0,0 +1,107 @@
+"""
+Tests for the per-route auth declarations resolved before each request.
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from metrics import QUERY_LATENCY
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class TestAuthPolicies(unittest.TestCase):
+    """Tests for public, token-only, user-required and user-optional routes."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+
+        resp = self.client.post("/register", json={"email": "auth@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        self.token = main.create_access_token({"email": "auth@example.com"})
+        QUERY_LATENCY.reset()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        QUERY_LATENCY.reset()
+
+    def test_token_only_route_skips_database(self):
+        """Test /validate checks the token without sending any query."""
+        self.client.set_cookie("token", self.token)
+        resp = self.client.get("/validate")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("X-DB-Round-Trips", resp.headers)
+        self.assertEqual(QUERY_LATENCY.snapshot(), {})
+
+    def test_missing_token(self):
+        """Test protected routes answer without a token as they always have."""
+        resp = self.client.get("/validate")
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (400, "No token provided."))
+        resp = self.client.get("/bankroll")
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (401, "No token provided."))
+        resp = self.client.get("/profile")
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(resp.get_json(), {"error": "Unauthorized"})
+
+    def test_invalid_token_is_cleared(self):
+        """Test a forged token is rejected and its cookie removed."""
+        self.client.set_cookie("token", "not-a-jwt")
+        resp = self.client.get("/bankroll")
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (401, "Unauthorized."))
+        self.assertIn("token=;", resp.headers.get("Set-Cookie", ""))
+        self.client.set_cookie("token", "not-a-jwt")
+        resp = self.client.get("/validate")
+        self.assertEqual((resp.status_code, resp.get_data(as_text=True)), (401, "Unauthorized."))
+
+    def test_temporary_token_is_not_access(self):
+        """Test an MFA-pending token does not grant access."""
+        self.client.set_cookie("token", self.main.create_temp_token({"email": "auth@example.com"}))
+        self.assertEqual(self.client.get("/profile").status_code, 401)
+
+    def test_user_resolved_once(self):
+        """Test a user-required request looks the user up once."""
+        self.client.set_cookie("token", self.token)
+        resp = self.client.put("/bankroll", json={"current_balance": 100})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(QUERY_LATENCY.snapshot()["users.active_by_email"]["count"], 1)
+
+    def test_inactive_user_rejected(self):
+        """Test a deactivated account cannot use a still-valid token."""
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("UPDATE users SET is_active = FALSE WHERE email = %s", ("auth@example.com",))
+            conn.commit()
+        self.client.set_cookie("token", self.token)
+        self.assertEqual(self.client.get("/bankroll").status_code, 401)
+
+    def test_optional_user_route(self):
+        """Test /chat serves anonymous callers and recognises signed-in ones."""
+        resp = self.client.post("/chat", json={"message": "set bankroll to 300"})
+        self.assertEqual(resp.status_code, 401)
+
+        self.client.set_cookie("token", self.token)
+        resp = self.client.post("/chat", json={"message": "set bankroll to 300"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get("/bankroll").get_json()["current_balance"], 300.0)
+
+    def test_public_route(self):
+        """Test public routes need no token."""
+        self.assertEqual(self.client.post("/parse-bet", json={}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
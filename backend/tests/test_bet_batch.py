@@ -0,0 +1,158 @@
+"""
+Tests for parsing bet slips in bulk.
+"""
+
+import unittest
+import sys
+import os
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bet_batch
+import db
+from app import sports_data
+from bet_batch import BetBatchParser, parse_slip
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+from tests.test_bet_tokens import normalized
+
+SLIPS = [
+    "Lakers -5.5 -110",
+    "",
+    "Chiefs ML +120\nBills -3 -105",
+    "Yankees vs Red Sox over 8.5 (-115)",
+    "Celtics -2, Heat +4, Bucks ML -150",
+    "Over 220.5 @ -110",
+    "Giants ML -120\nDodgers -1.5 +140",
+]
+
+
+class TestBetBatchParser(unittest.TestCase):
+    """Tests for BetBatchParser."""
+
+    def setUp(self):
+        patcher = mock.patch.object(sports_data, "get_all_teams", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.parser = BetBatchParser(workers=1)
+
+    def tearDown(self):
+        self.parser.shutdown()
+
+    def test_results_in_order(self):
+        """Test each slip gets /parse-bet's result or an error, in the order given."""
+        results = self.parser.parse(SLIPS + [None], bankroll=2000)
+        self.assertEqual([r["status"] for r in results], [200, 400, 200, 200, 200, 200, 200, 400])
+        for slip, result in zip(SLIPS, results):
+            if slip:
+                self.assertEqual(result["result"], parse_slip(slip, 2000))
+        self.assertEqual(results[1]["error"], "No bet text provided")
+
+    def test_stake_uses_each_bankroll(self):
+        """Test a slip with its own bankroll gets its stake sized against it."""
+        results = self.parser.parse([("Lakers -5.5 -110", 500), "Lakers -5.5 -110"], bankroll=5000)
+        small, large = (r["result"]["stakeRecommendation"]["recommended"] for r in results)
+        self.assertAlmostEqual(small * 10, large, places=1)
+
+    def test_parse_failure_is_per_slip(self):
+        """Test a slip that raises gets a 500 and the others still parse."""
+        real = bet_batch.parse_bet_text
+
+        def parse(text):
+            if "boom" in text:
+                raise RuntimeError("boom")
+            return real(text)
+
+        with mock.patch.object(bet_batch, "parse_bet_text", side_effect=parse):
+            results = self.parser.parse(["Lakers -5.5", "boom", "Heat ML"])
+        self.assertEqual([r["status"] for r in results], [200, 500, 200])
+        self.assertEqual(self.parser.stats()["errors"], 1)
+
+    def test_broken_pool_falls_back(self):
+        """Test a dead worker pool finishes the batch in process and is replaced next time."""
+        parser = BetBatchParser(workers=2, chunk_size=2, min_parallel=0)
+        broken = mock.Mock()
+        broken.map.side_effect = BrokenProcessPool("worker died")
+        parser._executor = broken
+        results = parser.parse(SLIPS)
+        self.assertEqual(len(results), len(SLIPS))
+        self.assertEqual(parser.stats()["pool_restarts"], 1)
+        self.assertFalse(parser.stats()["started"])
+
+    def test_process_pool_matches_serial(self):
+        """Test slips parsed by worker processes come back as the serial loop parses them."""
+        parser = BetBatchParser(workers=2, chunk_size=2, min_parallel=0)
+        self.addCleanup(parser.shutdown)
+        # Workers run without the patched team lookup, so compare without live data
+        pooled = parser.parse(SLIPS)
+        serial = self.parser.parse(SLIPS)
+        self.assertEqual(parser.stats()["pooled_batches"], 1)
+        self.assertEqual([r["status"] for r in pooled], [r["status"] for r in serial])
+        for a, b in zip(pooled, serial):
+            if a["status"] == 200:
+                a, b = normalized(a["result"]), normalized(b["result"])
+                a.pop("liveData"), b.pop("liveData")
+                self.assertEqual(a, b)
+
+
+class TestParseBetBatchEndpoint(unittest.TestCase):
+    """Tests for /parse-bet/batch."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+        patcher = mock.patch.object(sports_data, "get_all_teams", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+
+    def login(self):
+        self.client.set_cookie("token", self.main.create_access_token({"email": "batch@example.com"}))
+
+    def test_results_in_order(self):
+        """Test each slip gets its own result, in the order sent."""
+        self.login()
+        resp = self.client.post("/parse-bet/batch", json={
+            "slips": ["Lakers -5.5 -110", {"betText": "Heat ML +150", "bankroll": 100}, "", 7],
+            "bankroll": 5000,
+        })
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertEqual([r["status"] for r in body["results"]], [200, 200, 400, 400])
+        self.assertEqual((body["parsed"], body["failed"]), (2, 2))
+        self.assertEqual(body["results"][0]["result"]["stakeRecommendation"],
+                         parse_slip("Lakers -5.5 -110", 5000)["stakeRecommendation"])
+        self.assertEqual(body["results"][1]["result"]["stakeRecommendation"],
+                         parse_slip("Heat ML +150", 100)["stakeRecommendation"])
+
+    def test_bad_requests(self):
+        """Test missing tokens, malformed and oversized batches are refused."""
+        self.assertEqual(self.client.post("/parse-bet/batch", json={"slips": []}).status_code, 401)
+        self.login()
+        self.assertEqual(self.client.post("/parse-bet/batch", json={"slips": "Lakers"}).status_code, 400)
+        with mock.patch.object(self.main, "MAX_BET_BATCH", 2):
+            resp = self.client.post("/parse-bet/batch", json={"slips": ["a", "b", "c"]})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_single_endpoint_unchanged(self):
+        """Test /parse-bet still answers with the parse and its stake recommendation."""
+        resp = self.client.post("/parse-bet", json={"betText": "Lakers -5.5 -110", "bankroll": 5000})
+        self.assertEqual(resp.get_json(), parse_slip("Lakers -5.5 -110", 5000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,329 @@
+"""
+Tests for the bet slip tokenizer and the detectors built on it.
+"""
+
+import unittest
+import sys
+import os
+import json
+import random
+import re
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import sports_data
+from app.bet_parser import (
+    SPORTS_KEYWORDS,
+    detect_bet_type,
+    detect_sport,
+    extract_odds,
+    extract_teams_and_games,
+    parse_american_odds,
+    parse_bet_text,
+)
+from app.bet_tokens import KeywordIndex, as_leg, split_legs, tokenize
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bet_parser_golden.json")
+
+MATCHUP = r'(\w+(?:\s+\w+)?)\s+(?:vs\.?|v\.?|@|at)\s+(\w+(?:\s+\w+)?)'
+
+
+# The regex detectors parse_bet_text used before the tokenizer, kept as the reference
+
+def legacy_detect_sport(text):
+    text_lower = text.lower()
+    for sport, keywords in SPORTS_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                return sport
+    return 'Unknown'
+
+
+def legacy_detect_bet_type(text):
+    text_lower = text.lower()
+    if re.search(r'[+-]\d+\.?\d*', text) and not re.search(r'@\s*[+-]', text):
+        return 'Spread'
+    if re.search(r'(?:over|under|o|u)\s*\d+', text_lower):
+        return 'Total'
+    if re.search(r'\b(?:ml|moneyline|money\s*line|to\s*win)\b', text_lower):
+        return 'Moneyline'
+    if re.search(r'(?:prop|anytime|first|last|scorer|yards|rebounds|assists)', text_lower):
+        return 'Prop'
+    return 'Moneyline'
+
+
+def legacy_extract_odds(text):
+    odds_list = []
+    patterns = [
+        r'@\s*([+-]\d{2,4})',
+        r'\(\s*([+-]\d{2,4})\s*\)',
+        r'(?:odds?:?\s*)([+-]\d{2,4})',
+        r'(?:^|[\s,;])([+-]\d{3,4})(?:$|[\s,;])',
+        r'(?:ML|ml|moneyline)\s*([+-]\d{3,4})',
+    ]
+    for pattern in patterns:
+        for match in re.findall(pattern, text):
+            odds = parse_american_odds(match)
+            if odds is not None and odds not in odds_list:
+                odds_list.append(odds)
+    return odds_list
+
+
+def legacy_extract_teams_and_games(text):
+    games = []
+    for match in re.finditer(MATCHUP, text, re.IGNORECASE):
+        games.append({'team_a': match.group(1), 'team_b': match.group(2),
+                      'game': f"{match.group(1)} vs {match.group(2)}"})
+    for match in re.finditer(r'(\w+)\s+(?:over|under)', text, re.IGNORECASE):
+        games.append({'team_a': match.group(1), 'team_b': 'Unknown', 'game': match.group(1)})
+    return games
+
+
+def legacy_selection(line):
+    selection = re.sub(r'@?\s*[+-]\d{2,4}', '', line).strip()
+    return re.sub(r'\(\s*[+-]\d{2,4}\s*\)', '', selection).strip()
+
+
+def legacy_split(bet_text):
+    lines = [line.strip() for line in bet_text.split('\n') if line.strip()]
+    if len(lines) == 1:
+        parts = re.split(r'[,;]', lines[0])
+        if len(parts) > 1:
+            lines = [p.strip() for p in parts if p.strip()]
+    return lines
+
+
+def legacy_parse_legs(bet_text):
+    """The legs parse_bet_text built before the tokenizer."""
+    legs = []
+    for leg_id, line in enumerate(legacy_split(bet_text), 1):
+        odds_found = legacy_extract_odds(line)
+        games = legacy_extract_teams_and_games(line)
+        legs.append({
+            'id': f'leg-{leg_id}',
+            'sport': legacy_detect_sport(line),
+            'game': games[0]['game'] if games else 'Unknown Game',
+            'betType': legacy_detect_bet_type(line),
+            'selection': legacy_selection(line)[:100],
+            'odds': odds_found[0] if odds_found else -110,
+        })
+    if not legs and bet_text.strip():
+        odds_found = legacy_extract_odds(bet_text)
+        legs.append({
+            'id': 'leg-1',
+            'sport': legacy_detect_sport(bet_text),
+            'game': 'Unknown Game',
+            'betType': legacy_detect_bet_type(bet_text),
+            'selection': bet_text[:100],
+            'odds': odds_found[0] if odds_found else -110,
+        })
+    return legs
+
+
+def legacy_team_lookup(bet_text):
+    """The teams and spread get_enhanced_bet_analysis read from each leg before the tokenizer."""
+    lookups = []
+    lines = legacy_split(bet_text)
+    for line in lines if len(lines) > 1 else [bet_text]:
+        line_lower = line.lower()
+        teams = None
+        match = re.search(MATCHUP, line_lower)
+        if match:
+            team1, team2 = sports_data.find_team(match.group(1)), sports_data.find_team(match.group(2))
+            if team1 and team2:
+                teams = (match.group(1), match.group(2))
+        if teams is None:
+            found = [alias for alias in sports_data.TEAM_ALIASES if alias in line_lower]
+            teams = (found + [None, None])[:2]
+        spread = re.search(r'([+-]?\d+\.?\d*)', line)
+        lookups.append((tuple(teams), float(spread.group(1)) if spread else 0))
+    return lookups
+
+
+def team_lookup(bet_text):
+    legs = split_legs(bet_text)
+    return [(sports_data.extract_teams_from_bet(leg), sports_data._first_number(leg))
+            for leg in (legs if len(legs) > 1 else [legs[0] if legs else as_leg(bet_text)])]
+
+
+FRAGMENTS = {
+    "team": ["Lakers", "Boston Celtics", "Miami Heat", "Trail Blazers", "76ers", "49ers", "Vikings",
+             "Wolves", "Red Sox", "Man City", "Texas", "Las Vegas", "Maple Leafs", "inter", "LeBron James",
+             "Golden Knights", "Dodgers", "Serie A", "Ligue 1", "Chiefs", "nothing", "x_y"],
+    "versus": ["vs", "vs.", "v", "v.", "@", "at", "VS", "-", "/"],
+    "line": ["-5.5", "+3", "+10.5", "-1", "pk", "-7.", "+0.5", "1st half", "o221.5", "Over 48.5",
+             "u 5.5", "under 8", "total 7.5", "30+ points", "8+ rebounds", "anytime scorer", "first half"],
+    "kind": ["ML", "ml", "moneyline", "money line", "to win", "TO WIN", "towin", "prop", "draw", ""],
+    "odds": ["-110", "(+150)", "( -120 )", "@ +120", "@-105", "odds: +200", "Odds +300", "odds+250",
+             "+15000", "ML -130", "moneyline+145", "-110 -115", "+100,", "(+1500)", "-11000", ""],
+}
+
+
+def random_leg(rng):
+    parts = [rng.choice(FRAGMENTS["team"])]
+    if rng.random() < 0.4:
+        parts += [rng.choice(FRAGMENTS["versus"]), rng.choice(FRAGMENTS["team"])]
+    for kind in ("line", "kind", "odds"):
+        if rng.random() < 0.6:
+            parts.append(rng.choice(FRAGMENTS[kind]))
+    if rng.random() < 0.2:
+        rng.shuffle(parts)
+    return rng.choice([" ", " ", "  ", "\t"]).join(parts)
+
+
+def random_slip(rng, legs):
+    separator = rng.choice(["\n", "\n", ", ", "; ", "\n\n", "\r\n"])
+    return separator.join(random_leg(rng) for _ in range(legs))
+
+
+def normalized(result):
+    """``result`` with the parts built from a set (and so in no fixed order) sorted."""
+    result = json.loads(json.dumps(result))
+    stats = result.get('stats')
+    if stats:
+        stats['sportInsight'] = re.sub(
+            r'\((.*)\)', lambda m: '(' + ', '.join(sorted(m.group(1).split(', '))) + ')', stats['sportInsight'])
+    live = result.get('liveData')
+    if live and live.get('teams'):
+        live['teams'] = sorted(live['teams'])
+    return result
+
+
+def without_sport(legs):
+    return [{key: value for key, value in leg.items() if key != 'sport'} for leg in legs]
+
+
+class OfflineTestCase(unittest.TestCase):
+    def setUp(self):
+        # find_team would otherwise try the network for every matchup
+        patcher = mock.patch.object(sports_data, "get_all_teams", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestTokenize(unittest.TestCase):
+    """Tests for the lexer."""
+
+    def test_token_kinds(self):
+        """Test each kind of token is recognised, with its position."""
+        tokens = tokenize("Lakers -5.5 (@+150),o221\n")
+        self.assertEqual([(t.kind, t.text) for t in tokens], [
+            ("word", "Lakers"), ("space", " "), ("signed", "-5"), ("punct", "."), ("number", "5"),
+            ("space", " "), ("punct", "("), ("punct", "@"), ("signed", "+150"), ("punct", ")"),
+            ("sep", ","), ("word", "o"), ("number", "221"), ("newline", "\n"),
+        ])
+        self.assertEqual((tokens[2].start, tokens[2].end), (7, 9))
+        self.assertEqual(len(tokenize("")), 0)
+
+    def test_tokens_cover_the_text(self):
+        """Test the tokens join back into the original text."""
+        text = "Jazz v. Hornets_2 -2 ml -125; Über +3 ½"
+        self.assertEqual("".join(t.text for t in tokenize(text)), text)
+
+    def test_split_legs(self):
+        """Test legs are split per line, or per comma on a single line."""
+        self.assertEqual([leg.text for leg in split_legs("  A -1, B +2 ; C  ")], ["A -1", "B +2", "C"])
+        self.assertEqual([leg.text for leg in split_legs("A, B\n\n  C\n")], ["A, B", "C"])
+        self.assertEqual(split_legs(" , ; "), [])
+
+    def test_word_runs(self):
+        """Test runs of word characters join words, digits and underscores but not signs."""
+        leg = as_leg("a_1b -5c d.e")
+        self.assertEqual([leg.source[s:e] for s, e in leg.runs], ["a_1b", "5c", "d", "e"])
+
+    def test_matchups(self):
+        """Test matchups are found the way the regex found them."""
+        self.assertEqual(as_leg("LA Lakers vs. Boston Celtics -3").matchups(),
+                         [("LA Lakers", "Boston Celtics")])
+        self.assertEqual(as_leg("Take the Heat @ Bulls 5.5").matchups(), [("the Heat", "Bulls 5")])
+        self.assertEqual(as_leg("Heat @Bulls").matchups(), [])
+
+    def test_keyword_index(self):
+        """Test keywords are found as substrings, as ``in`` found them."""
+        index = KeywordIndex(["kings", "red sox", "76ers", "as"])
+        self.assertEqual(index.find(as_leg("Vikings or Red Sox")), {"kings", "red sox"})
+        self.assertEqual(index.find(as_leg("Texas +76ers")), {"as", "76ers"})
+        self.assertEqual(index.find(split_legs("red, sox")[0]), set())
+
+    def test_keyword_index_inside_tokens(self):
+        """Test a multi-word or numeric keyword starting inside a word or number is found."""
+        index = KeywordIndex(["red sox", "76ers", "ligue 1"])
+        self.assertEqual(index.find(as_leg("90 yardsRed Sox")), {"red sox"})
+        self.assertEqual(index.find(as_leg("-3.576ers")), {"76ers"})
+        self.assertEqual(index.find(as_leg("xLigue 1, 1276ers")), {"ligue 1", "76ers"})
+        self.assertEqual(index.find(as_leg("reds sox 76 ers")), set())
+
+    def test_keyword_index_random(self):
+        """Test random strings of keyword pieces find what ``in`` finds."""
+        keywords = ["red sox", "76ers", "ligue 1", "as", "kings", "st. louis", "49ers", "9 ers"]
+        index = KeywordIndex(keywords)
+        pieces = ["red", "sox", "Red Sox", "76", "576", "ers", "ligue", "1", "x", "as", "kings",
+                  "st.", "louis", "49", "-3.5", "+", " ", "  ", ".", ","]
+        rng = random.Random(2301)
+        for _ in range(3000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 8)))
+            with self.subTest(text=text):
+                self.assertEqual(index.find(as_leg(text)), {k for k in keywords if k in text.lower()})
+
+
+class TestDetectorParity(OfflineTestCase):
+    """Tests that the token-based detectors agree with the regexes they replaced."""
+
+    def assert_leg_parity(self, text):
+        leg = as_leg(text)
+        with self.subTest(text=text):
+            self.assertEqual(detect_bet_type(leg), legacy_detect_bet_type(text))
+            self.assertEqual(extract_odds(leg), legacy_extract_odds(text))
+            self.assertEqual(extract_teams_and_games(leg), legacy_extract_teams_and_games(text))
+
+    def test_string_arguments(self):
+        """Test the detectors still take plain strings."""
+        self.assertEqual(detect_sport("Lakers -5"), "NBA")
+        self.assertEqual(extract_odds("Lakers @ +150"), [150])
+
+    def test_random_legs(self):
+        """Test random legs built from real-world fragments."""
+        rng = random.Random(23)
+        for _ in range(3000):
+            self.assert_leg_parity(random_leg(rng))
+
+    def test_random_characters(self):
+        """Test strings of odds-like characters."""
+        rng = random.Random(230)
+        alphabet = ["+", "-", "1", "10", "150", "2500", "@", "(", ")", " ", "  ", ".", ",", ";", ":", "\n",
+                    "o", "u", "over", "ML", "ml", "odds", "vs", "at", "v", "_", "Lakers", "as", "money", "line"]
+        for _ in range(5000):
+            self.assert_leg_parity("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))))
+
+    def test_slips(self):
+        """Test whole slips of 1 to 50 legs give the same legs and spreads."""
+        # Sports and team names are matched as whole words now, so they are
+        # left out here and covered by test_sport_detection instead
+        rng = random.Random(2023)
+        for _ in range(300):
+            slip = random_slip(rng, rng.randint(1, 50))
+            with self.subTest(slip=slip):
+                self.assertEqual(without_sport(parse_bet_text(slip)['legs']), without_sport(legacy_parse_legs(slip)))
+                self.assertEqual([spread for _, spread in team_lookup(slip)],
+                                 [spread for _, spread in legacy_team_lookup(slip)])
+
+
+class TestGoldenOutput(OfflineTestCase):
+    """
+    Tests parse_bet_text against recorded outputs: those of the regex parser,
+    except where whole-word sport and team matching changed them.
+    """
+
+    def test_golden_slips(self):
+        """Test every recorded slip parses exactly as recorded."""
+        with open(GOLDEN_PATH) as f:
+            golden = json.load(f)
+        self.assertGreater(len(golden), 50)
+        for case in golden:
+            with self.subTest(slip=case["slip"]):
+                self.assertEqual(normalized(parse_bet_text(case["slip"])), case["result"])
+
+
+if __name__ == "__main__":
+    unittest.main()
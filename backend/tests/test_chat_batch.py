@@ -0,0 +1,134 @@
+"""
+Tests for answering several chat messages in one request.
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from chat_state import CHAT_STATE
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class TestChatBatchEndpoint(unittest.TestCase):
+    """Tests for /chat/batch."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        CHAT_STATE.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        CHAT_STATE.clear()
+
+    def login(self, email="batch@example.com"):
+        resp = self.client.post("/register", json={"email": email, "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        self.client.set_cookie("token", self.main.create_access_token({"email": email}))
+
+    def batch(self, messages):
+        return self.client.post("/chat/batch", json={"messages": messages})
+
+    def bankroll_row(self):
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("SELECT current_balance, peak_balance, lowest_balance FROM bankrolls")
+            return c.fetchone()
+
+    def test_results_in_order(self):
+        """Test each message gets its own result, in the order sent."""
+        resp = self.batch(["Implied probability for -110", "set bankroll to 100", "hi"])
+        self.assertEqual(resp.status_code, 200)
+        results = resp.get_json()["results"]
+        self.assertIn("52.38%", results[0]["response"])
+        self.assertEqual(results[1]["status"], 401)
+        self.assertIn("AI Financial Assistant", results[2]["response"])
+
+    def test_messages_share_one_bankroll(self):
+        """Test later messages see earlier updates and every balance reaches the table."""
+        self.login()
+        results = self.batch([
+            "set bankroll to 1000",
+            "recommend conservative stake",
+            "set bankroll to 3000",
+            "set bankroll to 2000",
+        ]).get_json()["results"]
+        self.assertIn("$10.00", results[1]["response"])
+        self.assertEqual([r["status"] for r in results], [200] * 4)
+
+        row = self.bankroll_row()
+        self.assertEqual(float(row["current_balance"]), 2000.0)
+        self.assertEqual(float(row["lowest_balance"]), 1000.0)
+
+    def test_writes_batched(self):
+        """Test several bankroll updates cost no more round trips than one."""
+        self.login()
+        self.batch(["set bankroll to 5"])
+        one = int(self.batch(["set bankroll to 10"]).headers["X-DB-Round-Trips"])
+        many = int(self.batch([f"set bankroll to {n}" for n in range(10, 30)]).headers["X-DB-Round-Trips"])
+        self.assertEqual(many, one)
+        self.assertEqual(float(self.bankroll_row()["current_balance"]), 29.0)
+
+    def test_state_flushed_once(self):
+        """Test budget changes are reported to the state store once per batch."""
+        self.login()
+        with mock.patch.object(CHAT_STATE, "mark_dirty") as mark_dirty:
+            results = self.batch(["add 10 to food", "add 5 to food", "set income to 4000"]).get_json()["results"]
+        self.assertEqual(results[1]["response"], "Added $5.00 to food. Total: $315.00.")
+        mark_dirty.assert_called_once()
+
+    def test_failed_batch_leaves_state_alone(self):
+        """Test a batch that fails midway changes neither the cached state nor the table."""
+        self.login()
+        with mock.patch.dict(self.main.CHAT_HANDLERS, {"payout": mock.Mock(side_effect=RuntimeError("boom"))}):
+            resp = self.batch(["set income to 4000", "add 10 to food", "payout for stake 10 at +100"])
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(CHAT_STATE.stats()["dirty"], 0)
+
+        results = self.batch(["show my budget"]).get_json()["results"]
+        self.assertIn("Income:</b> $3,000.00", results[0]["response"])
+        self.assertIn("Food: $300.00", results[0]["response"])
+
+    def test_batch_keeps_concurrent_changes(self):
+        """Test a batch applies only the fields it changed, keeping changes made meanwhile."""
+        self.login()
+        uow = db.UnitOfWork()
+        try:
+            live = CHAT_STATE.get(uow, 1)
+        finally:
+            uow.close()
+        handle_input = self.main.handle_input
+
+        def change_elsewhere(message, ctx):
+            # Another request of the same user, on this worker
+            live["savings"] = 123
+            return handle_input(message, ctx=ctx)
+
+        with mock.patch.object(self.main, "handle_input", side_effect=change_elsewhere):
+            self.assertEqual(self.batch(["add 10 to food"]).status_code, 200)
+        self.assertEqual((live["savings"], live["categories"]["food"]), (123, 310))
+
+    def test_bad_requests(self):
+        """Test malformed and oversized batches are refused."""
+        self.assertEqual(self.batch("hi").status_code, 400)
+        self.assertEqual(self.batch([1, 2]).status_code, 400)
+        self.assertEqual(self.batch(["hi"] * (self.main.MAX_CHAT_BATCH + 1)).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
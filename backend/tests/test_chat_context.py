@@ -0,0 +1,115 @@
+"""
+Tests for loading the chat context only when an intent needs it.
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from chat_state import CHAT_STATE
+from metrics import CHAT_QUERIES
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class TestChatContext(unittest.TestCase):
+    """Tests for ChatContext's lazy loading."""
+
+    def test_user_loaded_once_on_demand(self):
+        """Test the user is looked up only when needed, and only once."""
+        import main
+        load_user = mock.Mock(return_value=None)
+        ctx = main.ChatContext(load_user=load_user)
+        self.assertIn("AI Financial Assistant", main.handle_input("hi", ctx=ctx))
+        load_user.assert_not_called()
+
+        main.handle_input("what's up", ctx=ctx)
+        main.handle_input("show my budget", ctx=ctx)
+        load_user.assert_called_once()
+        self.assertIsNone(ctx.user_id)
+
+
+class TestLazyChatEndpoint(unittest.TestCase):
+    """Tests that /chat only queries for the intents that need data."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        CHAT_STATE.clear()
+        CHAT_QUERIES.reset()
+        self.client = main.app.test_client()
+        resp = self.client.post("/register", json={"email": "lazy@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        AUTH_USERS.clear()
+        self.client.set_cookie("token", main.create_access_token({"email": "lazy@example.com"}))
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        CHAT_STATE.clear()
+        CHAT_QUERIES.reset()
+
+    def chat(self, message):
+        resp = self.client.post("/chat", json={"message": message})
+        return resp, int(resp.headers.get("X-DB-Round-Trips", 0))
+
+    def bankroll_rows(self):
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("SELECT COUNT(*) AS n FROM bankrolls")
+            return c.fetchone()["n"]
+
+    def test_stateless_intents_skip_the_database(self):
+        """Test greetings, help and odds maths cost no query, even with a cold user cache."""
+        for message in ("hi", "help", "Implied probability for -110", "parlay odds for -110, +145"):
+            resp, round_trips = self.chat(message)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(round_trips, 0, message)
+        self.assertEqual(self.bankroll_rows(), 0)
+
+        counts = CHAT_QUERIES.snapshot()
+        self.assertEqual(counts["help"], {"messages": 1, "queries": 0, "db_free": 1})
+
+    def test_bankroll_read_without_creating_it(self):
+        """Test reading the bankroll does not insert one."""
+        resp, round_trips = self.chat("recommend conservative stake")
+        self.assertIn("$50.00", resp.get_json()["response"])
+        self.assertGreater(round_trips, 0)
+        self.assertEqual(self.bankroll_rows(), 0)
+
+        self.chat("set bankroll to 1000")
+        self.assertEqual(self.bankroll_rows(), 1)
+        resp, _ = self.chat("recommend conservative stake")
+        self.assertIn("$10.00", resp.get_json()["response"])
+        self.assertEqual(CHAT_QUERIES.snapshot()["recommend_stake"]["db_free"], 0)
+
+    def test_inactive_user_is_anonymous(self):
+        """Test a deactivated user found on demand is treated as logged out."""
+        with db.pooled_connection() as conn:
+            with conn.cursor() as c:
+                c.execute("UPDATE users SET is_active = FALSE WHERE email = %s", ("lazy@example.com",))
+            conn.commit()
+        resp, _ = self.chat("set bankroll to 300")
+        self.assertEqual(resp.status_code, 401)
+
+    def test_counts_reported(self):
+        """Test /admin/db-stats reports chat messages per intent."""
+        self.chat("hi")
+        with mock.patch.object(self.main, "ADMIN_TOKEN", "secret"):
+            stats = self.client.get("/admin/db-stats", headers={"X-Admin-Token": "secret"}).get_json()
+        self.assertEqual(stats["chat_queries"]["greeting"]["db_free"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Tests for the chat intent table.
+"""
+
+import unittest
+import sys
+import os
+import random
+import re
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chat_intents import CHAT_INTENTS, CHAT_ROUTER, Intent, IntentRouter
+
+
+def chained_route(text):
+    """The if-chain handle_input used before the router, reduced to the intent it picked."""
+    if text in ["hi", "hello", "hey"]:
+        return "greeting"
+    if "help" in text:
+        return "help"
+    if "bankroll" in text and any(word in text for word in ["set", "update", "change", "make"]):
+        return "set_bankroll"
+    if "risk mode" in text or ("set" in text and "aggressive" in text) or ("set" in text and "conservative" in text):
+        return "risk_mode"
+    if "recommend" in text and "stake" in text:
+        return "recommend_stake"
+    if "bankroll" in text and re.search(r"(\d+(?:\.\d+)?)\s*%", text) is not None:
+        return "percent_of_bankroll"
+    if "implied" in text and "prob" in text:
+        return "implied_probability"
+    if "payout" in text or "profit" in text:
+        return "payout"
+    if "parlay" in text and ("odds" in text or "for" in text):
+        return "parlay_odds"
+    if "odds" in text or "probability" in text:
+        return "odds_hint"
+    if "bankroll" in text or "stake" in text:
+        return "bankroll_hint"
+    if "bet" in text or "parlay" in text:
+        return "bet_hint"
+    if "reset" in text:
+        return "reset"
+    if "income" in text:
+        return "income"
+    if "expense" in text or "expenses" in text:
+        return "expenses"
+    if "saving" in text or "savings" in text:
+        return "savings"
+    for category in ["food", "entertainment", "bills"]:
+        if category in text:
+            return "category"
+    if "budget" in text or "show" in text:
+        return "budget"
+    return "summary"
+
+
+CORPUS = [
+    "hi", "hello", "hey", "hi there", "help", "can you help me", "set bankroll to 5000",
+    "update bankroll 250.50", "make bankroll 10", "bankroll", "what is 2% of bankroll?",
+    "what is 2.5 % of my bankroll", "bankroll % please", "recommend conservative stake",
+    "recommend aggressive stake", "set risk mode to aggressive", "risk mode", "set aggressive",
+    "set conservative", "implied probability for -110", "implied prob +145", "probability",
+    "payout for stake 100 at -110", "profit on stake 50 at +200", "parlay odds for -110, +145, -105",
+    "parlay for -110 +120", "parlay", "odds", "stake", "bet", "alphabet soup", "reset data",
+    "reset", "set income to 5000", "add 200 to income", "update expenses to 1000", "expense 20",
+    "update savings to 300", "add 20 to savings", "saving 5", "add 200 to food",
+    "update entertainment to 400", "bills 100", "food and bills 30", "show my budget",
+    "budget", "show", "what's up", "", "settings", "format my bankroll", "forecast parlay",
+    "offset the odds", "probably", "reset my bankroll", "income and expenses 100",
+    "help me set bankroll", "showcase", "upset bet", "outstanding", "profitability",
+]
+
+
+class TestIntentRouter(unittest.TestCase):
+    """Tests for routing messages through an ordered intent table."""
+
+    def test_keywords_match_as_substrings(self):
+        """Test keywords match anywhere in the message, as the old ``in`` checks did."""
+        router = IntentRouter([Intent("ate", "ate"), Intent("plat", "plat")], default="none")
+        self.assertEqual(router.route("plat"), "plat")
+        self.assertEqual(router.route("plate"), "ate")
+        self.assertEqual(router.route("templates"), "ate")
+
+    def test_clause_needs_every_keyword(self):
+        """Test a clause matches only when all of its keywords occur."""
+        router = IntentRouter([Intent("set", "bankroll+set", "bankroll+make"), Intent("hint", "bankroll")],
+                              default="none")
+        self.assertEqual(router.route("set bankroll"), "set")
+        self.assertEqual(router.route("make my bankroll"), "set")
+        self.assertEqual(router.route("bankroll"), "hint")
+        self.assertEqual(router.route("set it"), "none")
+        self.assertEqual(router.route("make it"), "none")
+
+    def test_clauses_sharing_a_first_keyword(self):
+        """Test grouped clauses still need their own other keywords, whatever their length."""
+        router = IntentRouter([Intent("x", "a+b+c", "a+d", "e")], default="none")
+        self.assertEqual([router.route(text) for text in ("a b c", "a d", "e", "a b", "b c d")],
+                         ["x", "x", "x", "none", "none"])
+        self.assertEqual(IntentRouter([Intent("x", "a", "a+b")], default="none").route("a"), "x")
+
+    def test_absorbed_clauses_dropped(self):
+        """Test a clause containing another clause of its intent is not compiled."""
+        router = IntentRouter([Intent("x", "b+a", "a", "a", "c+d", "d+c")], default="none")
+        self.assertEqual(router.source.count("'a' in text"), 1)
+        self.assertNotIn("'b' in text", router.source)
+        self.assertEqual(router.source.count("'d' in text"), 1)
+        self.assertEqual([router.route(text) for text in ("a", "b", "c d", "d")], ["x", "none", "x", "none"])
+
+    def test_keywords_are_quoted(self):
+        """Test keywords and names with quotes or backslashes compile to literal checks."""
+        router = IntentRouter([Intent("it's", "what's", "a\\b"), Intent('say "hi"', '"')], default="none")
+        self.assertEqual(router.route("what's up"), "it's")
+        self.assertEqual(router.route("a\\b"), "it's")
+        self.assertEqual(router.route('"'), 'say "hi"')
+        self.assertEqual(router.route("ab"), "none")
+
+    def test_priority_order(self):
+        """Test the first declared intent wins when several match."""
+        router = IntentRouter([Intent("both", "x+y"), Intent("x", "x"), Intent("y", "y")], default="none")
+        self.assertEqual(router.route("y x"), "both")
+        self.assertEqual(router.route("y"), "y")
+        self.assertEqual(router.route("z"), "none")
+
+    def test_exact_and_guard(self):
+        """Test exact phrases and regex guards."""
+        router = IntentRouter([
+            Intent("greet", exact=("hi",)),
+            Intent("pct", "%", "pct", guard=re.compile(r"\d\s*%")),
+            Intent("sign", "%"),
+        ], default="none")
+        self.assertEqual(router.route("hi"), "greet")
+        self.assertEqual(router.route("hi there"), "none")
+        self.assertEqual(router.route("5 %"), "pct")
+        self.assertEqual(router.route("a %"), "sign")
+        self.assertEqual(router.route("pct a %"), "sign")
+
+
+class TestChatRoutingParity(unittest.TestCase):
+    """Tests that CHAT_ROUTER picks what the old if-chain picked."""
+
+    def test_corpus(self):
+        """Test every corpus message routes as before."""
+        for message in CORPUS:
+            text = message.lower().strip()
+            with self.subTest(message=message):
+                self.assertEqual(CHAT_ROUTER.route(text), chained_route(text))
+
+    def test_random_keyword_mixes(self):
+        """Test random mixes of keywords, fragments and numbers route as before."""
+        words = sorted(set().union(*(intent.keywords for intent in CHAT_INTENTS)))
+        words += ["hi", "to", "of", "my", "50", "2%", "-110", "+145", "ban", "kroll", "pro", "ability", "x"]
+        rng = random.Random(18)
+        for _ in range(5000):
+            text = rng.choice(["", " "]).join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+            with self.subTest(text=text):
+                self.assertEqual(CHAT_ROUTER.route(text), chained_route(text))
+
+    def test_every_intent_has_a_handler(self):
+        """Test main.py handles every intent the router can return."""
+        import main
+        names = {intent.name for intent in CHAT_INTENTS} | {CHAT_ROUTER.default}
+        self.assertEqual(set(main.CHAT_HANDLERS), names)
+
+
+class TestHandleInput(unittest.TestCase):
+    """Tests for replies produced through the router."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        self.saved = {**main.user_data, "categories": dict(main.user_data["categories"])}
+
+    def tearDown(self):
+        self.main.user_data.clear()
+        self.main.user_data.update(self.saved)
+
+    def test_replies(self):
+        """Test representative messages get the expected replies."""
+        handle = self.main.handle_input
+        self.assertIn("AI Financial Assistant", handle("Hello"))
+        self.assertEqual(handle("Add 20 to food"), "Added $20.00 to food. Total: $320.00.")
+        self.assertEqual(handle("Set risk mode to aggressive"),
+                         "Risk mode set to <b>aggressive</b> (2–5% stake guidance).")
+        self.assertIn("52.38%", handle("Implied probability for -110"))
+        self.assertIn("Remaining", handle("show my budget"))
+        self.assertIn("quick financial summary", handle("what's up"))
+
+    def test_bankroll_update_needs_login(self):
+        """Test anonymous users cannot set a bankroll."""
+        with self.assertRaises(PermissionError):
+            self.main.handle_input("set bankroll to 100")
+
+
+if __name__ == "__main__":
+    unittest.main()
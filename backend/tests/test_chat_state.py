@@ -0,0 +1,276 @@
+"""
+Tests for the per-user chat state store.
+"""
+
+import contextlib
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from chat_state import CHAT_STATE, ChatStateStore, default_chat_state
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+            with conn.cursor() as c:
+                for n in (1, 2, 3):
+                    c.execute("INSERT INTO users (email, password) VALUES (%s, 'x')", (f"state{n}@example.com",))
+            conn.commit()
+        self.now = [0.0]
+        self.store = self.make_store()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+
+    def make_store(self, **kwargs):
+        kwargs.setdefault("flush_interval", 60)
+        return ChatStateStore(ttl=30, clock=lambda: self.now[0], **kwargs)
+
+    def get(self, store, user_id):
+        uow = db.UnitOfWork()
+        try:
+            return store.get(uow, user_id)
+        finally:
+            uow.close()
+
+    def rows(self):
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("SELECT user_id, income, categories, risk_mode FROM chat_state ORDER BY user_id")
+            return c.fetchall()
+
+
+class TestChatStateStore(StoreTestCase):
+    """Tests for the write-behind cache over chat_state."""
+
+    def test_defaults_without_a_row(self):
+        """Test a user without a row gets the defaults and nothing is written."""
+        self.assertEqual(self.get(self.store, 1), default_chat_state())
+        self.assertEqual(self.rows(), [])
+
+    def test_changes_written_on_flush(self):
+        """Test changes stay in memory until a flush writes them in one batch."""
+        for user_id in (1, 2):
+            state = self.get(self.store, user_id)
+            state["income"] = 1000 * user_id
+            state["categories"]["food"] = 5
+            self.store.mark_dirty(user_id)
+        self.assertEqual(self.rows(), [])
+
+        self.assertEqual(self.store.flush(), 2)
+        rows = self.rows()
+        self.assertEqual([(row["user_id"], float(row["income"])) for row in rows], [(1, 1000.0), (2, 2000.0)])
+        self.assertEqual(self.store.stats()["flushes"], 1)
+        self.assertEqual(self.store.flush(), 0)
+
+    def test_state_shared_through_the_table(self):
+        """Test another worker's store reads what this one flushed."""
+        state = self.get(self.store, 1)
+        state["risk_mode"] = "aggressive"
+        state["categories"]["bills"] = 900.5
+        self.store.mark_dirty(1)
+        self.store.flush()
+
+        other = self.get(self.make_store(), 1)
+        self.assertEqual(other["risk_mode"], "aggressive")
+        self.assertEqual(other["categories"]["bills"], 900.5)
+
+    def test_cached_until_ttl(self):
+        """Test repeat reads skip the database until the TTL passes, keeping the same dict."""
+        first = self.get(self.store, 1)
+        self.assertIs(self.get(self.store, 1), first)
+        self.now[0] = 31
+        self.assertIs(self.get(self.store, 1), first)
+        stats = self.store.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_dirty_entries_kept(self):
+        """Test unflushed changes are neither expired nor evicted."""
+        store = self.make_store(max_size=1)
+        state = self.get(store, 1)
+        state["savings"] = 1
+        store.mark_dirty(1)
+        self.now[0] = 31
+        self.get(store, 2)
+        self.assertEqual(self.get(store, 1)["savings"], 1)
+        self.assertEqual(store.stats()["evictions"], 1)
+        self.assertEqual(store.flush(), 1)
+
+    def test_failed_flush_retried(self):
+        """Test a flush that fails keeps its changes queued."""
+        self.get(self.store, 1)["income"] = 1
+        self.store.mark_dirty(1)
+        with mock.patch.object(self.store, "_connect", side_effect=RuntimeError("down")):
+            self.assertEqual(self.store.flush(), 0)
+        self.assertEqual(self.store.stats()["dirty"], 1)
+        self.assertEqual(self.store.flush(), 1)
+
+    def test_failed_commit_retried(self):
+        """Test changes whose commit failed are written by the next flush, first insert and update alike."""
+        self.get(self.store, 2)["income"] = 5
+        self.store.mark_dirty(2)
+        self.store.flush()
+        self.get(self.store, 1)["income"] = 1
+        self.get(self.store, 2)["income"] = 6
+        for user_id in (1, 2):
+            self.store.mark_dirty(user_id)
+
+        connect = self.store._connect
+
+        @contextlib.contextmanager
+        def failing_commit():
+            with connect() as conn:
+                with mock.patch.object(conn, "commit", side_effect=RuntimeError("lost")):
+                    yield conn
+                conn.rollback()
+
+        with mock.patch.object(self.store, "_connect", failing_commit):
+            self.assertEqual(self.store.flush(), 0)
+        self.assertEqual([float(row["income"]) for row in self.rows()], [5.0])
+
+        self.assertEqual(self.store.flush(), 2)
+        self.assertEqual([(row["user_id"], float(row["income"])) for row in self.rows()], [(1, 1.0), (2, 6.0)])
+        self.assertEqual(self.store.stats()["dropped"], 0)
+
+    def test_deleted_user_dropped(self):
+        """Test a user deleted before the flush does not block the others."""
+        for user_id in (1, 999):
+            self.get(self.store, user_id)
+            self.store.mark_dirty(user_id)
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual([row["user_id"] for row in self.rows()], [1])
+        self.assertEqual(self.store.stats()["dropped"], 1)
+
+    def test_stale_worker_keeps_newer_changes(self):
+        """Test a flush from a stale cache does not overwrite a field another worker changed since."""
+        stale = self.make_store()
+        self.get(stale, 1)
+        self.get(self.store, 1)["risk_mode"] = "aggressive"
+        self.store.mark_dirty(1)
+        self.store.flush()
+
+        state = self.get(stale, 1)
+        state["income"] = 4200
+        stale.mark_dirty(1)
+        self.assertEqual(stale.flush(), 1)
+
+        row = self.rows()[0]
+        self.assertEqual((float(row["income"]), row["risk_mode"]), (4200.0, "aggressive"))
+        self.assertEqual(state["risk_mode"], "aggressive")
+        self.assertEqual(stale.stats()["conflicts"], 1)
+
+    def test_concurrent_changes_merged(self):
+        """Test two workers changing different fields and categories of one row both keep their change."""
+        self.get(self.store, 1)
+        self.store.mark_dirty(1)
+        self.store.flush()
+        other = self.make_store()
+        mine, theirs = self.get(self.store, 1), self.get(other, 1)
+        mine["categories"]["food"] = 10
+        theirs["categories"]["bills"] = 20
+        theirs["savings"] = 30
+        for store in (other, self.store):
+            store.mark_dirty(1)
+            store.flush()
+
+        state = self.get(self.make_store(), 1)
+        self.assertEqual(state["categories"], {"food": 10, "entertainment": 200, "bills": 20})
+        self.assertEqual(state["savings"], 30)
+
+    def test_two_first_writes(self):
+        """Test a worker whose insert loses the race merges into the row the other worker inserted."""
+        other = self.make_store()
+        self.get(self.store, 2)["income"] = 1
+        self.get(other, 2)["expenses"] = 2
+        for store in (self.store, other):
+            store.mark_dirty(2)
+            self.assertEqual(store.flush(), 1)
+        state = self.get(self.make_store(), 2)
+        self.assertEqual((state["income"], state["expenses"]), (1, 2))
+        self.assertEqual(other.stats()["dropped"], 0)
+
+    def test_flush_copies_the_state(self):
+        """Test a change made while a flush is writing stays queued for the next flush."""
+        state = self.get(self.store, 1)
+        state["income"] = 1
+        self.store.mark_dirty(1)
+        write = self.store._write
+
+        def change_during_write(pending):
+            state["income"] = 2
+            self.store.mark_dirty(1)
+            return write(pending)
+
+        with mock.patch.object(self.store, "_write", side_effect=change_during_write):
+            self.store.flush()
+        self.assertEqual(float(self.rows()[0]["income"]), 1.0)
+        self.assertEqual(self.store.flush(), 1)
+        self.assertEqual(float(self.rows()[0]["income"]), 2.0)
+
+    def test_write_through_without_interval(self):
+        """Test flush_interval=0 writes each change at once."""
+        store = self.make_store(flush_interval=0)
+        self.get(store, 3)["income"] = 7
+        store.mark_dirty(3)
+        self.assertEqual(float(self.rows()[0]["income"]), 7.0)
+
+
+class TestChatEndpointState(unittest.TestCase):
+    """Tests that /chat keeps a separate budget per logged-in user."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        CHAT_STATE.clear()
+        self.client = main.app.test_client()
+        for email in ("alice@example.com", "bob@example.com"):
+            resp = self.client.post("/register", json={"email": email, "pass": "password123"})
+            self.assertEqual(resp.status_code, 200)
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        CHAT_STATE.clear()
+
+    def chat(self, email, message):
+        self.client.set_cookie("token", self.main.create_access_token({"email": email}))
+        return self.client.post("/chat", json={"message": message}).get_json()["response"]
+
+    def test_users_do_not_share_state(self):
+        """Test one user's changes are invisible to another user and to anonymous visitors."""
+        with mock.patch.object(CHAT_STATE, "flush_interval", 60), mock.patch.object(CHAT_STATE, "_start_flusher"):
+            self.assertEqual(self.chat("alice@example.com", "set income to 9000"), "Income updated to $9,000.00.")
+            self.assertIn("Income:</b> $3,000.00", self.chat("bob@example.com", "show my budget"))
+            self.assertIn("Income:</b> $9,000.00", self.chat("alice@example.com", "show my budget"))
+        self.assertEqual(self.main.user_data["income"], 3000)
+
+    def test_state_survives_the_cache(self):
+        """Test flushed state is read back after the cache is emptied (as on another worker)."""
+        with mock.patch.object(CHAT_STATE, "flush_interval", 60), mock.patch.object(CHAT_STATE, "_start_flusher"):
+            self.chat("alice@example.com", "set risk mode to aggressive")
+            self.chat("alice@example.com", "add 50 to food")
+        CHAT_STATE.flush()
+        CHAT_STATE.clear()
+        self.assertIn("Food: $350.00", self.chat("alice@example.com", "show my budget"))
+        self.assertIn("aggressive", self.chat("alice@example.com", "recommend stake"))
+
+
+if __name__ == "__main__":
+    unittest.main()
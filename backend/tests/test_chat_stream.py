@@ -0,0 +1,133 @@
+"""
+Tests for streaming chat replies over Server-Sent Events.
+"""
+
+import unittest
+import sys
+import os
+import json
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from chat_state import CHAT_STATE
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestChatSteps(unittest.TestCase):
+    """Tests for relaying a handler's partial results."""
+
+    def test_plain_reply(self):
+        """Test a handler returning a string gives just the reply."""
+        import main
+        self.assertEqual(list(main.chat_steps("done")), [("reply", "done")])
+
+    def test_generator_handler(self):
+        """Test a generator handler's yields become partials and its return the reply."""
+        import main
+
+        def handler():
+            yield "one"
+            yield "two"
+            return "done"
+
+        self.assertEqual(list(main.chat_steps(handler())),
+                         [("partial", "one"), ("partial", "two"), ("reply", "done")])
+
+
+class TestChatStreamEndpoint(unittest.TestCase):
+    """Tests for /chat/stream."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        CHAT_STATE.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        CHAT_STATE.clear()
+
+    def stream(self, message):
+        resp = self.client.post("/chat/stream", json={"message": message})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "text/event-stream")
+        return parse_events(resp.get_data(as_text=True))
+
+    def login(self, email="stream@example.com"):
+        resp = self.client.post("/register", json={"email": email, "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        self.client.set_cookie("token", self.main.create_access_token({"email": email}))
+
+    def test_ack_then_reply(self):
+        """Test a simple message is acknowledged with its intent, then answered."""
+        events = self.stream("Implied probability for -110")
+        self.assertEqual(events[0], ("ack", {"intent": "implied_probability"}))
+        self.assertEqual([name for name, _ in events], ["ack", "reply"])
+        self.assertIn("52.38%", events[1][1]["response"])
+
+    def test_partial_results(self):
+        """Test the parlay legs are sent before the combined odds."""
+        events = self.stream("parlay odds for -110, +145")
+        self.assertEqual([name for name, _ in events], ["ack", "partial", "reply"])
+        self.assertIn("+145 (2.4500)", events[1][1]["response"])
+        self.assertIn("4.6773", events[2][1]["response"])
+        self.assertEqual(events[2][1]["response"], self.main.handle_input("parlay odds for -110, +145"))
+
+    def test_ack_before_work(self):
+        """Test the ack is sent before the handler runs."""
+        handler = mock.Mock(return_value="late")
+        with mock.patch.dict(self.main.CHAT_HANDLERS, {"help": handler}):
+            resp = self.client.post("/chat/stream", json={"message": "help"}, buffered=False)
+            chunks = resp.response
+            self.assertIn(b"event: ack", next(chunks))
+            handler.assert_not_called()
+            self.assertIn(b"late", b"".join(chunks))
+            resp.close()
+        handler.assert_called_once()
+
+    def test_writes_committed_by_the_stream(self):
+        """Test a bankroll update made while streaming is committed."""
+        self.login()
+        events = self.stream("set bankroll to 1234")
+        self.assertIn("$1,234.00", events[-1][1]["response"])
+        self.assertEqual(self.client.get("/bankroll").get_json()["current_balance"], 1234.0)
+
+    def test_permission_error_event(self):
+        """Test an anonymous bankroll update ends with an error event."""
+        events = self.stream("set bankroll to 100")
+        self.assertEqual(events[-1][0], "error")
+        self.assertEqual(events[-1][1]["status"], 401)
+
+    def test_failure_rolled_back(self):
+        """Test an exception mid-stream rolls back and ends with an error event."""
+        self.login()
+        with mock.patch.dict(self.main.CHAT_HANDLERS, {"help": mock.Mock(side_effect=RuntimeError("boom"))}):
+            events = self.stream("help")
+        self.assertEqual(events[-1], ("error", {"error": "Internal server error", "status": 500}))
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("SELECT COUNT(*) AS n FROM bankrolls")
+            self.assertEqual(c.fetchone()["n"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+Tests for the database connection pool.
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionPool, PoolExhausted
+
+
+class FakeClock:
+    """Manually advanced replacement for time.monotonic."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeConnection:
+    """Minimal stand-in for a pymysql connection."""
+
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+        self.pings = 0
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.healthy:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    kwargs.setdefault("clock", FakeClock())
+    kwargs.setdefault("timeout", 0.05)
+    pool = ConnectionPool(factory=factory, **kwargs)
+    return pool, created
+
+
+class TestPoolCheckout(unittest.TestCase):
+    """Tests for checking connections out and back in."""
+
+    def test_connection_is_reused(self):
+        """Test a returned connection is handed out again."""
+        pool, created = make_pool(max_size=2)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(len(created), 1)
+
+    def test_release_rolls_back(self):
+        """Test returned connections are rolled back."""
+        pool, _ = make_pool()
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertEqual(conn.rollbacks, 1)
+
+    def test_pool_is_bounded(self):
+        """Test checkout times out once max_size connections are in use."""
+        pool, created = make_pool(max_size=2)
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolExhausted):
+            pool.acquire()
+        self.assertEqual(len(created), 2)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_waiter_gets_released_connection(self):
+        """Test a blocked checkout is woken when a connection is returned."""
+        pool, _ = make_pool(max_size=1, clock=time.monotonic, timeout=2)
+        conn = pool.acquire()
+        result = {}
+
+        def worker():
+            result["conn"] = pool.acquire()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        pool.release(conn)
+        thread.join(timeout=2)
+        self.assertIs(result.get("conn"), conn)
+
+    def test_context_manager_returns_connection(self):
+        """Test the connection() context manager releases on exit."""
+        pool, _ = make_pool()
+        with pool.connection():
+            self.assertEqual(pool.stats()["in_use"], 1)
+        self.assertEqual(pool.stats()["in_use"], 0)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_factory_failure_frees_slot(self):
+        """Test a failed connect does not leak pool capacity."""
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("refused")
+            return FakeConnection()
+
+        pool = ConnectionPool(factory=factory, max_size=1, timeout=0.05, clock=FakeClock())
+        with self.assertRaises(ConnectionError):
+            pool.acquire()
+        self.assertIsNotNone(pool.acquire())
+
+
+class TestPoolHealth(unittest.TestCase):
+    """Tests for health checks, lifetime and idle eviction."""
+
+    def test_unhealthy_connection_replaced(self):
+        """Test a connection failing its ping is replaced on checkout."""
+        clock = FakeClock()
+        pool, created = make_pool(clock=clock, ping_interval=1)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.healthy = False
+        clock.advance(2)
+
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["closed_unhealthy"], 1)
+
+    def test_recently_used_connection_not_pinged(self):
+        """Test the ping is skipped within ping_interval."""
+        clock = FakeClock()
+        pool, _ = make_pool(clock=clock, ping_interval=5)
+        conn = pool.acquire()
+        pool.release(conn)
+        clock.advance(1)
+        pool.acquire()
+        self.assertEqual(conn.pings, 0)
+
+    def test_max_lifetime(self):
+        """Test connections past max_lifetime are not reused."""
+        clock = FakeClock()
+        pool, created = make_pool(clock=clock, max_lifetime=10, ping_interval=100)
+        conn = pool.acquire()
+        pool.release(conn)
+        clock.advance(11)
+
+        self.assertIsNot(pool.acquire(), conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["closed_lifetime"], 1)
+
+    def test_idle_eviction(self):
+        """Test idle connections are closed after idle_timeout."""
+        clock = FakeClock()
+        pool, created = make_pool(clock=clock, idle_timeout=30, max_size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        clock.advance(20)
+        pool.release(second)
+        clock.advance(15)
+
+        self.assertIs(pool.acquire(), second)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.stats()["closed_idle"], 1)
+
+    def test_discard_closes_connection(self):
+        """Test release(discard=True) closes instead of pooling."""
+        pool, _ = make_pool()
+        conn = pool.acquire()
+        pool.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+class TestPoolStats(unittest.TestCase):
+    """Tests for pool statistics."""
+
+    def test_stats_counters(self):
+        """Test checkout and creation counters."""
+        pool, _ = make_pool(max_size=3)
+        for _ in range(4):
+            with pool.connection():
+                pass
+        stats = pool.stats()
+        self.assertEqual(stats["checkouts"], 4)
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["max_size"], 3)
+
+    def test_concurrent_checkouts_stay_bounded(self):
+        """Test many threads never exceed max_size open connections."""
+        pool, created = make_pool(max_size=3, clock=time.monotonic, timeout=5)
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(50):
+                    with pool.connection():
+                        pass
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(created), 3)
+        self.assertEqual(pool.stats()["checkouts"], 400)
+
+    def test_close_pool(self):
+        """Test closing the pool closes idle connections and rejects checkouts."""
+        pool, _ = make_pool()
+        conn = pool.acquire()
+        pool.release(conn)
+        pool.close()
+        self.assertTrue(conn.closed)
+        with self.assertRaises(PoolExhausted):
+            pool.acquire()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Tests for MFA QR rendering and caching.
+"""
+
+import unittest
+import sys
+import os
+import threading
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import mfa_qr
+from migrations import upgrade
+from mfa_qr import MFA_QR, QRRenderer
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+URI = "otpauth://totp/ClutchCall:a%40b.com?secret=JBSWY3DPEHPK3PXP&issuer=ClutchCall"
+
+
+class TestQRRenderer(unittest.TestCase):
+    """Tests for the render pool and its TTL cache."""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.renderer = QRRenderer(workers=2, ttl=60, max_size=2, clock=lambda: self.now[0])
+
+    def tearDown(self):
+        self.renderer.shutdown()
+
+    def test_formats(self):
+        """Test PNG and SVG output."""
+        self.assertTrue(self.renderer.render(URI, "png").startswith(b"\x89PNG"))
+        svg = self.renderer.render(URI, "svg")
+        self.assertTrue(svg.startswith(b"<svg"))
+        self.assertIn(b"<path d=\"M", svg)
+
+    def test_cached_until_ttl(self):
+        """Test a repeat render is served from the cache until the TTL passes."""
+        first = self.renderer.render(URI)
+        with mock.patch("mfa_qr._render", side_effect=AssertionError("rendered again")):
+            self.assertIs(self.renderer.render(URI), first)
+        self.now[0] = 61
+        self.renderer.render(URI)
+        stats = self.renderer.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertIn("png", stats["render"])
+
+    def test_lru_bound(self):
+        """Test the cache keeps at most max_size images."""
+        for fmt in ("png", "svg"):
+            self.renderer.render(URI, fmt)
+        self.renderer.render(URI + "x")
+        self.assertEqual(self.renderer.stats()["size"], 2)
+        self.assertEqual(self.renderer.stats()["evictions"], 1)
+
+    def test_concurrent_requests_share_a_render(self):
+        """Test simultaneous requests for one image render it once."""
+        release = threading.Event()
+        calls = []
+
+        def slow(uri, fmt):
+            calls.append(threading.current_thread().name)
+            release.wait(5)
+            return b"image"
+
+        results = []
+        with mock.patch("mfa_qr._render", slow):
+            callers = [threading.Thread(target=lambda: results.append(self.renderer.render(URI)))
+                       for _ in range(3)]
+            for caller in callers:
+                caller.start()
+            while self.renderer.stats()["coalesced"] < 2:
+                threading.Event().wait(0.001)
+            release.set()
+            for caller in callers:
+                caller.join(5)
+
+        self.assertEqual(results, [b"image"] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(calls[0].startswith("mfa-qr"))
+
+    def test_sessions(self):
+        """Test a remembered setup session expires with the TTL and can be forgotten."""
+        self.renderer.remember(b"session", URI)
+        self.assertEqual(self.renderer.recall(b"session"), URI)
+        self.renderer.forget(b"session")
+        self.assertIsNone(self.renderer.recall(b"session"))
+        self.renderer.remember(b"session", URI)
+        self.now[0] = 61
+        self.assertIsNone(self.renderer.recall(b"session"))
+
+
+class TestMfaSetupEndpoint(unittest.TestCase):
+    """Tests for /mfa/setup content negotiation and refreshes."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        MFA_QR.clear()
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+        resp = self.client.post("/register", json={"email": "qr@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        self.client.set_cookie("temp_token", main.create_temp_token({"email": "qr@example.com"}))
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        MFA_QR.clear()
+
+    def test_png_by_default(self):
+        """Test a client accepting anything gets PNG that is not cached by the browser."""
+        resp = self.client.get("/mfa/setup")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, "image/png")
+        self.assertEqual(resp.headers["Cache-Control"], "no-store")
+        self.assertIn("Accept", resp.headers["Vary"])
+
+    def test_svg_when_preferred(self):
+        """Test Accept: image/svg+xml selects SVG."""
+        resp = self.client.get("/mfa/setup", headers={"Accept": "image/svg+xml"})
+        self.assertEqual(resp.mimetype, "image/svg+xml")
+        self.assertTrue(resp.data.startswith(b"<svg"))
+
+    def test_refresh_reuses_image(self):
+        """Test refreshing the setup page returns the same QR code without rendering it again."""
+        first = self.client.get("/mfa/setup")
+        with mock.patch.object(mfa_qr, "_render", side_effect=AssertionError("rendered again")):
+            again = self.client.get("/mfa/setup")
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data, first.data)
+
+    def test_other_session_refused(self):
+        """Test a new sign-in cannot fetch the QR code of an existing secret."""
+        self.client.get("/mfa/setup")
+        self.client.set_cookie("temp_token", self.main.create_temp_token({"email": "qr@example.com", "n": 2}))
+        self.assertEqual(self.client.get("/mfa/setup").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
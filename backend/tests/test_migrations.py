@@ -0,0 +1,160 @@
+"""
+Tests for versioned schema migrations.
+"""
+
+import unittest
+import sys
+import os
+
+import pymysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from migrations import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    SchemaOutOfDate,
+    check_schema,
+    current_version,
+    upgrade,
+)
+
+
+class FakeDatabase:
+    """Records executed SQL and emulates the schema_migrations table."""
+
+    def __init__(self, applied=None, columns=None):
+        self.has_migrations_table = applied is not None
+        self.applied = list(applied or [])
+        self.columns = set(columns or [])
+        self.statements = []
+        self.commits = 0
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        db = self.db
+        db.statements.append(sql)
+        self._rows = []
+
+        if "GET_LOCK" in sql:
+            self._rows = [{"locked": 1}]
+        elif "CREATE TABLE IF NOT EXISTS schema_migrations" in sql:
+            db.has_migrations_table = True
+        elif "MAX(version)" in sql:
+            if not db.has_migrations_table:
+                raise pymysql.err.ProgrammingError(1146, "Table 'schema_migrations' doesn't exist")
+            self._rows = [{"version": max(db.applied) if db.applied else None}]
+        elif sql.startswith("INSERT INTO schema_migrations"):
+            db.applied.append(params[0])
+        elif "information_schema.COLUMNS" in sql:
+            self._rows = [{"table_name": t, "column_name": c} for t, c in db.columns]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class TestSchemaVersion(unittest.TestCase):
+    """Tests for reading and checking the schema version."""
+
+    def test_empty_database_is_version_zero(self):
+        """Test a database without schema_migrations reports version 0."""
+        conn = FakeConnection(FakeDatabase())
+        self.assertEqual(current_version(conn), 0)
+
+    def test_check_schema_raises_when_behind(self):
+        """Test check_schema flags pending migrations."""
+        conn = FakeConnection(FakeDatabase(applied=[1]))
+        with self.assertRaises(SchemaOutOfDate):
+            check_schema(conn)
+
+    def test_check_schema_is_single_query(self):
+        """Test the startup check issues exactly one statement."""
+        db = FakeDatabase(applied=[m.version for m in MIGRATIONS])
+        self.assertEqual(check_schema(FakeConnection(db)), SCHEMA_VERSION)
+        self.assertEqual(len(db.statements), 1)
+
+    def test_versions_are_increasing(self):
+        """Test migration versions are unique and ordered."""
+        versions = [m.version for m in MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+
+class TestUpgrade(unittest.TestCase):
+    """Tests for applying migrations."""
+
+    def test_upgrade_fresh_database(self):
+        """Test all migrations are applied and recorded."""
+        db = FakeDatabase()
+        applied = upgrade(FakeConnection(db))
+        self.assertEqual([m.version for m in applied], [m.version for m in MIGRATIONS])
+        self.assertEqual(db.applied, [m.version for m in MIGRATIONS])
+        self.assertTrue(any("CREATE TABLE IF NOT EXISTS users" in s for s in db.statements))
+
+    def test_upgrade_is_noop_when_current(self):
+        """Test no DDL runs on an up-to-date database."""
+        db = FakeDatabase(applied=[m.version for m in MIGRATIONS])
+        self.assertEqual(upgrade(FakeConnection(db)), [])
+        self.assertFalse(any("CREATE TABLE IF NOT EXISTS users" in s for s in db.statements))
+
+    def test_upgrade_to_target(self):
+        """Test upgrading stops at the requested version."""
+        db = FakeDatabase()
+        upgrade(FakeConnection(db), target=1)
+        self.assertEqual(db.applied, [1])
+
+    def test_upgrade_releases_lock(self):
+        """Test the migration lock is released."""
+        db = FakeDatabase()
+        upgrade(FakeConnection(db))
+        self.assertIn("RELEASE_LOCK", db.statements[-1])
+
+    def test_legacy_columns_only_added_when_missing(self):
+        """Test migration 2 only alters tables missing a column."""
+        present = {(t, c) for t, c, _ in migrations.LEGACY_COLUMNS if c != "phone"}
+        db = FakeDatabase(applied=[1], columns=present)
+        upgrade(FakeConnection(db), target=2)
+        alters = [s for s in db.statements if s.startswith("ALTER TABLE")]
+        self.assertEqual(alters, ["ALTER TABLE users ADD COLUMN phone VARCHAR(20)"])
+
+
+class TestImportSideEffects(unittest.TestCase):
+    """Tests that importing the app does not touch the database."""
+
+    def test_import_main_opens_no_connection(self):
+        """Test importing main.py creates no pool or connection."""
+        import db
+        import main  # noqa: F401
+        self.assertIsNone(db._pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
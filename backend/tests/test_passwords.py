@@ -0,0 +1,257 @@
+"""
+Tests for the bounded password hashing pool.
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+
+import db
+import passwords
+from migrations import upgrade
+from passwords import PasswordHasher, PasswordHasherBusy, calibrate, hash_cost, load_rounds, save_policy
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class TestPasswordHasher(unittest.TestCase):
+    """Tests for hashing on the worker pool."""
+
+    def setUp(self):
+        self.hasher = PasswordHasher(workers=1, max_queue=1, retry_after=3)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_hash_and_check(self):
+        """Test a hash verifies its password and rejects others."""
+        hashed = self.hasher.hash("password123")
+        self.assertIsInstance(hashed, str)
+        self.assertTrue(self.hasher.check("password123", hashed))
+        self.assertTrue(self.hasher.check("password123", hashed.encode()))
+        self.assertFalse(self.hasher.check("wrong", hashed))
+
+    def test_runs_off_the_calling_thread(self):
+        """Test bcrypt runs on a pool thread, not the request thread."""
+        threads = []
+
+        def record(password, rounds):
+            threads.append(threading.current_thread().name)
+            return "hashed"
+
+        with mock.patch("passwords._hash", record):
+            self.hasher.hash("password123")
+        self.assertTrue(threads[0].startswith("bcrypt"))
+
+    def test_full_queue_fails_fast(self):
+        """Test a job beyond workers + queue is refused with retry_after."""
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow(password, rounds):
+            started.set()
+            release.wait(5)
+            return "hashed"
+
+        results = []
+        with mock.patch("passwords._hash", slow):
+            callers = [threading.Thread(target=lambda: results.append(self.hasher.hash("x"))) for _ in range(2)]
+            for caller in callers:
+                caller.start()
+            started.wait(5)
+            while self.hasher.stats()["queued"] < 1:
+                threading.Event().wait(0.001)
+
+            with self.assertRaises(PasswordHasherBusy) as ctx:
+                self.hasher.hash("x")
+            self.assertEqual(ctx.exception.retry_after, 3)
+
+            release.set()
+            for caller in callers:
+                caller.join(5)
+
+        self.assertEqual(results, ["hashed", "hashed"])
+        stats = self.hasher.stats()
+        self.assertEqual((stats["completed"], stats["rejected"]), (2, 1))
+        self.assertGreaterEqual(stats["peak_queued"], 1)
+        self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+        self.assertIn("hash", stats["latency"])
+
+    def test_errors_free_the_slot(self):
+        """Test a job that raises still releases its queue slot."""
+        with self.assertRaises(ValueError):
+            self.hasher.check("password123", "not-a-bcrypt-hash")
+        self.assertEqual(self.hasher.stats()["running"], 0)
+        self.assertTrue(self.hasher.check("a", self.hasher.hash("a")))
+
+
+class TestPasswordHasherBusyResponse(unittest.TestCase):
+    """Tests for how the app reports a saturated hashing pool."""
+
+    def test_register_returns_503_with_retry_after(self):
+        """Test a refused hash becomes 503 with Retry-After."""
+        import main
+        RATE_LIMITER.clear()
+        client = main.app.test_client()
+        with mock.patch.object(main, "hash_password", side_effect=PasswordHasherBusy(2)):
+            resp = client.post("/register", json={"email": "busy@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], "2")
+
+    def test_hasher_is_shared(self):
+        """Test the module helpers use one process-wide pool."""
+        self.assertIs(passwords.get_password_hasher(), passwords.get_password_hasher())
+
+
+class TestBcryptPolicy(unittest.TestCase):
+    """Tests for the calibrated bcrypt cost policy."""
+
+    def test_hash_cost(self):
+        """Test the cost is read from str and bytes hashes."""
+        hashed = bcrypt.hashpw(b"pw", bcrypt.gensalt(5))
+        self.assertEqual(hash_cost(hashed), 5)
+        self.assertEqual(hash_cost(hashed.decode()), 5)
+        self.assertIsNone(hash_cost("plaintext"))
+        self.assertIsNone(hash_cost(None))
+
+    def test_hashes_at_policy_cost(self):
+        """Test new hashes use the hasher's cost and older costs need a rehash."""
+        hasher = PasswordHasher(workers=1, max_queue=1, rounds=5)
+        try:
+            hashed = hasher.hash("password123")
+            self.assertEqual(hash_cost(hashed), 5)
+            self.assertFalse(hasher.needs_rehash(hashed))
+            self.assertTrue(hasher.needs_rehash(bcrypt.hashpw(b"password123", bcrypt.gensalt(4))))
+        finally:
+            hasher.shutdown()
+
+    def test_calibrate_picks_cost_within_target(self):
+        """Test calibration picks the highest cost whose hash fits the target."""
+        # 20ms at cost 10, doubling per round
+        with mock.patch("passwords._time_hash", lambda rounds: 20 * 2 ** (rounds - 10)):
+            self.assertEqual(calibrate(target_ms=250)["rounds"], 13)
+            self.assertEqual(calibrate(target_ms=160)["rounds"], 13)
+            self.assertEqual(calibrate(target_ms=5)["rounds"], 10)
+            self.assertEqual(calibrate(target_ms=10 ** 6)["rounds"], 16)
+
+    def test_calibrate_measures_this_machine(self):
+        """Test a real calibration returns a cost in range and its timing."""
+        policy = calibrate(target_ms=1, min_rounds=4, max_rounds=5, samples=1)
+        self.assertEqual(policy["rounds"], 4)
+        self.assertGreater(policy["hash_ms"], 0)
+
+    def test_load_rounds(self):
+        """Test BCRYPT_ROUNDS overrides the policy file, which overrides the default."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policy.json")
+            with mock.patch.dict(os.environ, {"BCRYPT_ROUNDS": ""}):
+                self.assertEqual(load_rounds(path), passwords.BCRYPT_DEFAULT_ROUNDS)
+                save_policy({"rounds": 11}, path)
+                self.assertEqual(load_rounds(path), 11)
+            with mock.patch.dict(os.environ, {"BCRYPT_ROUNDS": "9"}):
+                self.assertEqual(load_rounds(path), 9)
+
+
+class TestPasswordColumns(unittest.TestCase):
+    """Tests for login rehashing and the password/password_hash columns."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        self.hasher = passwords.get_password_hasher()
+        self.rounds = self.hasher.rounds
+        self.hasher.rounds = 4
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+        resp = self.client.post("/register", json={"email": "cost@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+
+    def tearDown(self):
+        self.hasher.rounds = self.rounds
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+
+    def stored(self):
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("SELECT password_hash, password FROM users WHERE email = 'cost@example.com'")
+            return c.fetchone()
+
+    def login(self, password):
+        return self.client.post("/login", json={"email": "cost@example.com", "pass": password}).status_code
+
+    def test_login_rehashes_at_new_cost(self):
+        """Test a good login replaces a hash made at another cost, in both columns."""
+        self.hasher.rounds = 5
+        self.assertEqual(self.login("password123"), 200)
+        row = self.stored()
+        self.assertEqual(hash_cost(row["password_hash"]), 5)
+        self.assertEqual(row["password"], row["password_hash"])
+
+        # Already at the policy cost: nothing is written
+        self.assertEqual(self.login("password123"), 200)
+        self.assertEqual(self.stored(), row)
+
+    def test_failed_login_does_not_rehash(self):
+        """Test a wrong password leaves the stored hash alone."""
+        before = self.stored()
+        self.hasher.rounds = 5
+        self.assertEqual(self.login("wrong-password"), 401)
+        self.assertEqual(self.stored(), before)
+
+    def test_busy_hasher_skips_rehash(self):
+        """Test login still succeeds when the rehash cannot be queued."""
+        before = self.stored()
+        self.hasher.rounds = 5
+        with mock.patch.object(self.main, "hash_password", side_effect=PasswordHasherBusy(1)):
+            self.assertEqual(self.login("password123"), 200)
+        self.assertEqual(self.stored(), before)
+
+    def test_changed_password_used_by_login(self):
+        """Test /change-password updates the column login reads."""
+        self.client.set_cookie("token", self.main.create_access_token({"email": "cost@example.com"}))
+        resp = self.client.post("/change-password", json={
+            "currentPassword": "password123", "newPassword": "new-password-456",
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.login("password123"), 401)
+        self.assertEqual(self.login("new-password-456"), 200)
+
+    def test_migration_reconciles_columns(self):
+        """Test migration 6 copies the newer password column into password_hash."""
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn, target=5)
+            with conn.cursor() as c:
+                c.execute(
+                    "INSERT INTO users (email, password, password_hash) VALUES "
+                    "('legacy@example.com', '$2b$04$legacy', NULL), "
+                    "('changed@example.com', '$2b$04$new', '$2b$04$old'), "
+                    "('same@example.com', '$2b$04$same', '$2b$04$same')"
+                )
+            conn.commit()
+            upgrade(conn)
+            with conn.cursor() as c:
+                c.execute("SELECT email, password_hash FROM users ORDER BY email")
+                rows = {row["email"]: row["password_hash"] for row in c.fetchall()}
+        self.assertEqual(rows, {
+            "changed@example.com": "$2b$04$new",
+            "legacy@example.com": "$2b$04$legacy",
+            "same@example.com": "$2b$04$same",
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
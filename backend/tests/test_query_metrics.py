@@ -0,0 +1,176 @@
+"""
+Tests for per-query latency metrics, the slow-query log and /admin/db-stats.
+"""
+
+import unittest
+import sys
+import os
+import io
+from contextlib import redirect_stdout
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import queries
+from db import ConnectionPool, SQLiteBackend, UnitOfWork
+from metrics import QUERY_LATENCY, LatencyHistogram, LatencyRegistry
+from migrations import upgrade
+from queries import Query, query_name
+from ratelimit import RATE_LIMITER
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Tests for bucketed latency histograms."""
+
+    def test_empty(self):
+        """Test an empty histogram reports zeros."""
+        self.assertEqual(LatencyHistogram().snapshot()["p99_ms"], 0.0)
+
+    def test_percentiles(self):
+        """Test percentiles land within one bucket (20%) of the true value."""
+        histogram = LatencyHistogram()
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+        stats = histogram.snapshot()
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["total_ms"], 5050, places=3)
+        self.assertEqual(stats["max_ms"], 100)
+        for key, expected in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            self.assertGreaterEqual(stats[key], expected)
+            self.assertLessEqual(stats[key], expected * 1.2)
+
+    def test_percentile_capped_at_max(self):
+        """Test a single sample reports itself rather than its bucket bound."""
+        histogram = LatencyHistogram()
+        histogram.record(0.0123)
+        self.assertEqual(histogram.snapshot()["p99_ms"], 12.3)
+
+
+class TestLatencyRegistry(unittest.TestCase):
+    """Tests for the named histogram registry."""
+
+    def test_snapshot_sorted_by_total_time(self):
+        """Test the most expensive query names come first."""
+        registry = LatencyRegistry()
+        registry.record("cheap", 0.001)
+        registry.record("costly", 0.5)
+        registry.record("cheap", 0.001)
+        self.assertEqual(list(registry.snapshot()), ["costly", "cheap"])
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {})
+
+
+class TestQueryName(unittest.TestCase):
+    """Tests for naming statements in the metrics."""
+
+    def test_catalog_name(self):
+        """Test catalog queries report their own name."""
+        self.assertEqual(query_name(queries.USER_FOR_LOGIN), "users.for_login")
+        self.assertEqual(query_name(queries.update_profile(["phone = %s"])), "users.update_profile")
+
+    def test_query_is_plain_sql(self):
+        """Test a Query can be used wherever a SQL string is."""
+        sql = Query("t.one", "SELECT 1")
+        self.assertEqual(sql, "SELECT 1")
+        self.assertEqual(sql.strip(), "SELECT 1")
+
+    def test_fingerprint_for_raw_sql(self):
+        """Test unnamed statements are grouped by verb and table."""
+        self.assertEqual(query_name("SELECT id FROM users WHERE id = %s"), "SELECT users")
+        self.assertEqual(query_name("\n  insert into bets (a) VALUES (%s)"), "INSERT bets")
+        self.assertEqual(query_name("UPDATE bank_accounts SET x = 1 WHERE id IN (SELECT id FROM t)"),
+                         "UPDATE bank_accounts")
+        self.assertEqual(query_name("COMMIT"), "COMMIT")
+
+
+class TestQueryTiming(unittest.TestCase):
+    """Tests for timing and slow-query logging in the unit of work."""
+
+    def setUp(self):
+        QUERY_LATENCY.reset()
+        self.backend = SQLiteBackend()
+        self.pool = ConnectionPool(factory=self.backend.connect, max_size=1)
+        with self.pool.connection() as conn:
+            upgrade(conn)
+
+    def tearDown(self):
+        QUERY_LATENCY.reset()
+        self.pool.close()
+        self.backend.close()
+
+    def run_query(self, slow_ms, explain):
+        output = io.StringIO()
+        uow = UnitOfWork(self.pool)
+        with mock.patch.object(db, "DB_SLOW_QUERY_MS", slow_ms), \
+                mock.patch.object(db, "DB_EXPLAIN_SLOW_QUERIES", explain), redirect_stdout(output):
+            uow.execute(queries.USER_FOR_LOGIN, ("nobody@example.com",)).fetchone()
+        trips = uow.round_trips
+        uow.close()
+        return output.getvalue(), trips
+
+    def test_latency_recorded_by_name(self):
+        """Test each statement is timed under its catalog name."""
+        output, _ = self.run_query(slow_ms=10_000, explain=False)
+        self.assertEqual(output, "")
+        self.assertEqual(QUERY_LATENCY.snapshot()["users.for_login"]["count"], 1)
+
+    def test_slow_query_logged_with_plan(self):
+        """Test slow SELECTs are logged with their plan without adding round trips."""
+        output, trips = self.run_query(slow_ms=0, explain=True)
+        self.assertIn("SLOW QUERY users.for_login", output)
+        self.assertIn("EXPLAIN", output)
+        self.assertEqual(trips, 1)
+
+    def test_plan_off_by_default_outside_debug(self):
+        """Test slow queries are logged without a plan when EXPLAIN is disabled."""
+        output, _ = self.run_query(slow_ms=0, explain=False)
+        self.assertIn("SLOW QUERY", output)
+        self.assertNotIn("EXPLAIN", output)
+
+
+class TestDbStatsEndpoint(unittest.TestCase):
+    """Tests for the admin query stats endpoint."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+
+    def test_hidden_without_admin_token(self):
+        """Test the endpoint does not exist unless ADMIN_TOKEN is set."""
+        with mock.patch.object(self.main, "ADMIN_TOKEN", None):
+            resp = self.client.get("/admin/db-stats", headers={"X-Admin-Token": ""})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_wrong_token(self):
+        """Test a wrong token is rejected."""
+        with mock.patch.object(self.main, "ADMIN_TOKEN", "s3cret"):
+            resp = self.client.get("/admin/db-stats", headers={"X-Admin-Token": "guess"})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_reports_query_and_pool_stats(self):
+        """Test queries run by the app show up in the stats."""
+        self.client.post("/register", json={"email": "stats@example.com", "pass": "password123"})
+        with mock.patch.object(self.main, "ADMIN_TOKEN", "s3cret"):
+            resp = self.client.get("/admin/db-stats", headers={"X-Admin-Token": "s3cret"})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertGreaterEqual(body["queries"]["users.insert"]["count"], 1)
+        self.assertIn("p95_ms", body["queries"]["users.insert"])
+        self.assertIn("max_size", body["pool"])
+        self.assertIsNone(body["replicas"])
+
+
+if __name__ == "__main__":
+    unittest.main()
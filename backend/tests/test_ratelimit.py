@@ -0,0 +1,215 @@
+"""
+Tests for rate limiting the credential endpoints.
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from metrics import QUERY_LATENCY
+from migrations import upgrade
+from ratelimit import (
+    RATE_LIMITER,
+    LocalKeyValue,
+    MemoryStore,
+    RateLimit,
+    RateLimited,
+    RateLimiter,
+    SharedStore,
+    create_store,
+)
+from repositories import AUTH_USERS
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests for token buckets per IP and per account."""
+
+    def setUp(self):
+        self.now = [1000.0]
+
+    def limiter(self, store=None):
+        return RateLimiter(store=store, per_ip=RateLimit(5, 10), per_account=RateLimit(2, 60),
+                           enabled=True, clock=lambda: self.now[0])
+
+    def test_parse(self):
+        """Test limits are read as attempts/seconds."""
+        limit = RateLimit.parse("30/60")
+        self.assertEqual((limit.capacity, limit.period, limit.refill_rate), (30, 60.0, 0.5))
+
+    def test_ip_burst_then_refill(self):
+        """Test an IP gets its burst, is refused with Retry-After, then refills."""
+        limiter = self.limiter()
+        for _ in range(5):
+            limiter.hit("1.2.3.4")
+        with self.assertRaises(RateLimited) as ctx:
+            limiter.hit("1.2.3.4")
+        self.assertEqual(ctx.exception.retry_after, 2)
+
+        limiter.hit("5.6.7.8")
+        self.now[0] += 2
+        limiter.hit("1.2.3.4")
+        self.assertEqual(limiter.stats()["limited_ip"], 1)
+
+    def test_account_failures_across_ips(self):
+        """Test one account is limited after its failed attempts, however many IPs make them."""
+        limiter = self.limiter()
+        limiter.hit("10.0.0.1", "Victim@Example.com")
+        limiter.failed("Victim@Example.com")
+        limiter.hit("10.0.0.2", "victim@example.com ")
+        limiter.failed("victim@example.com ")
+        with self.assertRaises(RateLimited) as ctx:
+            limiter.hit("10.0.0.3", "victim@example.com")
+        self.assertEqual(ctx.exception.retry_after, 30)
+        limiter.hit("10.0.0.3", "other@example.com")
+        self.assertEqual(limiter.stats()["limited_account"], 1)
+
+    def test_only_failures_count_against_accounts(self):
+        """Test attempts that are not failures never lock an account, and a success clears failures."""
+        for store in (None, SharedStore(LocalKeyValue())):
+            with self.subTest(store=type(store).__name__):
+                limiter = self.limiter(store)
+                for n in range(20):
+                    limiter.hit(f"10.0.1.{n}", "victim@example.com")
+                limiter.failed("victim@example.com")
+                limiter.succeeded("victim@example.com")
+                limiter.failed("victim@example.com")
+                limiter.hit("10.0.2.1", "victim@example.com")
+
+    def test_create_store(self):
+        """Test RATE_LIMIT_STORE picks the store."""
+        self.assertIsInstance(create_store("memory"), MemoryStore)
+        with self.assertRaises(ValueError):
+            create_store("memcached://localhost")
+
+    def test_shared_store(self):
+        """Test limiters on separate workers share buckets through a shared store."""
+        client = LocalKeyValue()
+        first, second = self.limiter(SharedStore(client)), self.limiter(SharedStore(client))
+        for _ in range(3):
+            first.hit("1.2.3.4")
+        for _ in range(2):
+            second.hit("1.2.3.4")
+        with self.assertRaises(RateLimited):
+            first.hit("1.2.3.4")
+
+    def test_memory_store_is_bounded(self):
+        """Test the in-process store forgets the least recently used buckets."""
+        limiter = self.limiter(MemoryStore(max_keys=2))
+        for ip in ("a", "b", "c"):
+            limiter.hit(ip)
+        self.assertEqual(len(limiter.store._buckets), 2)
+
+    def test_disabled(self):
+        """Test a disabled limiter lets everything through."""
+        limiter = self.limiter()
+        limiter.enabled = False
+        for _ in range(20):
+            limiter.hit("1.2.3.4", "a@b.com")
+
+
+class TestCredentialEndpointLimits(unittest.TestCase):
+    """Tests that throttled requests are refused before any query or hash."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        RATE_LIMITER.clear()
+
+    def login(self, email="stuffed@example.com"):
+        return self.client.post("/login", json={"email": email, "pass": "guess"})
+
+    def test_login_limited_per_account(self):
+        """Test repeated logins for one account get 429 without touching the database or bcrypt."""
+        for _ in range(RATE_LIMITER.per_account.capacity):
+            self.assertEqual(self.login().status_code, 401)
+
+        QUERY_LATENCY.reset()
+        with mock.patch.object(self.main, "check_password", side_effect=AssertionError("hashed")):
+            resp = self.login()
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp.headers["Retry-After"]), 1)
+        self.assertNotIn("X-DB-Round-Trips", resp.headers)
+        self.assertEqual(QUERY_LATENCY.snapshot(), {})
+
+    def test_correct_logins_never_limited(self):
+        """Test signing in with the right password is not counted against the account."""
+        self.client.post("/register", json={"email": "owner@example.com", "pass": "password123"})
+        for _ in range(RATE_LIMITER.per_account.capacity + 1):
+            resp = self.client.post("/login", json={"email": "owner@example.com", "pass": "password123"})
+            self.assertEqual(resp.status_code, 200)
+
+    def test_success_clears_failures(self):
+        """Test a successful sign-in forgets the account's earlier failed attempts."""
+        self.client.post("/register", json={"email": "owner@example.com", "pass": "password123"})
+        for _ in range(2):
+            for _ in range(RATE_LIMITER.per_account.capacity - 1):
+                self.assertEqual(self.login("owner@example.com").status_code, 401)
+            resp = self.client.post("/login", json={"email": "owner@example.com", "pass": "password123"})
+            self.assertEqual(resp.status_code, 200)
+
+    def test_login_limited_per_ip(self):
+        """Test one IP spraying many accounts is cut off."""
+        statuses = [self.login(f"user{i}@example.com").status_code
+                    for i in range(RATE_LIMITER.per_ip.capacity + 1)]
+        self.assertEqual(statuses[-1], 429)
+        self.assertNotIn(429, statuses[:-1])
+
+    def test_mfa_validate_limited_per_account(self):
+        """Test TOTP guesses for one pending sign-in are limited by its email."""
+        self.client.set_cookie("temp_token", self.main.create_temp_token({"email": "mfa@example.com"}))
+        statuses = [self.client.post("/mfa/validate", json={"code": "000000"}).status_code
+                    for _ in range(RATE_LIMITER.per_account.capacity + 1)]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_register_limited_per_account(self):
+        """Test registering an email that is taken is limited for that email only."""
+        self.client.post("/register", json={"email": "taken@example.com", "pass": "password123"})
+        statuses = [self.client.post("/register", json={"email": "Taken@example.com", "pass": "password123"}).status_code
+                    for _ in range(RATE_LIMITER.per_account.capacity + 1)]
+        self.assertEqual(statuses[:-1], [409] * RATE_LIMITER.per_account.capacity)
+        self.assertEqual(statuses[-1], 429)
+        resp = self.client.post("/register", json={"email": "new@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_client_address_behind_proxy(self):
+        """Test behind a trusted proxy each forwarded client gets its own IP bucket."""
+        def login(client_ip):
+            return self.client.post("/login", json={"email": f"{client_ip}@example.com", "pass": "guess"},
+                                    headers={"X-Forwarded-For": client_ip},
+                                    environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code
+
+        with mock.patch.object(self.main.app, "wsgi_app", ProxyFix(self.main.app.wsgi_app, x_for=1)):
+            statuses = [login(f"203.0.113.{i}") for i in range(RATE_LIMITER.per_ip.capacity + 1)]
+        self.assertNotIn(429, statuses)
+
+        # Without a trusted proxy the header is ignored: every request is the proxy's
+        RATE_LIMITER.clear()
+        statuses = [login(f"203.0.113.{i}") for i in range(RATE_LIMITER.per_ip.capacity + 1)]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_other_endpoints_unlimited(self):
+        """Test endpoints without a declared limit are not throttled."""
+        for _ in range(RATE_LIMITER.per_ip.capacity + 1):
+            self.assertEqual(self.client.get("/validate").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+Tests for read-replica routing.
+"""
+
+import unittest
+import sys
+import os
+import time
+
+import pymysql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from db import ConnectionPool, PoolExhausted, ReplicaPool, SQLiteBackend
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePool:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.acquired = 0
+        self.released = []
+
+    def acquire(self, timeout=None):
+        if self.error:
+            raise self.error
+        self.acquired += 1
+        return object()
+
+    def release(self, conn, discard=False, reset=True):
+        self.released.append(conn)
+
+    def stats(self):
+        return {"name": self.name}
+
+    def close(self):
+        pass
+
+
+class TestReplicaPool(unittest.TestCase):
+    """Tests for replica selection and failover."""
+
+    def test_round_robin_across_replicas(self):
+        """Test checkouts alternate between healthy replicas."""
+        primary, a, b = FakePool("primary"), FakePool("a"), FakePool("b")
+        pool = ReplicaPool(primary, [a, b])
+        for _ in range(4):
+            pool.release(pool.acquire())
+        self.assertEqual((a.acquired, b.acquired, primary.acquired), (2, 2, 0))
+        self.assertEqual(len(a.released) + len(b.released), 4)
+
+    def test_failover_to_primary(self):
+        """Test reads go to the primary when the only replica is down."""
+        primary = FakePool("primary")
+        replica = FakePool("replica", error=pymysql.err.OperationalError(2003, "down"))
+        pool = ReplicaPool(primary, [replica])
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertEqual(primary.released, [conn])
+        self.assertEqual(pool.stats()["primary_fallbacks"], 1)
+
+    def test_failed_replica_retried_after_interval(self):
+        """Test a failed replica is skipped until retry_interval passes."""
+        clock = FakeClock()
+        primary = FakePool("primary")
+        replica = FakePool("replica", error=pymysql.err.OperationalError(2003, "down"))
+        pool = ReplicaPool(primary, [replica], retry_interval=30, clock=clock)
+
+        pool.acquire()
+        replica.error = None
+        pool.acquire()
+        self.assertEqual(replica.acquired, 0)
+        self.assertEqual(pool.stats()["replicas_down"], 1)
+
+        clock.now = 31
+        pool.acquire()
+        self.assertEqual(replica.acquired, 1)
+
+    def test_exhausted_replica_is_not_marked_down(self):
+        """Test a busy replica falls back without being taken out of rotation."""
+        primary = FakePool("primary")
+        replica = FakePool("replica", error=PoolExhausted("busy"))
+        pool = ReplicaPool(primary, [replica])
+        pool.acquire()
+        self.assertEqual(pool.stats()["replica_failures"], 0)
+        self.assertEqual(primary.acquired, 1)
+
+    def test_busy_replica_not_waited_on(self):
+        """Test a read falls back to the primary at once when the replica pool is exhausted."""
+        replica = ConnectionPool(factory=object, max_size=1, timeout=5)
+        primary = FakePool("primary")
+        pool = ReplicaPool(primary, [replica])
+        held = pool.acquire()
+
+        started = time.monotonic()
+        pool.acquire()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(primary.acquired, 1)
+        stats = pool.stats()
+        self.assertEqual((stats["replica_busy"], stats["replica_failures"]), (1, 0))
+
+        pool.release(held, reset=False)
+        pool.acquire()
+        self.assertEqual(primary.acquired, 1)
+
+
+class BrokenBackend:
+    dialect = "mysql"
+    max_connections = None
+
+    def connect(self, create_db_if_missing=False):
+        raise pymysql.err.OperationalError(2003, "Can't connect to replica")
+
+    def close(self):
+        pass
+
+
+class TestReplicaRouting(unittest.TestCase):
+    """Tests that read-only endpoints use the replica, with read-your-writes."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+
+    def start(self, replica):
+        db.configure("sqlite://", replicas=[replica])
+        for backend in (db.get_backend(), replica):
+            if isinstance(backend, SQLiteBackend):
+                conn = backend.connect()
+                upgrade(conn)
+                conn.close()
+        self.main._schema_checked = False
+
+        resp = self.client.post("/register", json={"email": "replica@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        self.client.set_cookie("token", self.main.create_access_token({"email": "replica@example.com"}))
+
+    def test_reads_follow_writes_then_move_to_replica(self):
+        """Test a client reads the primary right after writing, and the replica otherwise."""
+        replica = SQLiteBackend()
+        self.start(replica)
+
+        # The replica lags: it has the user but a stale bankroll.
+        conn = replica.connect()
+        with conn.cursor() as c:
+            c.execute("INSERT INTO users (id, email, password) VALUES (1, 'replica@example.com', 'x')")
+            c.execute("INSERT INTO bankrolls (user_id, current_balance, initial_bankroll, peak_balance, lowest_balance) VALUES (1, 100, 100, 100, 100)")
+        conn.commit()
+        conn.close()
+
+        resp = self.client.put("/bankroll", json={"current_balance": 1234.5})
+        self.assertIsNotNone(resp.headers.get("Set-Cookie"))
+        self.assertEqual(self.client.get("/bankroll").get_json()["current_balance"], 1234.5)
+
+        self.client.delete_cookie(self.main.PRIMARY_READS_COOKIE)
+        self.assertEqual(self.client.get("/bankroll").get_json()["current_balance"], 100.0)
+
+    def test_streamed_writes_pin_reads(self):
+        """Test a streamed chat message that may write sets the cookie with its headers."""
+        replica = SQLiteBackend()
+        self.start(replica)
+        self.client.delete_cookie(self.main.PRIMARY_READS_COOKIE)
+
+        resp = self.client.post("/chat/stream", json={"message": "help"})
+        self.assertIsNone(resp.headers.get("Set-Cookie"))
+        self.assertIn("event: reply", resp.get_data(as_text=True))
+
+        resp = self.client.post("/chat/stream", json={"message": "set bankroll to 1234.5"})
+        self.assertIn(self.main.PRIMARY_READS_COOKIE, resp.headers.get("Set-Cookie", ""))
+        self.assertIn("$1,234.50", resp.get_data(as_text=True))
+        # The replica has no bankroll (nor user) yet; the read must see the streamed write
+        self.assertEqual(self.client.get("/bankroll").get_json()["current_balance"], 1234.5)
+
+    def test_writes_never_use_the_replica(self):
+        """Test the user lookup for a write goes to the primary."""
+        replica = SQLiteBackend()
+        self.start(replica)
+        self.client.delete_cookie(self.main.PRIMARY_READS_COOKIE)
+
+        # The replica has not seen the new user yet, so replica reads fail auth...
+        self.assertEqual(self.client.get("/profile").status_code, 401)
+        # ...while writes authenticate against the primary.
+        resp = self.client.put("/bankroll", json={"current_balance": 50})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_unavailable_replica_fails_over(self):
+        """Test reads are served by the primary when the replica is down."""
+        self.start(BrokenBackend())
+        self.client.delete_cookie(self.main.PRIMARY_READS_COOKIE)
+        self.assertEqual(self.client.get("/profile").status_code, 200)
+        self.assertEqual(db.get_read_pool().stats()["replica_failures"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests for rotating refresh tokens and /token/refresh.
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pyotp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from db import ConnectionPool, SQLiteBackend, UnitOfWork
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS, RefreshTokenRepository
+
+
+class TestRefreshTokenRepository(unittest.TestCase):
+    """Tests for issuing, rotating and revoking refresh tokens on SQLite."""
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        self.pool = ConnectionPool(factory=self.backend.connect, max_size=1)
+        with self.pool.connection() as conn:
+            upgrade(conn)
+            with conn.cursor() as c:
+                c.execute("INSERT INTO users (email, password) VALUES ('r@example.com', 'x')")
+                self.user_id = c.lastrowid
+            conn.commit()
+        self.now = datetime(2025, 1, 1, 12, 0, 0)
+
+    def tearDown(self):
+        self.pool.close()
+        self.backend.close()
+
+    def run_in_uow(self, fn):
+        uow = UnitOfWork(self.pool)
+        try:
+            result = fn(RefreshTokenRepository(uow, lifetime_days=30, clock=lambda: self.now))
+            uow.commit()
+            return result
+        finally:
+            uow.close()
+
+    def test_tokens_are_stored_hashed(self):
+        """Test the raw token never reaches the database."""
+        token = self.run_in_uow(lambda repo: repo.issue(self.user_id))
+        with self.pool.connection() as conn, conn.cursor() as c:
+            c.execute("SELECT token_hash FROM refresh_tokens")
+            stored = c.fetchone()["token_hash"]
+        self.assertNotEqual(stored, token)
+        self.assertEqual(stored, RefreshTokenRepository.digest(token))
+
+    def test_rotation(self):
+        """Test a token is exchanged once for a successor in the same family."""
+        token = self.run_in_uow(lambda repo: repo.issue(self.user_id))
+        rotated = self.run_in_uow(lambda repo: repo.rotate(token))
+        self.assertEqual((rotated["user_id"], rotated["email"]), (self.user_id, "r@example.com"))
+        self.assertNotEqual(rotated["token"], token)
+        self.assertIsNotNone(self.run_in_uow(lambda repo: repo.rotate(rotated["token"])))
+
+    def test_reuse_revokes_family(self):
+        """Test presenting a rotated token again revokes every token in its family."""
+        token = self.run_in_uow(lambda repo: repo.issue(self.user_id))
+        successor = self.run_in_uow(lambda repo: repo.rotate(token))["token"]
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate(token)))
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate(successor)))
+
+    def test_expired_and_unknown(self):
+        """Test expired and unknown tokens are refused."""
+        token = self.run_in_uow(lambda repo: repo.issue(self.user_id))
+        self.now += timedelta(days=31)
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate(token)))
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate("made-up")))
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate(None)))
+
+    def test_revoke(self):
+        """Test revoke() ends the family."""
+        token = self.run_in_uow(lambda repo: repo.issue(self.user_id))
+        self.run_in_uow(lambda repo: repo.revoke(token))
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.rotate(token)))
+
+
+class TestRefreshEndpoint(unittest.TestCase):
+    """Tests for signing in with MFA and renewing access with /token/refresh."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+
+        resp = self.client.post("/register", json={"email": "refresh@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+        secret = pyotp.random_base32()
+        with db.pooled_connection() as conn, conn.cursor() as c:
+            c.execute("UPDATE users SET mfa_secret = %s", (secret,))
+            conn.commit()
+
+        self.client.set_cookie("temp_token", main.create_temp_token({"email": "refresh@example.com"}))
+        resp = self.client.post("/mfa/validate", json={"code": pyotp.TOTP(secret).now()})
+        self.assertEqual(resp.status_code, 200)
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+
+    def refresh_cookie(self):
+        cookie = self.client.get_cookie(self.main.REFRESH_COOKIE)
+        return cookie.value if cookie else None
+
+    def test_sign_in_sets_refresh_cookie(self):
+        """Test completing MFA sets both the access and refresh cookies."""
+        self.assertIsNotNone(self.client.get_cookie("token"))
+        self.assertIsNotNone(self.refresh_cookie())
+
+    def test_refresh_rotates_without_password_hash(self):
+        """Test /token/refresh issues new cookies with one lookup and two writes."""
+        self.client.delete_cookie("token")
+        before = self.refresh_cookie()
+
+        resp = self.client.post("/token/refresh")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["X-DB-Round-Trips"], "4")
+        self.assertNotEqual(self.refresh_cookie(), before)
+        self.assertEqual(self.client.get("/bankroll").status_code, 200)
+
+    def test_stolen_token_reuse(self):
+        """Test replaying an old refresh token locks out the whole session family."""
+        stolen = self.refresh_cookie()
+        self.assertEqual(self.client.post("/token/refresh").status_code, 200)
+
+        self.client.set_cookie(self.main.REFRESH_COOKIE, stolen)
+        resp = self.client.post("/token/refresh")
+        self.assertEqual(resp.status_code, 401)
+        self.assertIsNone(self.refresh_cookie())
+
+    def test_logout_revokes(self):
+        """Test a refresh token stops working after logout."""
+        token = self.refresh_cookie()
+        self.client.post("/logout")
+        self.client.set_cookie(self.main.REFRESH_COOKIE, token)
+        self.assertEqual(self.client.post("/token/refresh").status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,492 @@
+"""
+Tests for the bankroll repository.
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import ConnectionPool, UnitOfWork, create_backend
+from migrations import upgrade
+from repositories import (
+    BET_TYPE_IDS,
+    SPORT_IDS,
+    BankrollRepository,
+    BetSlipRepository,
+    LookupCache,
+    UserCache,
+    UserRepository,
+    validate_balance,
+)
+
+# Set to e.g. mysql://root:pw@localhost/clutchcall_test to also run the
+# repository contract against a real (scratch) MySQL database.
+TEST_MYSQL_URL = os.getenv("TEST_MYSQL_URL")
+
+
+class RecordingCursor:
+    lastrowid = None
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.conn.rows.pop(0) if self.conn.rows else None
+
+    def fetchall(self):
+        return list(self.conn.rows)
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, rows=None):
+        self.statements = []
+        self.rows = list(rows or [])
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class SinglePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        return self.conn
+
+    def release(self, conn, discard=False, reset=True):
+        pass
+
+
+def make_repo(rows=None):
+    conn = RecordingConnection(rows)
+    uow = UnitOfWork(SinglePool(conn))
+    return BankrollRepository(uow), conn, uow
+
+
+class TestBankrollRepository(unittest.TestCase):
+    """Tests for statement counts and SQL shape."""
+
+    def test_get_or_create_existing_is_one_query(self):
+        """Test an existing bankroll costs a single SELECT."""
+        row = {"id": 1, "current_balance": 100}
+        repo, conn, uow = make_repo([row])
+        self.assertEqual(repo.get_or_create(7), row)
+        self.assertEqual(uow.round_trips, 1)
+
+    def test_get_or_create_missing_inserts_race_free(self):
+        """Test a missing bankroll is inserted with ON DUPLICATE KEY."""
+        repo, conn, _ = make_repo([None, {"id": 3}])
+        repo.get_or_create(7, 250)
+        insert_sql, params = conn.statements[1]
+        self.assertIn("ON DUPLICATE KEY UPDATE", insert_sql)
+        self.assertEqual(params, (7, 250, 250, 250, 250))
+
+    def test_set_balance_single_statement(self):
+        """Test updating without read-back is one statement."""
+        repo, conn, uow = make_repo()
+        result = repo.set_balance(7, 1200, returning=False)
+        self.assertEqual(result["current_balance"], 1200.0)
+        self.assertEqual(uow.round_trips, 1)
+        sql, _ = conn.statements[0]
+        self.assertIn("GREATEST", sql)
+        self.assertIn("LEAST", sql)
+
+    def test_set_balance_new_row_bounds(self):
+        """Test a new row gets peak/lowest spanning default and new balance."""
+        repo, conn, _ = make_repo()
+        repo.set_balance(7, 9000, default_amount=5000, returning=False)
+        _, params = conn.statements[0]
+        self.assertEqual(params, (7, 9000.0, 5000, 9000.0, 5000))
+
+    def test_set_balance_returns_row(self):
+        """Test the updated row is read back by default."""
+        row = {"id": 1, "current_balance": 10}
+        repo, conn, uow = make_repo([row])
+        self.assertEqual(repo.set_balance(7, 10), row)
+        self.assertEqual(uow.round_trips, 2)
+
+
+class RepositoryContract:
+    """Migrated database and a scratch user per test; mixed into per-backend cases."""
+
+    database_url = None
+
+    @classmethod
+    def setUpClass(cls):
+        BET_TYPE_IDS.clear()
+        SPORT_IDS.clear()
+        cls.backend = create_backend(cls.database_url)
+        conn = cls.backend.connect(create_db_if_missing=True)
+        try:
+            upgrade(conn)
+        finally:
+            conn.close()
+        cls.pool = ConnectionPool(factory=cls.backend.connect, max_size=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        cls.backend.close()
+
+    def setUp(self):
+        uow = UnitOfWork(self.pool)
+        with uow.cursor() as c:
+            c.execute(
+                "INSERT INTO users (email, password, password_hash) VALUES (%s, 'x', 'x')",
+                (f"repo-{self.id()}@example.invalid",),
+            )
+            self.user_id = c.lastrowid
+        uow.commit()
+        uow.close()
+
+    def tearDown(self):
+        uow = UnitOfWork(self.pool)
+        uow.execute(
+            """
+            DELETE FROM bet_legs WHERE id IN (
+                SELECT bet_leg_id FROM bet_slip_items
+                JOIN bets ON bets.id = bet_slip_items.bet_id
+                WHERE bets.user_id = %s
+            )
+            """,
+            (self.user_id,),
+        )
+        uow.execute("DELETE FROM bets WHERE user_id = %s", (self.user_id,))
+        uow.execute("DELETE FROM bankrolls WHERE user_id = %s", (self.user_id,))
+        uow.execute("DELETE FROM users WHERE id = %s", (self.user_id,))
+        uow.commit()
+        uow.close()
+
+    def run_in_uow(self, fn, repository=BankrollRepository):
+        uow = UnitOfWork(self.pool)
+        try:
+            result = fn(repository(uow))
+            uow.commit()
+        finally:
+            uow.close()
+        return result
+
+
+class BankrollRepositoryContract(RepositoryContract):
+    """Bankroll behaviour every storage backend must provide."""
+
+    def test_get_missing_returns_none(self):
+        """Test get() returns None before a bankroll exists."""
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.get(self.user_id)))
+
+    def test_get_or_create_creates_once(self):
+        """Test get_or_create inserts a default row and then reuses it."""
+        first = self.run_in_uow(lambda repo: repo.get_or_create(self.user_id, 250))
+        second = self.run_in_uow(lambda repo: repo.get_or_create(self.user_id, 999))
+        self.assertEqual(first["id"], second["id"])
+        self.assertEqual(float(second["current_balance"]), 250.0)
+        self.assertEqual(float(second["initial_bankroll"]), 250.0)
+
+    def test_set_balance_creates_row(self):
+        """Test set_balance creates a missing row spanning default and new balance."""
+        row = self.run_in_uow(lambda repo: repo.set_balance(self.user_id, 9000, default_amount=5000))
+        self.assertEqual(row["user_id"], self.user_id)
+        self.assertEqual(float(row["current_balance"]), 9000.0)
+        self.assertEqual(float(row["initial_bankroll"]), 5000.0)
+        self.assertEqual(float(row["peak_balance"]), 9000.0)
+        self.assertEqual(float(row["lowest_balance"]), 5000.0)
+
+    def test_set_balance_tracks_peak_and_lowest(self):
+        """Test successive updates fold peak and lowest balances in SQL."""
+        for balance in (6000, 300, 4200):
+            row = self.run_in_uow(lambda repo: repo.set_balance(self.user_id, balance))
+        self.assertEqual(float(row["current_balance"]), 4200.0)
+        self.assertEqual(float(row["peak_balance"]), 6000.0)
+        self.assertEqual(float(row["lowest_balance"]), 300.0)
+
+    def test_set_balance_without_returning(self):
+        """Test returning=False still persists the balance."""
+        result = self.run_in_uow(lambda repo: repo.set_balance(self.user_id, 75, returning=False))
+        self.assertEqual(result, {"user_id": self.user_id, "current_balance": 75.0})
+        row = self.run_in_uow(lambda repo: repo.get(self.user_id))
+        self.assertEqual(float(row["current_balance"]), 75.0)
+
+    def test_rollback_discards_balance(self):
+        """Test a rolled-back unit of work leaves no bankroll behind."""
+        uow = UnitOfWork(self.pool)
+        BankrollRepository(uow).set_balance(self.user_id, 10)
+        uow.rollback()
+        uow.close()
+        self.assertIsNone(self.run_in_uow(lambda repo: repo.get(self.user_id)))
+
+
+def parsed_slip(*legs, total_odds=None):
+    legs = [
+        {"id": f"leg-{n}", "sport": sport, "game": game, "betType": bet_type, "selection": selection, "odds": odds}
+        for n, (sport, game, bet_type, selection, odds) in enumerate(legs, 1)
+    ]
+    return {"success": True, "legs": legs, "totalOdds": total_odds if total_odds is not None else legs[0]["odds"]}
+
+
+class BetSlipRepositoryContract(RepositoryContract):
+    """Bet slip behaviour every storage backend must provide."""
+
+    def setUp(self):
+        super().setUp()
+        self.bankroll_id = self.run_in_uow(lambda repo: repo.get_or_create(self.user_id))["id"]
+
+    def save(self, slip, stake=10):
+        uow = UnitOfWork(self.pool)
+        try:
+            saved = BetSlipRepository(uow).save_slip(self.user_id, self.bankroll_id, slip, stake)
+            trips = uow.round_trips
+            uow.commit()
+        finally:
+            uow.close()
+        return saved, trips
+
+    def fetch(self, sql, params):
+        uow = UnitOfWork(self.pool)
+        try:
+            return uow.execute(sql, params).fetchall()
+        finally:
+            uow.close()
+
+    def test_parlay_saved_in_four_statements(self):
+        """Test a 10-leg parlay costs four statements once lookups are cached."""
+        legs = [("NBA", f"Game {n}", "Spread", f"Team {n} -3.5", -110) for n in range(10)]
+        self.save(parsed_slip(*legs[:1]))
+        saved, trips = self.save(parsed_slip(*legs, total_odds=59000), stake=5)
+        self.assertEqual(trips, 4)
+        self.assertEqual(len(saved["leg_ids"]), 10)
+        legs = self.fetch("SELECT id, selection FROM bet_legs WHERE bet_id = %s ORDER BY id", (saved["bet_id"],))
+        self.assertEqual([leg["id"] for leg in legs], saved["leg_ids"])
+        self.assertEqual([leg["selection"] for leg in legs], [f"Team {n} -3.5" for n in range(10)])
+
+        items = self.fetch(
+            "SELECT bet_leg_id, leg_order FROM bet_slip_items WHERE bet_id = %s ORDER BY leg_order",
+            (saved["bet_id"],),
+        )
+        self.assertEqual([(i["bet_leg_id"], i["leg_order"]) for i in items],
+                         [(leg_id, n) for n, leg_id in enumerate(saved["leg_ids"], 1)])
+
+    def test_legs_resolve_lookup_ids(self):
+        """Test legs store bet type and sport ids, with Prop mapped to 'Prop Bet'."""
+        saved, _ = self.save(parsed_slip(
+            ("NFL", "Chiefs vs Bills", "Prop", "Mahomes over 2.5 TDs", 120),
+            ("Unknown", "Unknown Game", "Moneyline", "Somebody", -150),
+            total_odds=246,
+        ))
+        rows = self.fetch(
+            """
+            SELECT l.selection, l.game_name, t.type_name, s.sport_name
+            FROM bet_legs l
+            JOIN bet_types t ON t.id = l.bet_type_id
+            LEFT JOIN sports s ON s.id = l.sport_id
+            WHERE l.id IN (%s, %s) ORDER BY l.id
+            """,
+            tuple(saved["leg_ids"]),
+        )
+        self.assertEqual(
+            [(r["selection"], r["game_name"], r["type_name"], r["sport_name"]) for r in rows],
+            [("Mahomes over 2.5 TDs", "Chiefs vs Bills", "Prop Bet", "NFL"),
+             ("Somebody", "Unknown Game", "Moneyline", None)],
+        )
+
+    def test_bet_totals(self):
+        """Test the bet row records stake, odds and potential win."""
+        saved, _ = self.save(parsed_slip(("NBA", "Lakers vs Celtics", "Moneyline", "Lakers", 150)), stake=20)
+        (bet,) = self.fetch("SELECT total_stake, total_odds, potential_win, status FROM bets WHERE id = %s",
+                            (saved["bet_id"],))
+        self.assertEqual(float(bet["total_stake"]), 20.0)
+        self.assertEqual(float(bet["total_odds"]), 150.0)
+        self.assertEqual(float(bet["potential_win"]), 30.0)
+        self.assertEqual(bet["status"], "pending")
+
+    def test_invalid_slips_rejected(self):
+        """Test empty slips, bad stakes and unknown bet types raise ValueError."""
+        leg = ("NBA", "Game", "Spread", "Lakers -3", -110)
+        for slip, stake in (
+            ({"legs": []}, 10),
+            (parsed_slip(leg), 0),
+            (parsed_slip(leg), "abc"),
+            (parsed_slip(("NBA", "Game", "Teaser", "Lakers +7", -120)), 10),
+        ):
+            with self.assertRaises(ValueError):
+                self.save(slip, stake)
+        self.assertEqual(self.fetch("SELECT id FROM bets WHERE user_id = %s", (self.user_id,)), [])
+
+
+class TestSQLiteBankrollRepository(BankrollRepositoryContract, unittest.TestCase):
+    """Repository contract on an in-memory SQLite database."""
+
+    database_url = "sqlite://"
+
+    def test_set_balance_reads_back_with_returning(self):
+        """Test SQLite returns the updated row from the upsert itself."""
+        uow = UnitOfWork(self.pool)
+        BankrollRepository(uow).set_balance(self.user_id, 10)
+        trips = uow.round_trips
+        uow.commit()
+        uow.close()
+        self.assertEqual(trips, 1)
+
+
+@unittest.skipUnless(TEST_MYSQL_URL, "TEST_MYSQL_URL not set")
+class TestMySQLBankrollRepository(BankrollRepositoryContract, unittest.TestCase):
+    """Repository contract on the MySQL database named by TEST_MYSQL_URL."""
+
+    database_url = TEST_MYSQL_URL
+
+
+class TestSQLiteBetSlipRepository(BetSlipRepositoryContract, unittest.TestCase):
+    """Bet slip contract on an in-memory SQLite database."""
+
+    database_url = "sqlite://"
+
+
+@unittest.skipUnless(TEST_MYSQL_URL, "TEST_MYSQL_URL not set")
+class TestMySQLBetSlipRepository(BetSlipRepositoryContract, unittest.TestCase):
+    """Bet slip contract on the MySQL database named by TEST_MYSQL_URL."""
+
+    database_url = TEST_MYSQL_URL
+
+
+class TestLookupCache(unittest.TestCase):
+    """Tests for the in-process lookup table cache."""
+
+    def test_loads_once_and_reloads_on_miss(self):
+        """Test hits cost nothing and misses reload at most once per interval."""
+        now = [0.0]
+        _, conn, uow = make_repo([{"id": 1, "name": "Spread"}])
+        cache = LookupCache("bet_types", "type_name", reload_interval=60, clock=lambda: now[0])
+
+        self.assertEqual(cache.get(uow, "Spread"), 1)
+        self.assertEqual(cache.get(uow, "Spread"), 1)
+        self.assertIsNone(cache.get(uow, "Teaser"))
+        self.assertEqual(len(conn.statements), 1)
+
+        now[0] = 61
+        self.assertIsNone(cache.get(uow, "Teaser"))
+        self.assertEqual(len(conn.statements), 2)
+
+
+class TestUserCache(unittest.TestCase):
+    """Tests for the authenticated user cache."""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.cache = UserCache(max_size=2, ttl=30, clock=lambda: self.now[0])
+
+    def test_hit_costs_no_query(self):
+        """Test a cached user is served without touching the database."""
+        _, conn, uow = make_repo([{"id": 1, "email": "a@b.com", "is_active": 1}])
+        self.assertEqual(self.cache.get(uow, "a@b.com")["id"], 1)
+        self.assertEqual(self.cache.get(uow, "a@b.com")["id"], 1)
+        self.assertEqual(len(conn.statements), 1)
+        self.assertEqual(self.cache.stats()["hit_ratio"], 0.5)
+
+    def test_entries_expire(self):
+        """Test an entry older than the TTL is read again."""
+        _, conn, uow = make_repo([{"id": 1}, {"id": 1}])
+        self.cache.get(uow, "a@b.com")
+        self.now[0] = 31
+        self.cache.get(uow, "a@b.com")
+        self.assertEqual(len(conn.statements), 2)
+
+    def test_missing_users_are_not_cached(self):
+        """Test a user that does not exist yet is looked up again next time."""
+        _, conn, uow = make_repo([None, {"id": 5}])
+        self.assertIsNone(self.cache.get(uow, "new@b.com"))
+        self.assertEqual(self.cache.get(uow, "new@b.com")["id"], 5)
+
+    def test_invalidate_and_lru_eviction(self):
+        """Test invalidate() drops an entry and the least recently used entry is evicted."""
+        _, conn, uow = make_repo([{"id": 1}, {"id": 2}, {"id": 3}, {"id": 1}])
+        self.cache.get(uow, "one")
+        self.cache.get(uow, "two")
+        self.cache.get(uow, "one")
+        self.cache.get(uow, "three")
+        stats = self.cache.stats()
+        self.assertEqual((stats["size"], stats["evictions"]), (2, 1))
+
+        self.cache.invalidate("one")
+        self.assertEqual(self.cache.get(uow, "one")["id"], 1)
+        self.assertEqual(len(conn.statements), 4)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_returns_copies(self):
+        """Test callers cannot modify the cached row."""
+        _, _, uow = make_repo([{"id": 1}])
+        self.cache.get(uow, "a@b.com")["id"] = 99
+        self.assertEqual(self.cache.get(uow, "a@b.com")["id"], 1)
+
+
+class TestUserRepository(unittest.TestCase):
+    """Tests for writes to users invalidating the user cache."""
+
+    USER = {"id": 1, "email": "a@b.com"}
+
+    def setUp(self):
+        self.cache = UserCache(ttl=30, clock=lambda: 0.0)
+
+    def cached_then_written(self, write):
+        _, conn, uow = make_repo([dict(self.USER, is_active=1)])
+        self.cache.get(uow, "a@b.com")
+        write(UserRepository(uow, cache=self.cache))
+        return conn, uow
+
+    def test_every_write_invalidates_on_commit(self):
+        """Test each users write drops the cached row once committed."""
+        writes = {
+            "create": lambda repo: repo.create("a@b.com", "h", "a", "A"),
+            "mfa": lambda repo: repo.set_mfa_secret("a@b.com", "S" * 32),
+            "password": lambda repo: repo.set_password(self.USER, "h"),
+            "rehash": lambda repo: repo.set_password(self.USER, "h", defer=True),
+            "backfill": lambda repo: repo.backfill_username(self.USER, "a", "A"),
+            "profile": lambda repo: repo.update_profile(self.USER, ["phone = %s"], ["555"]),
+        }
+        for name, write in writes.items():
+            with self.subTest(write=name):
+                self.cache.clear()
+                conn, uow = self.cached_then_written(write)
+                self.assertEqual(self.cache.stats()["size"], 1)
+                uow.commit()
+                self.assertEqual(self.cache.stats()["size"], 0)
+                self.assertTrue(any(sql.startswith(("UPDATE users", "INSERT INTO users"))
+                                    for sql, _ in conn.statements))
+
+    def test_rollback_keeps_entry(self):
+        """Test a rolled-back write leaves the cached row alone."""
+        _, uow = self.cached_then_written(lambda repo: repo.set_mfa_secret("a@b.com", "S" * 32))
+        uow.rollback()
+        uow.commit()
+        self.assertEqual(self.cache.stats()["size"], 1)
+
+
+class TestValidateBalance(unittest.TestCase):
+    """Tests for bankroll amount validation."""
+
+    def test_valid_amounts(self):
+        """Test numeric strings and numbers are accepted."""
+        self.assertEqual(validate_balance("250.5"), 250.5)
+        self.assertEqual(validate_balance(0), 0.0)
+
+    def test_invalid_amounts(self):
+        """Test invalid or negative amounts raise ValueError."""
+        for value in (None, "abc", -1, float("nan"), float("inf")):
+            with self.assertRaises(ValueError):
+                validate_balance(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,240 @@
+"""
+Tests for access token revocation and its Bloom filter.
+"""
+
+import unittest
+import sys
+import os
+import secrets
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from db import ConnectionPool, SQLiteBackend, UnitOfWork
+from metrics import QUERY_LATENCY
+from migrations import upgrade
+from ratelimit import RATE_LIMITER
+from repositories import AUTH_USERS
+from revocation import REVOKED_TOKENS, BloomFilter, RevocationList
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Tests for Bloom filter membership."""
+
+    def test_no_false_negatives(self):
+        """Test every added item is reported present."""
+        bloom = BloomFilter(1000)
+        items = [secrets.token_hex(16) for _ in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        """Test the false positive rate stays near the configured 1%."""
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(secrets.token_hex(16))
+        false_positives = sum(secrets.token_hex(16) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+def unreachable():
+    raise ConnectionError("down")
+
+
+class ReadThenRun:
+    """Connection whose cursor runs ``hook`` right after the reload query's rows are read."""
+
+    def __init__(self, conn, hook):
+        self.conn = conn
+        self.hook = hook
+
+    def cursor(self):
+        return ReadThenRunCursor(self.conn.cursor(), self.hook)
+
+
+class ReadThenRunCursor:
+    def __init__(self, cursor, hook):
+        self.cursor = cursor
+        self.hook = hook
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(sql, params)
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.hook()
+        return rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+
+class TestRevocationList(unittest.TestCase):
+    """Tests for revoking token ids and checking them."""
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        self.pool = ConnectionPool(factory=self.backend.connect, max_size=1)
+        with self.pool.connection() as conn:
+            upgrade(conn)
+        # No background thread: tests reload by hand
+        self.revocations = RevocationList(reload_interval=0, connect=self.pool.connection)
+        self.revocations.start()
+
+    def tearDown(self):
+        self.revocations.clear()
+        self.pool.close()
+        self.backend.close()
+
+    def run_in_uow(self, fn):
+        uow = UnitOfWork(self.pool)
+        try:
+            result = fn(uow)
+            uow.commit()
+            return result, uow.round_trips
+        finally:
+            uow.close()
+
+    def is_revoked(self, jti):
+        return self.run_in_uow(
+            lambda uow: self.revocations.maybe_revoked(jti) and self.revocations.confirm_revoked(uow, jti)
+        )
+
+    def test_unrevoked_tokens_cost_no_query(self):
+        """Test a token missing from the filter is accepted without a query."""
+        revoked, trips = self.is_revoked("a" * 32)
+        self.assertFalse(revoked)
+        self.assertEqual(trips, 0)
+        self.assertFalse(self.revocations.maybe_revoked(None))
+
+    def test_revoked_locally(self):
+        """Test a revocation is enforced by this worker as soon as it commits."""
+        self.run_in_uow(lambda uow: self.revocations.revoke(uow, "b" * 32, datetime.utcnow() + timedelta(hours=1)))
+        self.assertEqual(self.is_revoked("b" * 32), (True, 1))
+
+    def test_revoked_by_another_worker(self):
+        """Test another worker's revocation is picked up at the next reload."""
+        other = RevocationList(connect=self.pool.connection)
+        self.run_in_uow(lambda uow: other.revoke(uow, "c" * 32, 2 ** 31))
+
+        self.assertEqual(self.is_revoked("c" * 32), (False, 0))
+        self.revocations.reload()
+        self.assertEqual(self.is_revoked("c" * 32), (True, 1))
+        self.assertEqual(self.revocations.stats()["reloads"], 2)
+
+    def test_expired_revocations_leave_the_filter(self):
+        """Test rows past their expiry are not loaded into the filter."""
+        self.run_in_uow(lambda uow: self.revocations.revoke(uow, "d" * 32, datetime.utcnow() - timedelta(minutes=1)))
+        self.revocations.reload()
+        self.assertEqual(self.is_revoked("d" * 32), (False, 0))
+
+    def test_unloaded_filter_fails_closed(self):
+        """Test every token is confirmed with a query until the filter has loaded."""
+        revocations = RevocationList(reload_interval=0, connect=unreachable)
+        revocations.start()
+        self.assertEqual(revocations.stats()["reload_failures"], 1)
+        self.assertTrue(revocations.maybe_revoked("e" * 32))
+        self.assertTrue(revocations.maybe_revoked("f" * 32))
+        self.assertEqual(revocations.stats()["unloaded_checks"], 2)
+
+    def test_reload_failure_keeps_serving(self):
+        """Test an unreachable database leaves the last filter in place."""
+        self.run_in_uow(lambda uow: self.revocations.revoke(uow, "e" * 32, 2 ** 31))
+        self.revocations._connect = unreachable
+        self.revocations._try_reload()
+        self.assertEqual(self.revocations.stats()["reload_failures"], 1)
+        self.assertTrue(self.revocations.maybe_revoked("e" * 32))
+        self.assertFalse(self.revocations.maybe_revoked("a" * 32))
+
+    def test_revocation_during_reload_kept(self):
+        """Test a token revoked after the reload query read its rows stays in the new filter."""
+        elsewhere = SQLiteBackend()
+        upgrade(elsewhere.connect())
+        other_pool = ConnectionPool(factory=elsewhere.connect, max_size=1)
+        self.addCleanup(elsewhere.close)
+        self.addCleanup(other_pool.close)
+
+        def revoke_now():
+            uow = UnitOfWork(other_pool)
+            self.revocations.revoke(uow, "g" * 32, 2 ** 31)
+            uow.commit()
+            uow.close()
+
+        @contextmanager
+        def connect():
+            with self.pool.connection() as conn:
+                yield ReadThenRun(conn, revoke_now)
+
+        self.revocations._connect = connect
+        self.revocations.reload()
+        self.assertTrue(self.revocations.maybe_revoked("g" * 32))
+
+    def test_background_reload(self):
+        """Test start() reloads on a thread until clear() stops it."""
+        revocations = RevocationList(reload_interval=0.01, connect=self.pool.connection)
+        revocations.start()
+        self.addCleanup(revocations.clear)
+        other = RevocationList(connect=self.pool.connection)
+        self.run_in_uow(lambda uow: other.revoke(uow, "h" * 32, 2 ** 31))
+        for _ in range(200):
+            if revocations.maybe_revoked("h" * 32):
+                break
+            time.sleep(0.01)
+        self.assertTrue(revocations.maybe_revoked("h" * 32))
+
+
+class TestLogoutRevokesAccessToken(unittest.TestCase):
+    """Tests that a logged-out access token stops working."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        db.configure("sqlite://")
+        with db.pooled_connection() as conn:
+            upgrade(conn)
+        main._schema_checked = False
+        REVOKED_TOKENS.clear()
+        RATE_LIMITER.clear()
+        self.client = main.app.test_client()
+        resp = self.client.post("/register", json={"email": "revoke@example.com", "pass": "password123"})
+        self.assertEqual(resp.status_code, 200)
+
+    def tearDown(self):
+        db.configure(None)
+        db._backend = db._pool = db._replica_backends = db._read_pool = None
+        self.main._schema_checked = False
+        AUTH_USERS.clear()
+        REVOKED_TOKENS.clear()
+
+    def test_stolen_token_rejected_after_logout(self):
+        """Test replaying an access token after logout is refused."""
+        token = self.main.create_access_token({"email": "revoke@example.com"})
+        self.client.set_cookie("token", token)
+        self.assertEqual(self.client.get("/validate").status_code, 200)
+        self.assertEqual(self.client.post("/logout").status_code, 200)
+
+        self.client.set_cookie("token", token)
+        self.assertEqual(self.client.get("/validate").status_code, 401)
+        self.assertEqual(self.client.get("/profile").status_code, 401)
+
+    def test_other_tokens_unaffected(self):
+        """Test logging out one session leaves other tokens valid without extra queries."""
+        other = self.main.create_access_token({"email": "revoke@example.com"})
+        self.client.set_cookie("token", self.main.create_access_token({"email": "revoke@example.com"}))
+        self.client.post("/logout")
+
+        QUERY_LATENCY.reset()
+        self.client.set_cookie("token", other)
+        self.assertEqual(self.client.get("/validate").status_code, 200)
+        self.assertNotIn("revoked_tokens.by_jti", QUERY_LATENCY.snapshot())
+
+
+if __name__ == "__main__":
+    unittest.main()
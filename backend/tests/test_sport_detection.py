@@ -0,0 +1,131 @@
+"""
+Tests for whole-word sport and team detection.
+"""
+
+import unittest
+import sys
+import os
+import random
+import re
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import sports_data
+from app.bet_parser import detect_sport, detect_sports, parse_bet_text
+from app.bet_tokens import TermAutomaton, as_leg, split_legs
+from app.sports_data import extract_teams_from_bet
+
+
+def reference_scan(terms, text):
+    """The terms a case-insensitive ``\\b(term|...)\\b`` regex finds, longest alternative first."""
+    alternatives = sorted(terms, key=len, reverse=True)
+    pattern = r'(?<!\w)(?:' + '|'.join(re.escape(t).replace(r'\ ', r'[^\S\n]+') for t in alternatives) + r')(?!\w)'
+    return [match.group().lower() for match in re.finditer(pattern, text, re.IGNORECASE)]
+
+
+class TestTermAutomaton(unittest.TestCase):
+    """Tests for TermAutomaton."""
+
+    def scan(self, automaton, text):
+        return [term for _, _, term in automaton.scan(as_leg(text))]
+
+    def test_whole_words_only(self):
+        """Test terms are not found inside other words."""
+        automaton = TermAutomaton(["as", "nets", "kings", "76ers"])
+        self.assertEqual(self.scan(automaton, "Vikings, Hornets and Texas"), [])
+        self.assertEqual(self.scan(automaton, "Kings-3 as 76ers_"), ["kings", "as"])
+        self.assertEqual(self.scan(automaton, "+3kings nets2 (76ers)"), ["76ers"])
+
+    def test_phrases_and_overlaps(self):
+        """Test multi-word terms match across spaces and the longest overlapping term wins."""
+        automaton = TermAutomaton(["trail blazers", "blazers", "man city", "city", "red sox"])
+        self.assertEqual(self.scan(automaton, "Trail  Blazers +5"), ["trail blazers"])
+        self.assertEqual(self.scan(automaton, "man man city, city"), ["man city", "city"])
+        self.assertEqual(self.scan(automaton, "red\nsox"), [])
+
+    def test_matches_regex(self):
+        """Test random strings against an equivalent regex."""
+        terms = ["as", "a", "lakers", "red sox", "sox", "76ers", "ers", "man city", "man united", "city"]
+        automaton = TermAutomaton(terms)
+        alphabet = ["as", "a", "Lakers", "red", "sox", "76", "ers", "man", "city", "united", "x",
+                    " ", "  ", "_", "-", "+", "3", ",", "\n", "@"]
+        rng = random.Random(24)
+        for _ in range(3000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 10)))
+            with self.subTest(text=text):
+                self.assertEqual(self.scan(automaton, text), reference_scan(terms, text))
+
+    def test_many_leagues(self):
+        """Test a vocabulary of thousands of terms still finds the right ones."""
+        terms = [f"team{n} city{n}" for n in range(5000)] + ["lakers"]
+        automaton = TermAutomaton(terms)
+        leg = split_legs("Team17 City17 vs Lakers, team4999 city4999")[0]
+        self.assertEqual([term for _, _, term in automaton.scan(leg)], ["team17 city17", "lakers"])
+
+    def test_bad_terms(self):
+        """Test terms that could never match a whole word are refused."""
+        with self.assertRaises(ValueError):
+            TermAutomaton(["lakers", "lakers!"])
+        with self.assertRaises(ValueError):
+            TermAutomaton(["+3"])
+
+
+class TestDetectSports(unittest.TestCase):
+    """Tests for detect_sport and detect_sports."""
+
+    def test_substrings_ignored(self):
+        """Test sport names inside other words no longer count."""
+        self.assertEqual(detect_sport("Vikings first half -3.5"), "NFL")
+        self.assertEqual(detect_sport("Seahawks +6"), "NFL")
+        self.assertEqual(detect_sport("5+ assists +110"), "Unknown")
+        self.assertEqual(detect_sport("Texas over 8.5"), "Unknown")
+
+    def test_shared_names_settled_by_the_leg(self):
+        """Test other names in the same leg decide between sports sharing a name."""
+        self.assertEqual(detect_sport("Rangers @ Yankees"), "MLB")
+        self.assertEqual(detect_sport("Rangers vs Bruins"), "NHL")
+        self.assertEqual(detect_sport("Kings vs Lakers"), "NBA")
+        self.assertEqual(detect_sport("Spurs vs Arsenal"), "Soccer")
+        self.assertEqual(detect_sport("Panthers ML NHL"), "NHL")
+
+    def test_shared_names_settled_by_the_slip(self):
+        """Test the rest of the slip decides when the leg cannot."""
+        self.assertEqual(detect_sports(["Giants ML", "Dodgers -1.5"]), ["MLB", "MLB"])
+        self.assertEqual(detect_sports(["Giants ML", "Cowboys -3"]), ["NFL", "NFL"])
+        self.assertEqual(detect_sports(["Jets +3", "Bruins ML", "Over 220.5"]), ["NHL", "NHL", "Unknown"])
+
+    def test_ties_keep_keyword_order(self):
+        """Test a name nothing else settles goes to the first sport listing it, as before."""
+        self.assertEqual(detect_sport("Giants ML"), "NFL")
+        self.assertEqual(detect_sport("Cardinals +1.5"), "NFL")
+
+    def test_team_aliases_count(self):
+        """Test the live-data team aliases are evidence for the NBA."""
+        self.assertEqual(detect_sport("Wolves +3.5 -110"), "NBA")
+
+    def test_parse_bet_text_uses_the_slip(self):
+        """Test parse_bet_text settles each leg with the rest of the slip."""
+        with mock.patch.object(sports_data, "get_all_teams", return_value=[]):
+            result = parse_bet_text("Giants ML -120\nDodgers -1.5 +140")
+        self.assertEqual([leg['sport'] for leg in result['legs']], ["MLB", "MLB"])
+
+
+class TestExtractTeams(unittest.TestCase):
+    """Tests for whole-word team alias lookup in extract_teams_from_bet."""
+
+    def setUp(self):
+        patcher = mock.patch.object(sports_data, "get_all_teams", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_whole_words_in_written_order(self):
+        """Test aliases are found as whole words, in the order they are written."""
+        self.assertEqual(extract_teams_from_bet("Hornets +5"), ("hornets", None))
+        self.assertEqual(extract_teams_from_bet("Trail Blazers +9.5"), ("trail blazers", None))
+        self.assertEqual(extract_teams_from_bet("Nets +1 and Bulls -3"), ("nets", "bulls"))
+        self.assertEqual(extract_teams_from_bet("Seahawks +6"), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
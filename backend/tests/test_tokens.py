@@ -0,0 +1,99 @@
+"""
+Tests for the verified-JWT cache.
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokens import TOKEN_CACHE, TokenCache
+
+
+class TestTokenCache(unittest.TestCase):
+    """Tests for caching payloads until their exp claim."""
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.cache = TokenCache(max_size=2, clock=lambda: self.now[0])
+
+    def test_hit_until_exp(self):
+        """Test a payload is served until its exp, then dropped."""
+        self.cache.put("a.b.c", {"email": "a@b.com", "exp": 1060})
+        self.assertEqual(self.cache.get("a.b.c")["email"], "a@b.com")
+        self.now[0] = 1060
+        self.assertIsNone(self.cache.get("a.b.c"))
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_tokens_without_exp_not_cached(self):
+        """Test a payload with no exp claim is never cached."""
+        self.cache.put("a.b.c", {"email": "a@b.com"})
+        self.assertIsNone(self.cache.get("a.b.c"))
+
+    def test_lru_bound_and_discard(self):
+        """Test the cache stays bounded and discard() forgets a token."""
+        for token in ("one", "two", "three"):
+            self.cache.put(token, {"exp": 2000})
+        self.assertIsNone(self.cache.get("one"))
+        self.cache.discard("two")
+        self.assertIsNone(self.cache.get("two"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["size"], stats["evictions"], stats["discarded"]), (1, 1, 1))
+
+    def test_returns_copies(self):
+        """Test callers cannot modify a cached payload."""
+        self.cache.put("t", {"email": "a@b.com", "exp": 2000})
+        self.cache.get("t")["email"] = "x"
+        self.assertEqual(self.cache.get("t")["email"], "a@b.com")
+
+    def test_disabled_when_size_zero(self):
+        """Test max_size=0 turns the cache off."""
+        cache = TokenCache(max_size=0)
+        cache.put("t", {"exp": 2 ** 40})
+        self.assertIsNone(cache.get("t"))
+
+
+class TestDecodeTokenCache(unittest.TestCase):
+    """Tests for decode_token() through the cache."""
+
+    def setUp(self):
+        import main
+        self.main = main
+        TOKEN_CACHE.clear()
+
+    def tearDown(self):
+        TOKEN_CACHE.clear()
+
+    def test_second_decode_skips_verification(self):
+        """Test a repeated token is not verified again."""
+        token = self.main.create_access_token({"email": "a@b.com"})
+        self.assertEqual(self.main.decode_token(token)["email"], "a@b.com")
+        with mock.patch.object(self.main.jwt, "decode", side_effect=AssertionError("verified again")):
+            self.assertEqual(self.main.decode_token(token)["email"], "a@b.com")
+
+    def test_invalid_tokens_not_cached(self):
+        """Test a token that fails verification is rejected every time."""
+        token = self.main.create_access_token({"email": "a@b.com"})[:-2] + "xx"
+        self.assertIsNone(self.main.decode_token(token))
+        self.assertEqual(TOKEN_CACHE.stats()["size"], 0)
+
+    def test_expired_token_not_served(self):
+        """Test a cached token stops validating once expired."""
+        token = self.main.create_access_token({"email": "a@b.com"}, expires_minutes=-1)
+        self.assertIsNone(self.main.decode_token(token))
+
+    def test_logout_discards_token(self):
+        """Test logging out drops the token from the cache."""
+        token = self.main.create_access_token({"email": "a@b.com"})
+        self.main.decode_token(token)
+        client = self.main.app.test_client()
+        client.set_cookie("token", token)
+        discarded = TOKEN_CACHE.stats()["discarded"]
+        client.post("/logout")
+        self.assertEqual(TOKEN_CACHE.stats()["discarded"], discarded + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Tests for the request-scoped unit of work.
+"""
+
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import UnitOfWork
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(("execute", sql, params))
+
+    def executemany(self, sql, seq):
+        self.conn.log.append(("executemany", sql, list(seq)))
+
+    def fetchone(self):
+        return {"id": 1}
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+        self.acquired = 0
+        self.released = []
+
+    def acquire(self):
+        self.acquired += 1
+        return self.conn
+
+    def release(self, conn, discard=False, reset=True):
+        self.released.append((conn, discard, reset))
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """Tests for connection sharing, commits and round-trip counting."""
+
+    def setUp(self):
+        self.pool = FakePool()
+        self.uow = UnitOfWork(self.pool)
+
+    def test_no_checkout_without_queries(self):
+        """Test a unit of work that runs nothing never checks out a connection."""
+        self.uow.commit()
+        self.uow.close()
+        self.assertEqual(self.pool.acquired, 0)
+        self.assertEqual(self.uow.round_trips, 0)
+
+    def test_single_checkout_for_many_queries(self):
+        """Test every statement shares one pooled connection."""
+        for _ in range(3):
+            with self.uow.cursor() as c:
+                c.execute("SELECT 1")
+        self.assertEqual(self.pool.acquired, 1)
+        self.assertEqual(self.uow.round_trips, 3)
+
+    def test_commit_once_after_writes(self):
+        """Test writes are committed by a single COMMIT."""
+        self.uow.execute("UPDATE bankrolls SET current_balance = %s", (1,))
+        self.uow.execute("UPDATE bankrolls SET current_balance = %s", (2,))
+        self.uow.commit()
+        commits = [entry for entry in self.pool.conn.log if entry[0] == "commit"]
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(self.uow.round_trips, 3)
+
+    def test_read_only_work_is_not_committed(self):
+        """Test a read-only unit of work skips COMMIT and rolls back on close."""
+        self.uow.execute("SELECT id FROM users WHERE email = %s", ("a@b.com",))
+        self.uow.commit()
+        self.uow.close()
+        kinds = [entry[0] for entry in self.pool.conn.log]
+        self.assertNotIn("commit", kinds)
+        self.assertEqual(kinds[-1], "rollback")
+
+    def test_close_after_commit_skips_rollback(self):
+        """Test no extra ROLLBACK is sent after a commit."""
+        self.uow.execute("INSERT INTO sports (sport_name) VALUES (%s)", ("NBA",))
+        self.uow.commit()
+        self.uow.close()
+        kinds = [entry[0] for entry in self.pool.conn.log]
+        self.assertEqual(kinds, ["execute", "commit"])
+        self.assertEqual(self.pool.released, [(self.pool.conn, False, False)])
+
+    def test_deferred_writes_are_batched(self):
+        """Test consecutive deferred statements are sent with executemany."""
+        sql = "UPDATE users SET username = %s WHERE id = %s"
+        self.uow.defer(sql, ("a", 1))
+        self.uow.defer(sql, ("b", 2))
+        self.uow.defer("DELETE FROM audit_logs WHERE id = %s", (9,))
+        self.uow.commit()
+
+        log = self.pool.conn.log
+        self.assertEqual(log[0], ("executemany", sql, [("a", 1), ("b", 2)]))
+        self.assertEqual(log[1][0], "execute")
+        self.assertEqual(log[2], ("commit",))
+        self.assertEqual(self.uow.round_trips, 3)
+
+    def test_rollback_blocks_commit(self):
+        """Test commit() is a no-op after rollback()."""
+        self.uow.execute("UPDATE users SET phone = %s", ("1",))
+        self.uow.defer("UPDATE users SET avatar = %s", ("x",))
+        self.uow.rollback()
+        self.uow.commit()
+        kinds = [entry[0] for entry in self.pool.conn.log]
+        self.assertEqual(kinds, ["execute", "rollback"])
+
+    def test_on_commit_runs_after_commit(self):
+        """Test on_commit callbacks run once the transaction commits."""
+        calls = []
+        self.uow.execute("UPDATE users SET phone = %s", ("1",))
+        self.uow.on_commit(lambda: calls.append([entry[0] for entry in self.pool.conn.log]))
+        self.uow.commit()
+        self.uow.commit()
+        self.assertEqual(calls, [["execute", "commit"]])
+
+    def test_on_commit_dropped_on_rollback(self):
+        """Test on_commit callbacks are discarded when the work is rolled back."""
+        calls = []
+        self.uow.on_commit(lambda: calls.append(True))
+        self.uow.rollback()
+        self.uow.commit()
+        self.assertEqual(calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Cache of verified JWT payloads.
+
+Dashboards poll /validate, /bankroll and /profile with the same cookie many
+times a second, and each poll would otherwise repeat the signature check and
+claim parsing. Payloads are kept under a SHA-256 digest of the token (raw
+tokens are never stored) until the token's own ``exp``, so a cached token
+expires exactly when jwt.decode would start rejecting it. Only tokens that
+verified are cached.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenCache:
+    """Bounded LRU of token digest -> verified payload, valid until the payload's ``exp``."""
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE, clock=time.time):
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "discarded": 0}
+
+    def get(self, token):
+        """Return a copy of the cached payload for ``token``, or None."""
+        if self.max_size <= 0:
+            return None
+        key = token_digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            payload, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return dict(payload)
+
+    def put(self, token, payload):
+        """Remember a payload that jwt.decode just verified; tokens without ``exp`` are not cached."""
+        expires_at = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        key = token_digest(token)
+        with self._lock:
+            self._entries[key] = (dict(payload), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def discard(self, token):
+        """Forget ``token`` (on logout)."""
+        if not token:
+            return
+        with self._lock:
+            if self._entries.pop(token_digest(token), None) is not None:
+                self._stats["discarded"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+TOKEN_CACHE = TokenCache()